@@ -2,14 +2,15 @@
 
 
 from __future__ import annotations
+import os
+from datetime import datetime
 from functools import wraps
 from io import BytesIO
 from typing import Any, Dict
 
 import sqlalchemy as sa
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, current_app
 from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
-from passlib.hash import bcrypt
 
 from .models import (
     db,
@@ -17,9 +18,20 @@ from .models import (
     NganhHoc, LopHoc,
     NguoiDung, SystemConfig,
     WarningRule, WarningCase,
-    ImportLog,
+    ImportLog, SubjectAlias, StudentAggregate,
 )
 
+from .warning_scan import mark_students_dirty, mark_all_students_dirty
+from .services.aggregate_service import apply_retake_policy, refresh_student_aggregates, course_students
+from .services import jobs, upload_reader
+from .services.data_version import bump_global, bump_students, bump_analytics
+from .services.analytics_service import kpi_counts
+from .services.config_service import (
+    RETAKE_POLICIES, all_configs, config_meta, email_domain, invalidate_config_cache,
+)
+from .services.student_search import search_filter, approx_count
+from .services.auth_service import hash_provisioned
+
 try:
     from . import importer as _importer
 except Exception:
@@ -53,10 +65,6 @@ def bad(msg: str, code: int = 400):
 def json_body() -> Dict[str, Any]:
     return request.get_json(silent=True) or {}
 
-def _email_domain() -> str:
-    row = db.session.get(SystemConfig, "EMAIL_DOMAIN")
-    return (row.ConfigValue if row else "vui.edu.vn")
-
 @bp.get("/api/auth/me")
 @jwt_required()
 def auth_me():
@@ -76,25 +84,11 @@ def auth_me():
 @bp.get("/api/admin/dashboard-analytics")
 @jwt_required()
 def dashboard_analytics():
-    total_students = db.session.scalar(sa.select(sa.func.count()).select_from(SinhVien)) or 0
-    total_courses  = db.session.scalar(sa.select(sa.func.count()).select_from(HocPhan)) or 0
-
-    total_kq = db.session.scalar(sa.select(sa.func.count()).select_from(KetQuaHocTap)) or 0
-    pass_kq = 0
-    conds = [
-        getattr(KetQuaHocTap, "DiemHe10") >= 4.0
-    ]
-    if hasattr(KetQuaHocTap, "KetQua"):
-        conds.append(getattr(KetQuaHocTap, "KetQua").in_(["Đạt", "Pass"]))
-    if hasattr(KetQuaHocTap, "DiemChu"):
-        conds.append(getattr(KetQuaHocTap, "DiemChu").in_(["A","B","C","D","P"]))
-    pass_kq = db.session.scalar(
-        sa.select(sa.func.count()).select_from(KetQuaHocTap).where(sa.or_(*conds))
-    ) or 0
-
+    passed = sa.or_(KetQuaHocTap.DiemHe10 >= 4.0, KetQuaHocTap.DiemChu.in_(["A", "B", "C", "D", "P"]))
+    total_students, total_courses, total_kq, pass_kq = kpi_counts(passed)
     return jsonify({"kpi": {
-        "total_students": int(total_students),
-        "total_courses": int(total_courses),
+        "total_students": total_students,
+        "total_courses": total_courses,
         "pass_rate": round((pass_kq/total_kq) if total_kq else 0.0, 4),
     }})
 
@@ -120,6 +114,7 @@ def majors_create():
     data = json_body()
     it = NganhHoc(MaNganh=data.get("MaNganh"), TenNganh=data.get("TenNganh"))
     db.session.add(it)
+    bump_analytics()
     try:
         db.session.commit()
         return ok({"MaNganh": it.MaNganh, "TenNganh": it.TenNganh})
@@ -133,6 +128,7 @@ def majors_update(ma):
     it = NganhHoc.query.get(ma)
     if not it: return bad("Không tìm thấy ngành", 404)
     it.TenNganh = json_body().get("TenNganh", it.TenNganh)
+    bump_global()
     db.session.commit(); return ok()
 
 @bp.delete("/api/admin/majors/<ma>")
@@ -140,6 +136,7 @@ def majors_update(ma):
 def majors_delete(ma):
     it = NganhHoc.query.get(ma)
     if not it: return bad("Không tìm thấy ngành", 404)
+    bump_global()
     db.session.delete(it); db.session.commit(); return ok()
 
 @bp.get("/api/admin/classes")
@@ -154,6 +151,7 @@ def classes_create():
     data = json_body()
     it = LopHoc(MaLop=data.get("MaLop"), TenLop=data.get("TenLop") or data.get("Ten"))
     db.session.add(it)
+    bump_analytics()
     try:
         db.session.commit(); return ok()
     except Exception:
@@ -173,6 +171,7 @@ def classes_update(ma):
         return ok({"message": "Không có thay đổi"})
 
     it.TenLop = new_name
+    bump_global()
 
     import time
     tries = 3
@@ -193,6 +192,7 @@ def classes_update(ma):
 def classes_delete(ma):
     it = LopHoc.query.get(ma)
     if not it: return bad("Không tìm thấy lớp", 404)
+    bump_global()
     db.session.delete(it); db.session.commit(); return ok()
 
 @bp.get("/api/admin/courses")
@@ -215,6 +215,7 @@ def courses_create():
                  SoTinChi=int(d.get("SoTinChi") or 0),
                  TinhDiemTichLuy=bool(d.get("TinhDiemTichLuy")) if "TinhDiemTichLuy" in d else True)
     db.session.add(it)
+    bump_global()
     try:
         db.session.commit(); return ok()
     except Exception:
@@ -227,8 +228,14 @@ def courses_update(ma):
     if not it: return bad("Không tìm thấy học phần", 404)
     d = json_body()
     if "TenHP" in d: it.TenHP = d["TenHP"]
-    if "SoTinChi" in d: it.SoTinChi = int(d["SoTinChi"] or 0)
+    if "SoTinChi" in d and int(d["SoTinChi"] or 0) != it.SoTinChi:
+        it.SoTinChi = int(d["SoTinChi"] or 0)
+        db.session.flush()
+        masvs = course_students(ma)
+        refresh_student_aggregates(masvs)
+        mark_students_dirty(masvs)
     if "TinhDiemTichLuy" in d: it.TinhDiemTichLuy = bool(d["TinhDiemTichLuy"])
+    bump_global()
     db.session.commit(); return ok()
 
 @bp.delete("/api/admin/courses/<ma>")
@@ -236,6 +243,38 @@ def courses_update(ma):
 def courses_delete(ma):
     it = HocPhan.query.get(ma)
     if not it: return bad("Không tìm thấy học phần", 404)
+    bump_global()
+    db.session.delete(it); db.session.commit(); return ok()
+
+@bp.get("/api/admin/subject-aliases")
+@jwt_required()
+def subject_aliases_list():
+    rows = db.session.query(SubjectAlias).order_by(SubjectAlias.RawKey).all()
+    return jsonify({"items": [{"RawKey": x.RawKey, "MaHP": x.MaHP, "Source": x.Source,
+                               "UpdatedAt": x.UpdatedAt.isoformat(timespec="seconds") if x.UpdatedAt else None}
+                              for x in rows]})
+
+@bp.put("/api/admin/subject-aliases")
+@roles_required("Admin", "Cán bộ đào tạo")
+def subject_aliases_put():
+    d = json_body()
+    raw = (d.get("Header") or d.get("RawKey") or "").strip()
+    mahp = (d.get("MaHP") or "").strip().upper()
+    if not raw or not mahp: return bad("Thiếu Header hoặc MaHP")
+    if not db.session.get(HocPhan, mahp): return bad("Không tìm thấy học phần", 404)
+    key = _importer._norm_subject_name(raw) if _importer else raw
+    it = db.session.get(SubjectAlias, key)
+    if not it:
+        it = SubjectAlias(RawKey=key, MaHP=mahp)
+        db.session.add(it)
+    it.MaHP = mahp; it.Source = "manual"; it.UpdatedAt = datetime.utcnow()
+    db.session.commit(); return ok({"RawKey": key, "MaHP": mahp})
+
+@bp.delete("/api/admin/subject-aliases/<key>")
+@roles_required("Admin", "Cán bộ đào tạo")
+def subject_aliases_delete(key):
+    it = db.session.get(SubjectAlias, key)
+    if not it: return bad("Không tìm thấy alias", 404)
     db.session.delete(it); db.session.commit(); return ok()
 
 def _sv_dict(sv) -> Dict[str, Any]:
@@ -249,27 +288,48 @@ def _sv_dict(sv) -> Dict[str, Any]:
 @bp.get("/api/admin/students")
 @jwt_required()
 def students_list():
+    # Phân trang: ?after=<MaSV cuối trang trước> (keyset, không OFFSET) hoặc ?page= như cũ.
+    # ?count=exact|approx|none: approx không đếm toàn bộ kết quả (xem services.student_search)
     qstr = (request.args.get("q") or "").strip()
     lop  = (request.args.get("lop") or "").strip()
+    after = (request.args.get("after") or "").strip()
     page = max(int(request.args.get("page", 1)), 1)
     limit= max(min(int(request.args.get("page_size", 50)), 200), 1)
+    count_mode = (request.args.get("count") or "exact").strip().lower()
 
-    q = db.session.query(SinhVien)
+    q = (db.session.query(SinhVien, StudentAggregate)
+         .outerjoin(StudentAggregate, StudentAggregate.MaSV == SinhVien.MaSV))
     if lop:
         if hasattr(SinhVien, "Lop"):
             q = q.filter(SinhVien.Lop == lop)
         else:
             q = q.filter(SinhVien.MaLop == lop)
     if qstr:
-        conds = []
-        conds.append(SinhVien.MaSV.ilike(f"%{qstr}%"))
-        conds.append(SinhVien.HoTen.ilike(f"%{qstr}%"))
-        q = q.filter(sa.or_(*conds))
-
-    total = q.count()
-    q = q.order_by(SinhVien.MaSV).offset((page-1)*limit).limit(limit)
-    items = [_sv_dict(x) for x in q.all()]
-    return jsonify({"items": items, "total": total, "page": page, "page_size": limit})
+        q = q.filter(search_filter(qstr))
+
+    res = {"page_size": limit}
+    if count_mode == "approx":
+        res["total"], res["total_is_estimate"] = approx_count(q, bool(lop or qstr))
+    elif count_mode != "none":
+        res["total"] = q.count()
+
+    q = q.order_by(SinhVien.MaSV)
+    if after:
+        q = q.filter(SinhVien.MaSV > after)
+    else:
+        q = q.offset((page-1)*limit)
+        res["page"] = page
+    rows = q.limit(limit + 1).all()
+    items = []
+    for sv, agg in rows[:limit]:
+        d = _sv_dict(sv)
+        d["GPA4"] = round(agg.GPA4, 2) if agg and agg.GPA4 is not None else None
+        d["TinChiTichLuy"] = agg.CreditsEarned if agg else 0
+        d["TinChiNo"] = agg.DebtCredits if agg else 0
+        items.append(d)
+    res["items"] = items
+    res["next_cursor"] = items[-1]["MaSV"] if len(rows) > limit else None
+    return jsonify(res)
 
 @bp.get("/api/admin/students/<masv>")
 @jwt_required()
@@ -300,8 +360,8 @@ def students_create():
     if not u:
         u = NguoiDung(
             TenDangNhap=masv,
-            MatKhauMaHoa=bcrypt.hash(masv),
-            Email=f"{masv}@{_email_domain()}",
+            MatKhauMaHoa=hash_provisioned(masv),
+            Email=f"{masv}@{email_domain()}",
             TrangThai="Hoạt động",
             MaVaiTro=None
         )
@@ -309,6 +369,7 @@ def students_create():
 
     sv = SinhVien(MaSV=masv, HoTen=d.get("HoTen"), MaLop=d.get("Lop") or d.get("MaLop"), MaNguoiDung=u.MaNguoiDung)
     db.session.add(sv)
+    bump_students([masv])
     try:
         db.session.commit(); return ok()
     except Exception as e:
@@ -323,6 +384,7 @@ def students_update(masv):
     if "HoTen" in d: sv.HoTen = d["HoTen"]
     if "Lop" in d and hasattr(sv, "Lop"): sv.Lop = d["Lop"]
     if "MaLop" in d and hasattr(sv, "MaLop"): sv.MaLop = d["MaLop"]
+    bump_students([masv])
     db.session.commit(); return ok()
 
 @bp.delete("/api/admin/students/<masv>")
@@ -330,27 +392,45 @@ def students_update(masv):
 def students_delete(masv):
     sv = db.session.get(SinhVien, masv)
     if not sv: return bad("Không tìm thấy sinh viên", 404)
+    db.session.query(StudentAggregate).filter_by(MaSV=masv).delete()
+    bump_students([masv])
     db.session.delete(sv); db.session.commit(); return ok()
 
 @bp.get("/api/admin/configs")
 @jwt_required()
 def configs_get():
-    rows = db.session.query(SystemConfig).all()
-    values = {x.ConfigKey: x.ConfigValue for x in rows}
-    meta   = {x.ConfigKey: x.Description or "" for x in rows}
-    return jsonify({"values": values, "meta": meta})
+    return jsonify({"values": all_configs(), "meta": config_meta()})
+
+def _reapply_retake_policy(policy: str):
+    # Đổi chính sách thi lại -> tính lại LaDiemCuoiCung + bảng tổng hợp cho toàn bộ SV
+    apply_retake_policy(None, policy)
+    refresh_student_aggregates(None)
+    mark_all_students_dirty()
+    bump_global()
 
 @bp.put("/api/admin/configs")
 @roles_required("Admin")
 def configs_put():
     values = (json_body().get("values") or {})
+    if "RETAKE_POLICY_DEFAULT" in values:
+        policy = str(values["RETAKE_POLICY_DEFAULT"]).strip().lower()
+        if policy not in RETAKE_POLICIES:
+            return bad(f"RETAKE_POLICY_DEFAULT phải là một trong: {', '.join(RETAKE_POLICIES)}")
+        values = {**values, "RETAKE_POLICY_DEFAULT": policy}
     for k, v in values.items():
         row = db.session.get(SystemConfig, k)
+        old = row.ConfigValue if row else None
         if not row:
             db.session.add(SystemConfig(ConfigKey=k, ConfigValue=str(v)))
         else:
             row.ConfigValue = str(v)
-    db.session.commit(); return ok()
+        if k == "RETAKE_POLICY_DEFAULT" and old != str(v):
+            _reapply_retake_policy(str(v))
+    if values:
+        bump_analytics()
+    db.session.commit()
+    invalidate_config_cache()
+    return ok()
 
 @bp.get("/api/admin/warning/rules")
 @jwt_required()
@@ -385,16 +465,61 @@ def warning_cases():
         })
     return jsonify({"items": items})
 
-@bp.post("/api/admin/warning/scan")
+def _wants_async():
+    return request.args.get("async") in ("1", "true", "yes")
+
+def _submit_job(kind: str, fn, *, upload: bool = False):
+    # Quyền đã được kiểm tra lúc gửi (roles_required của route); job chạy fn với danh tính người gửi
+    # (jobs.actor()), không dùng lại token -> job chờ lâu hơn hạn token vẫn chạy.
+    # upload=True: fn đọc request.args/request.files như importer -> chạy trong request context dựng
+    # từ tham số + tệp upload (chép ra file tạm), không kèm header Authorization
+    if not upload:
+        job_id = jobs.submit(kind, fn, created_by=get_jwt_identity())
+        return jsonify({"ok": True, "job_id": job_id, "status_url": f"/api/jobs/{job_id}"}), 202
+    app = current_app._get_current_object()
+    path = request.path
+    args = request.args.to_dict(flat=False)
+    args.pop("async", None)
+    up = request.files.get("file")
+    payload = (upload_reader.spool(up), up.filename) if up else None
+
+    def _run():
+        if not payload:
+            with app.test_request_context(path, method="POST", query_string=args):
+                return fn()
+        try:
+            with open(payload[0], "rb") as fh, app.test_request_context(
+                    path, method="POST", query_string=args, data={"file": (fh, payload[1])}):
+                return fn()
+        finally:
+            os.unlink(payload[0])
+
+    job_id = jobs.submit(kind, _run, created_by=get_jwt_identity())
+    return jsonify({"ok": True, "job_id": job_id, "status_url": f"/api/jobs/{job_id}"}), 202
+
+@bp.get("/api/jobs/<job_id>")
 @roles_required("Admin")
-def warning_scan_run():
+def job_status(job_id):
+    job = jobs.get_job(job_id)
+    if not job: return bad("Không tìm thấy job", 404)
+    return jsonify(job)
+
+def _warning_scan(incremental: bool, workers: int):
     from .warning_scan import scan_all_warnings
     try:
-        res = scan_all_warnings()
-        return jsonify(res)
+        return jsonify(scan_all_warnings(incremental=incremental, workers=workers))
     except Exception as e:
         return bad(f"Lỗi quét cảnh báo: {e}")
 
+@bp.post("/api/admin/warning/scan")
+@roles_required("Admin")
+def warning_scan_run():
+    incremental = request.args.get("mode") == "incremental"
+    workers = request.args.get("workers", type=int) or current_app.config.get("WARNING_SCAN_WORKERS", 1)
+    if _wants_async():
+        return _submit_job("warning_scan", lambda: _warning_scan(incremental, workers))
+    return _warning_scan(incremental, workers)
+
 def _import_resp(summary=None, preview=None, warnings=None):
     return jsonify({
         "summary": summary or {"total_rows": 0, "created": 0, "updated": 0, "skipped": 0, "warnings": (warnings or [])},
@@ -402,16 +527,21 @@ def _import_resp(summary=None, preview=None, warnings=None):
         "warnings": warnings or []
     })
 
+def _import_grades():
+    return _importer.import_grades(  # type: ignore
+        preview=(request.args.get("preview", "1") == "1"),
+        allow_update=(request.args.get("allow_update", "0") == "1"),
+        hoc_ky_default=request.args.get("hocky"),
+        retake_policy=request.args.get("retake_policy") or None,
+    )
+
 @bp.post("/api/admin/import/grades")
 @roles_required("Admin")
 def import_grades():
     if _importer and hasattr(_importer, "import_grades"):
-        return _importer.import_grades(  # type: ignore
-            preview=(request.args.get("preview", "1") == "1"),
-            allow_update=(request.args.get("allow_update", "0") == "1"),
-            hoc_ky_default=request.args.get("hocky"),
-            retake_policy=request.args.get("retake_policy") or "keep-latest",
-        )
+        if _wants_async():
+            return _submit_job("import_grades", _import_grades, upload=True)
+        return _import_grades()
     return _import_resp()
 
 @bp.post("/api/admin/import/class-roster")
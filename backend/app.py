@@ -3,60 +3,42 @@ from __future__ import annotations
 import logging
 import traceback
 from functools import wraps
-import io
-import csv
 import json
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, Optional
 from sqlalchemy.engine import Engine
-from flask import Flask, jsonify, request, current_app,redirect
+from flask import Flask, jsonify, request, current_app,redirect, Response, stream_with_context
 from flask_cors import CORS
 from flask_jwt_extended import (
     JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
 )
-from passlib.context import CryptContext
-pwd_ctx = CryptContext(schemes=["bcrypt", "pbkdf2_sha256"], deprecated="auto")
-from sqlalchemy import func, case, desc
+from sqlalchemy import desc
 import os, google.generativeai as genai
 import sys,shutil
 from .models import (
     db,
-    NguoiDung, VaiTro, SinhVien, LopHoc, NganhHoc, HocPhan,
-    KetQuaHocTap,
+    NguoiDung, LopHoc, NganhHoc,
     SystemConfig, ImportLog,
-    WarningRule, WarningCase,ChuongTrinhDaoTao,
-    Khoa,
+    WarningRule, WarningCase,
 )
 from .importer import import_curriculum, import_class_roster, import_grades
 from .services.analytics_service import get_dashboard_analytics
+from .services.student_service import find_student, student_etag, cached_payload
+from .services import audit_sink
+from .services.auth_service import authenticate
+from .services.export_service import (
+    STUDENT_HEADER, GRADEBOOK_HEADER, student_rows, gradebook_rows, iter_csv, iter_xlsx,
+)
+from .services.config_service import invalidate_config_cache
 from .admin_ui import bp as admin_ui_bp
 from .admin_crud import crud_bp, roles_required
+from .migrations import init_db
 from sqlalchemy import event
 import sqlite3
 from dotenv import load_dotenv
 
 
-ALLOWED_CONFIG_KEYS = [
-    "GPA_GIOI_THRESHOLD",
-    "GPA_KHA_THRESHOLD",
-    "GPA_TRUNGBINH_THRESHOLD",
-    "TINCHI_NO_CANHCAO_THRESHOLD",
-    "EMAIL_DOMAIN",
-    "DEFAULT_MAJOR",
-    "RETAKE_POLICY_DEFAULT",
-]
-
-CONFIG_META = {
-    "GPA_GIOI_THRESHOLD": "Ngưỡng GPA xếp loại Giỏi",
-    "GPA_KHA_THRESHOLD": "Ngưỡng GPA xếp loại Khá",
-    "GPA_TRUNGBINH_THRESHOLD": "Ngưỡng GPA Cảnh báo",
-    "TINCHI_NO_CANHCAO_THRESHOLD": "Số tín chỉ nợ để cảnh báo",
-    "EMAIL_DOMAIN": "Tên miền email nội bộ",
-    "DEFAULT_MAJOR": "Mã ngành mặc định khi chưa xác định",
-    "RETAKE_POLICY_DEFAULT": "Chính sách thi lại mặc định (keep-latest|best)",
-}
-
 RUN_DIR = Path(sys.executable).parent if getattr(sys, "frozen", False) else Path(__file__).parent
 BASE = Path(getattr(sys, "_MEIPASS", RUN_DIR))
 
@@ -133,8 +115,9 @@ def _actor_username() -> Optional[str]:
 
 def _audit_db(endpoint: str, summary: Dict[str, Any], *, filename: Optional[str]=None, affected: Optional[str]=None):
 
+    # Chỉ xếp hàng, luồng nền của audit_sink ghi theo lô; không commit session của request
     try:
-        db.session.add(ImportLog(
+        audit_sink.record(
             When = datetime.now(timezone.utc),  # tránh DeprecationWarning
             Actor = _actor_username() or str(_actor_id() or ""),
             Endpoint = endpoint,
@@ -143,18 +126,9 @@ def _audit_db(endpoint: str, summary: Dict[str, Any], *, filename: Optional[str]
             Summary = json.dumps(summary, ensure_ascii=False),
             AffectedTable = affected,
             InsertedIds = None,
-        ))
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
-
-def _ensure_warning_rule(code: str, name: str, threshold: float) -> WarningRule:
-    r = WarningRule.query.filter_by(Code=code).first()
-    if r:
-        return r
-    r = WarningRule(Code=code, Name=name, Threshold=float(threshold), Active=True, Desc=None)
-    db.session.add(r); db.session.commit()
-    return r
+        )
+    except Exception as e:
+        print(f"[AUDIT] failed: {e}")
 
 def audit(endpoint_name: str):
 
@@ -186,8 +160,10 @@ def audit(endpoint_name: str):
 
 
 
-def create_app() -> Flask:
+def create_app(config: Optional[Dict[str, Any]] = None) -> Flask:
     app = Flask(__name__)
+    # Cấu hình truyền vào (vd. khi test) được đặt trước mọi setdefault bên dưới
+    app.config.update(config or {})
 
     basedir = os.path.dirname(__file__)
     db_path = os.path.join(basedir, "app.db")
@@ -196,6 +172,27 @@ def create_app() -> Flask:
     app.config.setdefault("SECRET_KEY", os.getenv("SECRET_KEY", "dev-secret"))
     app.config.setdefault("JWT_SECRET_KEY", os.getenv("JWT_SECRET_KEY", "dev-jwt"))
     app.config.setdefault("MAX_CONTENT_LENGTH", 50 * 1024 * 1024)
+    # Số dòng mỗi lô khi đọc tệp nhập (services.upload_reader)
+    app.config.setdefault("IMPORT_CHUNK_ROWS", int(os.getenv("IMPORT_CHUNK_ROWS", "5000")))
+    # Bộ đọc XLSX: auto (calamine nếu đã cài python-calamine, không thì openpyxl) | calamine | openpyxl
+    app.config.setdefault("IMPORT_XLSX_ENGINE", os.getenv("IMPORT_XLSX_ENGINE", "auto"))
+    # Số process đọc + chuẩn hoá sheet khi nhập bảng điểm nhiều sheet; 0 = số CPU
+    app.config.setdefault("IMPORT_PARSE_WORKERS", int(os.getenv("IMPORT_PARSE_WORKERS", "0")))
+    app.config.setdefault("WARNING_SCAN_WORKERS", int(os.getenv("WARNING_SCAN_WORKERS", "1")))
+    app.config.setdefault("JOB_WORKERS", int(os.getenv("JOB_WORKERS", "1")))
+    # Chính sách băm mật khẩu (services.auth_service)
+    app.config.setdefault("PASSWORD_BCRYPT_ROUNDS", int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12")))
+    app.config.setdefault("PASSWORD_BCRYPT_ROUNDS_BY_ROLE", {})
+    app.config.setdefault("PASSWORD_BULK_PBKDF2_ROUNDS", 29000)
+    # Số process băm mật khẩu khi tạo tài khoản hàng loạt; 0 = số CPU
+    app.config.setdefault("PASSWORD_HASH_WORKERS", int(os.getenv("PASSWORD_HASH_WORKERS", "0")))
+    # Audit log ghi nền theo lô (services.audit_sink); AUDIT_ASYNC=0 để ghi đồng bộ
+    app.config.setdefault("AUDIT_ASYNC", os.getenv("AUDIT_ASYNC", "1") != "0")
+    app.config.setdefault("AUDIT_QUEUE_SIZE", 10000)
+    app.config.setdefault("AUDIT_BATCH_SIZE", 200)
+    app.config.setdefault("AUDIT_FLUSH_INTERVAL", 1.0)
+    app.config.setdefault("STUDENT_PAYLOAD_CACHE_SIZE", 512)
+    app.config.setdefault("ANALYTICS_CACHE_TTL", 300)
     app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
     app.config["SQLALCHEMY_ENGINE_OPTIONS"].setdefault("connect_args", {})
     app.config["SQLALCHEMY_ENGINE_OPTIONS"]["connect_args"].update({"timeout": 30})
@@ -216,27 +213,10 @@ def create_app() -> Flask:
         if not username or not password:
             return jsonify({"msg": "Thiếu username hoặc password"}), 400
 
-        user = NguoiDung.query.filter_by(TenDangNhap=username).first()
-        if not user:
+        auth = authenticate(username, password)
+        if not auth:
             return jsonify({"msg": "Sai username hoặc password"}), 400
-
-        ok = False
-        stored = user.MatKhauMaHoa or ""
-        try:
-            if stored and stored.startswith("$"):
-                ok = pwd_ctx.verify(password, stored)
-            else:
-                ok = (password == stored)
-                if ok:
-                    user.MatKhauMaHoa = pwd_ctx.hash(password)
-                    db.session.commit()
-        except Exception:
-            ok = False
-
-        if not ok:
-            return jsonify({"msg": "Sai username hoặc password"}), 400
-
-        role = user.vai_tro_rel.TenVaiTro if user.vai_tro_rel else "Sinh viên"
+        user, role = auth
 
         token = create_access_token(identity=str(user.MaNguoiDung),
                                     additional_claims={"username": username, "role": role})
@@ -272,25 +252,9 @@ def create_app() -> Flask:
     @jwt_required()
     def analytics_top_fails():
         ma_nganh = request.args.get("MaNganh")
-        data = get_dashboard_analytics(ma_nganh=ma_nganh) or {}
+        data = get_dashboard_analytics(ma_nganh=ma_nganh, sections=["top_failing_courses"]) or {}
         return jsonify({"items": data.get("top_failing_courses", [])})
 
-    @app.get("/api/admin/dashboard-analytics")
-    @roles_required("Admin", "Cán bộ đào tạo")
-    def dashboard_analytics():
-        import sqlalchemy as sa
-        total_students = db.session.scalar(sa.select(sa.func.count()).select_from(SinhVien)) or 0
-        total_courses  = db.session.scalar(sa.select(sa.func.count()).select_from(HocPhan)) or 0
-        total_kq       = db.session.scalar(sa.select(sa.func.count()).select_from(KetQuaHocTap)) or 0
-        pass_kq = db.session.scalar(
-            sa.select(sa.func.count()).where(
-                sa.or_(KetQuaHocTap.KetQua.in_(["Đạt","Pass"]), KetQuaHocTap.DiemHe10 >= 4.0)
-            ).select_from(KetQuaHocTap)
-        ) or 0
-        pass_rate = (pass_kq/total_kq) if total_kq else 0.0
-        return {"kpi":{"total_students": total_students, "total_courses": total_courses, "pass_rate": round(pass_rate,4)}}
-
-
     @app.post("/api/admin/import/curriculum")
     @roles_required("Admin")
     @audit("POST /api/admin/import/curriculum")
@@ -320,31 +284,6 @@ def create_app() -> Flask:
             data, code = rv
             return (data if hasattr(data, "response") else jsonify(data), code)
         return rv if hasattr(rv, "response") else jsonify(rv)
-    @app.get("/api/admin/configs")
-    @jwt_required()
-    def api_get_configs():
-        values = {k: (db.session.get(SystemConfig, k).ConfigValue if db.session.get(SystemConfig, k) else "") for k in ALLOWED_CONFIG_KEYS}
-        return jsonify({"values": values, "meta": CONFIG_META})
-
-    @app.put("/api/admin/configs")
-    @jwt_required()
-    def api_put_configs():
-        body = request.get_json(silent=True) or {}
-        changed = {}
-        for k, v in (body.get("values") or {}).items():
-            if k not in ALLOWED_CONFIG_KEYS:
-                continue
-            row = db.session.get(SystemConfig, k)
-            if not row:
-                row = SystemConfig(ConfigKey=k, ConfigValue=str(v))
-                db.session.add(row)
-            else:
-                row.ConfigValue = str(v)
-            changed[k] = str(v)
-        db.session.commit()
-        _audit_db("PUT /api/admin/configs", {"changed": changed}, affected="SystemConfig")
-        return jsonify({"msg": "OK", "changed": changed})
-
     @app.get("/api/admin/import/logs")
     @jwt_required()
     def api_import_logs():
@@ -359,56 +298,6 @@ def create_app() -> Flask:
         } for r in rows]
         return jsonify({"items": items})
 
-    @app.post("/api/admin/warning/scan")
-    @jwt_required()
-    def warning_scan():
-        cfg = {c.ConfigKey: c.ConfigValue for c in SystemConfig.query.all()}
-        gpa_th = float(cfg.get("GPA_TRUNGBINH_THRESHOLD", 2.0))
-        debt_th = float(cfg.get("TINCHI_NO_CANHCAO_THRESHOLD", 10))
-
-        r_gpa = _ensure_warning_rule("GPA_BELOW", "GPA dưới ngưỡng", gpa_th)
-        r_debt = _ensure_warning_rule("DEBT_OVER", "Nợ tín chỉ vượt ngưỡng", debt_th)
-
-        sub = (db.session.query(
-                    KetQuaHocTap.MaSV.label("MaSV"),
-                    func.sum((KetQuaHocTap.DiemHe4 * (case((HocPhan.SoTinChi != None, HocPhan.SoTinChi), else_=0)))).label("S"),
-                    func.sum(case((HocPhan.SoTinChi != None, HocPhan.SoTinChi), else_=0)).label("W"),
-                    func.sum(case((KetQuaHocTap.DiemHe4 < 1.0, HocPhan.SoTinChi), else_=0)).label("DebtTC"),
-                )
-                .join(HocPhan, HocPhan.MaHP == KetQuaHocTap.MaHP, isouter=True)
-                .filter(KetQuaHocTap.LaDiemCuoiCung.is_(True))
-                .group_by(KetQuaHocTap.MaSV)
-                ).subquery()
-
-        q = (db.session.query(
-                SinhVien.MaSV, SinhVien.HoTen,
-                (sub.c.S / func.nullif(sub.c.W, 0)).label("GPA4"),
-                sub.c.DebtTC
-            )
-            .join(sub, sub.c.MaSV == SinhVien.MaSV, isouter=True))
-
-        ma_lop = request.args.get("MaLop")
-        if ma_lop:
-            q = q.filter(SinhVien.MaLop == ma_lop)
-
-        affected = 0
-        for masv, hoten, gpa4, debttc in q.all():
-            gpa4 = float(gpa4 or 0.0); debttc = float(debttc or 0.0)
-            if gpa4 > 0 and gpa4 < r_gpa.Threshold:
-                exists = WarningCase.query.filter_by(RuleId=r_gpa.Id, MaSV=masv, Status="open").first()
-                if not exists:
-                    db.session.add(WarningCase(RuleId=r_gpa.Id, MaSV=masv, Value=gpa4, Level="critical", Status="open"))
-                    affected += 1
-            if debttc >= r_debt.Threshold:
-                exists = WarningCase.query.filter_by(RuleId=r_debt.Id, MaSV=masv, Status="open").first()
-                if not exists:
-                    db.session.add(WarningCase(RuleId=r_debt.Id, MaSV=masv, Value=debttc, Level="warning", Status="open"))
-                    affected += 1
-
-        db.session.commit()
-        _audit_db("POST /api/admin/warning/scan", {"created_cases": affected}, affected="WarningCase")
-        return jsonify({"created_cases": affected})
-
     @app.get("/api/admin/warning/cases")
     @jwt_required()
     def warning_cases():
@@ -474,18 +363,25 @@ def create_app() -> Flask:
     @app.get("/api/admin/export/students.csv")
     @jwt_required()
     def export_students_csv():
-        q = (db.session.query(SinhVien.MaSV, SinhVien.HoTen, LopHoc.TenLop, NganhHoc.TenNganh)
-             .join(LopHoc, LopHoc.MaLop == SinhVien.MaLop, isouter=True)
-             .join(NganhHoc, NganhHoc.MaNganh == LopHoc.MaNganh, isouter=True))
-        buf = io.StringIO()
-        w = csv.writer(buf)
-        w.writerow(["MaSV","HoTen","Lop","Nganh"])
-        for msv, ht, lop, nganh in q.all():
-            w.writerow([msv, ht, lop or "", nganh or ""])
-        from flask import Response
-        return Response(buf.getvalue(), mimetype="text/csv",
+        # Stream theo lô từ cursor, không dựng toàn bộ CSV trong RAM
+        return Response(stream_with_context(iter_csv(STUDENT_HEADER, student_rows())), mimetype="text/csv",
                         headers={"Content-Disposition": "attachment; filename=students.csv"})
 
+    @app.get("/api/admin/export/grades.<fmt>")
+    @roles_required("Admin", "Cán bộ đào tạo")
+    def export_gradebook(fmt: str):
+        if fmt not in ("csv", "xlsx"):
+            return jsonify({"msg": "Định dạng không hỗ trợ (csv|xlsx)"}), 400
+        rows = gradebook_rows(ma_lop=request.args.get("MaLop"), ma_nganh=request.args.get("MaNganh"),
+                              hoc_ky=request.args.get("HocKy"))
+        if fmt == "csv":
+            body, mimetype = iter_csv(GRADEBOOK_HEADER, rows), "text/csv"
+        else:
+            body = iter_xlsx(GRADEBOOK_HEADER, rows, "KetQuaHocTap")
+            mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        return Response(stream_with_context(body), mimetype=mimetype,
+                        headers={"Content-Disposition": f"attachment; filename=grades.{fmt}"})
+
     @app.get("/healthz")
     def healthz():
         return jsonify({"status": "ok"})
@@ -498,149 +394,17 @@ def create_app() -> Flask:
     @app.get("/api/student/data")
     @jwt_required()
     def student_data_compat():
-        from sqlalchemy import func, or_
-
-        uid = _actor_id()
-        u = db.session.get(NguoiDung, uid) if uid else None
-
-        sv = None
-        try:
-            if u and hasattr(u, "sinh_vien_rel") and u.sinh_vien_rel:
-                sv = u.sinh_vien_rel
-        except Exception:
-            pass
-        if not sv and hasattr(SinhVien, "MaNguoiDung"):
-            try:
-                sv = db.session.query(SinhVien).filter_by(MaNguoiDung=uid).first()
-            except Exception:
-                sv = None
-        if not sv and u and getattr(u, "TenDangNhap", None):
-            try:
-                sv = db.session.get(SinhVien, u.TenDangNhap)
-            except Exception:
-                sv = None
+        u, sv = find_student(_actor_id())
         if not sv:
             return jsonify({"msg": "Không tìm thấy thông tin sinh viên"}), 404
-
-        masv = getattr(sv, "MaSV", None) or getattr(sv, "id", None)
-
-        ma_lop = getattr(sv, "MaLop", None) or getattr(sv, "Lop", None)
-        lop = db.session.get(LopHoc, ma_lop) if ma_lop else None
-        nganh = db.session.get(NganhHoc, getattr(lop, "MaNganh", None)) if lop else None
-
-        kq_list = db.session.query(KetQuaHocTap).filter_by(MaSV=masv).all()
-
-        def _row(kq):
-            mahp = getattr(kq, "MaHP", None)
-            hp = db.session.get(HocPhan, mahp) if mahp else None
-            return {
-                "HocKy": getattr(kq, "HocKy", None),
-                "MaHP": mahp,
-                "TenHP": getattr(hp, "TenHP", None) or getattr(kq, "TenHP", None),
-                "SoTinChi": getattr(hp, "SoTinChi", None) or getattr(kq, "SoTinChi", 0),
-                "DiemHe10": getattr(kq, "DiemHe10", None),
-                "DiemHe4": getattr(kq, "DiemHe4", None),
-                "DiemChu": getattr(kq, "DiemChu", None),
-                "TinhDiemTichLuy": (bool(getattr(hp, "TinhDiemTichLuy", True)) if hp
-                                    else bool(getattr(kq, "TinhDiemTichLuy", True))),
-                "LaDiemCuoiCung": getattr(kq, "LaDiemCuoiCung", None),
-            }
-
-        items = [_row(kq) for kq in kq_list]
-
-        def _digits_to_int(v):
-            if v is None: return None
-            s = str(v).strip()
-            dg = "".join(ch for ch in s if ch.isdigit())
-            return int(dg) if dg else None
-
-        plan = []
-
-        CTDT = ChuongTrinhDaoTao
-        if CTDT and hasattr(CTDT, "MaNganh") and hasattr(CTDT, "HocKy"):
-            q = db.session.query(CTDT)
-            rows = []
-            ma_nganh = getattr(lop, "MaNganh", None)
-            if ma_nganh:
-                rows = (q.filter(CTDT.MaNganh == ma_nganh)
-                        .order_by(CTDT.HocKy, CTDT.MaHP).all())
-            if not rows and ma_nganh:
-                prefix = str(ma_nganh)[:5]
-                rows = (q.filter(CTDT.MaNganh.like(f"{prefix}%"))
-                        .order_by(CTDT.HocKy, CTDT.MaHP).all())
-            if not rows:
-                rows = q.order_by(CTDT.HocKy, CTDT.MaHP).all()
-
-            for r in rows:
-                hp = db.session.get(HocPhan, getattr(r, "MaHP", None))
-                plan.append({
-                    "HocKy": _digits_to_int(getattr(r, "HocKy", None)),
-                    "MaHP": getattr(r, "MaHP", None),
-                    "TenHP": getattr(hp, "TenHP", None) or getattr(r, "hoc_phan_rel", None).TenHP if hasattr(r,
-                                                                                                             "hoc_phan_rel") and r.hoc_phan_rel else None,
-                    "SoTinChi": (getattr(hp, "SoTinChi", 0) if hp else 0) or getattr(r, "SoTinChi", 0),
-                })
-
-        if not plan:
-            hk_map_kq = dict(db.session.query(
-                KetQuaHocTap.MaHP, func.min(KetQuaHocTap.HocKy)
-            ).group_by(KetQuaHocTap.MaHP).all())
-
-            hps = (db.session.query(HocPhan)
-                   .filter(or_(HocPhan.TinhDiemTichLuy == True, HocPhan.TinhDiemTichLuy.is_(None)))
-                   .order_by(HocPhan.MaHP).all())
-
-            for hp in hps:
-                hk = hk_map_kq.get(hp.MaHP)
-                hk_int = _digits_to_int(hk)
-                plan.append({
-                    "HocKy": hk_int,
-                    "MaHP": hp.MaHP,
-                    "TenHP": hp.TenHP,
-                    "SoTinChi": hp.SoTinChi or 0,
-                })
-        khoa_name = None
-        try:
-            k = getattr(nganh, "khoa", None)
-            if k:
-                khoa_name = getattr(k, "TenKhoa", None) or getattr(k, "Name", None)
-        except Exception:
-            pass
-        if not khoa_name:
-            try:
-                mk = getattr(nganh, "MaKhoa", None)
-                if mk:
-                    k = db.session.get(Khoa, mk)
-                    if k:
-                        khoa_name = getattr(k, "TenKhoa", None) or getattr(k, "Name", None)
-            except Exception:
-                pass
-
-        email = getattr(u, "Email", None)
-        if not email:
-            try:
-                email = getattr(getattr(sv, "nguoi_dung_rel", None), "Email", None)
-            except Exception:
-                email = None
-        def _hk_key(x):
-            try:
-                return int(x.get("HocKy") or 0)
-            except:
-                return 0
-
-        plan.sort(key=lambda x: (_hk_key(x), str(x.get("MaHP") or "")))
-
-        return jsonify({
-            "MaSV": masv,
-            "HoTen": getattr(sv, "HoTen", None),
-            "NgaySinh": (getattr(sv, "NgaySinh", None).strftime("%d/%m/%Y")if getattr(sv, "NgaySinh", None) else None),
-            "Lop": getattr(lop, "TenLop", None) or ma_lop,
-            "Nganh": getattr(nganh, "TenNganh", None),
-            "Khoa": khoa_name,
-            "Email":email,
-            "KetQuaHocTap": items,
-            "ChuongTrinhDaoTao": plan
-        })
+        etag = student_etag(u, sv)
+        if request.if_none_match.contains(etag):
+            resp = app.response_class(status=304)
+        else:
+            resp = app.response_class(cached_payload(u, sv, etag), mimetype="application/json")
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "private, no-cache"
+        return resp
 
     @app.get("/api/admin/classes")
     @roles_required("Admin", "Cán bộ đào tạo")
@@ -711,7 +475,7 @@ def create_app() -> Flask:
 if __name__ == "__main__":
     app = create_app()
     with app.app_context():
-        db.create_all()
+        init_db()
         if SystemConfig.query.count() == 0:
             defaults = {
                 "EMAIL_DOMAIN": "vui.edu.vn",
@@ -725,4 +489,5 @@ if __name__ == "__main__":
             for k, v in defaults.items():
                 db.session.add(SystemConfig(ConfigKey=k, ConfigValue=str(v)))
             db.session.commit()
-    app.run(debug=True, port=5000, use_reloader=False, threaded=False)
+            invalidate_config_cache()
+    app.run(debug=True, port=5000, use_reloader=False, threaded=True)
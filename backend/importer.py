@@ -1,23 +1,41 @@
 # backend/importer.py
 from __future__ import annotations
-import io
+import hashlib
 import json
+import math
+import multiprocessing
+import os
+import pickle
+import re
+import tempfile
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, asdict
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
 import pandas as pd
-from flask import request, jsonify
+from flask import current_app, request, jsonify
 from flask_jwt_extended import get_jwt_identity
 from numpy import select
-from passlib.hash import bcrypt
+import sqlalchemy as sa
 from sqlalchemy import func
-from difflib import SequenceMatcher
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .utils_import import parse_scores, grade_points, detect_header_row
+from .services.course_matcher import course_index
+from .warning_scan import mark_students_dirty
+from .services.aggregate_service import apply_retake_policy, refresh_student_aggregates
+from .services import config_service, audit_sink, upload_reader, import_fingerprint
+from .services.auth_service import hash_provisioned, hash_provisioned_many
+from .services.jobs import actor as job_actor, progress as job_progress
+from .services.data_version import GLOBAL, bump_global, bump_students, versions
 from .models import (
     db,
     HocPhan, LopHoc, NganhHoc,
     NguoiDung, VaiTro,
     SinhVien, KetQuaHocTap,
-    SystemConfig, ImportLog, GradeAuditLog,ChuongTrinhDaoTao
+    GradeAuditLog,ChuongTrinhDaoTao,
+    SubjectAlias,
 )
 
 
@@ -37,11 +55,22 @@ class ImportSummary:
 
 
 
+def _actor() -> Optional[str]:
+    # Trong job nền: người đã gửi job; trong request: danh tính JWT
+    ident = job_actor()
+    if ident is not None:
+        return ident
+    try:
+        return get_jwt_identity()
+    except Exception:
+        return None
+
+
 def _actor_id() -> int:
+    ident = _actor()
     try:
-        ident = get_jwt_identity()
         return int(ident) if ident is not None else 0
-    except Exception:
+    except ValueError:
         return 0
 
 
@@ -50,38 +79,29 @@ def _get_file_df() -> Tuple[pd.DataFrame, str]:
     if not f:
         raise ValueError("Thiếu file (form field 'file')")
     filename = f.filename or "upload.xlsx"
-    content = f.read()
-    buf = io.BytesIO(content)
+    path = upload_reader.spool(f)
     try:
-        if filename.lower().endswith(".csv"):
-            df = pd.read_csv(buf)
-        else:
-            df = pd.read_excel(buf, dtype=str)
-    except Exception as e:
-        raise ValueError(f"Lỗi đọc file: {e}")
+        # CTĐT là tệp nhỏ, cần cả bảng; vẫn đọc từ file tạm thay vì giữ bytes trong bộ nhớ
+        dtype = None if filename.lower().endswith(".csv") else str
+        df = upload_reader.read_frame(path, filename, dtype=dtype)
+    finally:
+        os.unlink(path)
     return df, filename
 
 
-def _audit_import(*, endpoint: str, affected: str, summary: Dict[str, Any], filename: Optional[str] = None):
-    try:
-        actor = get_jwt_identity() or ""
-    except Exception:
-        actor = ""
-    try:
-        log = ImportLog(
-            When=datetime.utcnow(),
-            Actor=str(actor),
-            Endpoint=endpoint,
-            Params=json.dumps(request.args.to_dict(), ensure_ascii=False),
-            Filename=filename,
-            Summary=json.dumps(summary, ensure_ascii=False),
-            AffectedTable=affected,
-            InsertedIds=None,
-        )
-        db.session.add(log)
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
+def _audit_import(*, endpoint: str, affected: str, summary: Dict[str, Any], filename: Optional[str] = None,
+                  file_hash: Optional[str] = None):
+    audit_sink.record(
+        When=datetime.utcnow(),
+        Actor=str(_actor() or ""),
+        Endpoint=endpoint,
+        Params=json.dumps(request.args.to_dict(), ensure_ascii=False),
+        Filename=filename,
+        Summary=json.dumps(summary, ensure_ascii=False, default=str),
+        AffectedTable=affected,
+        InsertedIds=None,
+        FileHash=file_hash,
+    )
 
 
 def _ensure_student_user(masv: str, email_domain: str) -> int:
@@ -91,7 +111,7 @@ def _ensure_student_user(masv: str, email_domain: str) -> int:
     vr = VaiTro.query.filter_by(TenVaiTro="Sinh viên").first()
     u = NguoiDung(
         TenDangNhap=masv,
-        MatKhauMaHoa=bcrypt.hash(masv),
+        MatKhauMaHoa=hash_provisioned(masv),
         Email=f"{masv}@{email_domain}",
         TrangThai="Hoạt động",
         MaVaiTro=vr.MaVaiTro if vr else None,
@@ -100,22 +120,188 @@ def _ensure_student_user(masv: str, email_domain: str) -> int:
     return u.MaNguoiDung
 
 
-def _retake_apply_policy(masv: str, mahp: str, new_rec: KetQuaHocTap, policy: str = "keep-latest"):
-    policy = (policy or "keep-latest").strip().lower()
-    existing = KetQuaHocTap.query.filter_by(MaSV=masv, MaHP=mahp).order_by(KetQuaHocTap.MaKQ.asc()).all()
-    if not existing:
-        new_rec.LaDiemCuoiCung = True
-        return
-    if policy == "best":
-        all_recs = existing + [new_rec]
-        best = max(all_recs, key=lambda r: (r.DiemHe4 or 0.0, r.HocKy or ""))
-        for r in all_recs:
-            r.LaDiemCuoiCung = (r is best)
+_IN_CHUNK = 900          # dưới giới hạn 999 biến của SQLite cũ
+_UPSERT_CHUNK = 2000
+
+
+def _chunks(seq, size: int):
+    seq = list(seq)
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def _prefetch_students(masvs) -> Dict[str, SinhVien]:
+    out: Dict[str, SinhVien] = {}
+    for part in _chunks(set(masvs), _IN_CHUNK):
+        for sv in db.session.query(SinhVien).filter(SinhVien.MaSV.in_(part)):
+            out[sv.MaSV] = sv
+    return out
+
+
+def _provision_accounts(masvs, email_domain: str, role_id, *, preview: bool):
+    # Tạo NguoiDung cho các MaSV chưa có tài khoản, tách thành một pha riêng:
+    # băm mật khẩu ban đầu song song (process pool) rồi insert một lần bằng executemany.
+    # -> ({MaSV: MaNguoiDung}, thống kê); preview chỉ đếm, không băm.
+    import time
+    uids: Dict[str, int] = {}
+    for part in _chunks(set(masvs), _IN_CHUNK):
+        for name, uid in db.session.query(NguoiDung.TenDangNhap, NguoiDung.MaNguoiDung).filter(
+                NguoiDung.TenDangNhap.in_(part)):
+            uids[name] = uid
+    new = [m for m in dict.fromkeys(masvs) if m not in uids]
+    stats = {"accounts_created": len(new), "hash_seconds": 0.0, "insert_seconds": 0.0, "hash_workers": 0}
+    if preview or not new:
+        return uids, stats
+
+    t0 = time.perf_counter()
+    hashes, workers = hash_provisioned_many(new)
+    t1 = time.perf_counter()
+    db.session.execute(NguoiDung.__table__.insert(), [{
+        "TenDangNhap": m, "MatKhauMaHoa": h, "Email": f"{m}@{email_domain}".lower(),
+        "TrangThai": "Hoạt động", "MaVaiTro": role_id,
+    } for m, h in zip(new, hashes)])
+    for part in _chunks(new, _IN_CHUNK):
+        for name, uid in db.session.query(NguoiDung.TenDangNhap, NguoiDung.MaNguoiDung).filter(
+                NguoiDung.TenDangNhap.in_(part)):
+            uids[name] = uid
+    stats.update(hash_seconds=round(t1 - t0, 3), insert_seconds=round(time.perf_counter() - t1, 3),
+                 hash_workers=workers)
+    return uids, stats
+
+
+_GRADE_VALUES = ("DiemHe10", "DiemHe4", "DiemChu", "TinhDiemTichLuy")
+
+
+def _prefetch_grades(masvs) -> Dict[Tuple[str, str, str], tuple]:
+    # (MaSV, MaHP, HocKy) -> giá trị đang lưu theo _GRADE_VALUES, để bỏ qua ô không đổi
+    t = KetQuaHocTap.__table__
+    found = {}
+    for part in _chunks(set(masvs), _IN_CHUNK):
+        rows = db.session.execute(
+            sa.select(t.c.MaSV, t.c.MaHP, t.c.HocKy, *(t.c[c] for c in _GRADE_VALUES)).where(t.c.MaSV.in_(part)))
+        found.update(((r[0], r[1], r[2]), tuple(r[3:])) for r in rows)
+    return found
+
+
+def _upsert_grades(records: List[Dict[str, Any]], *, allow_update: bool):
+    # INSERT ... ON CONFLICT(MaSV, MaHP, HocKy) dựa trên ux_KetQuaHocTap_MaSV_MaHP_HocKy
+    stmt = sqlite_insert(KetQuaHocTap.__table__)
+    if allow_update:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["MaSV", "MaHP", "HocKy"],
+            set_={
+                "DiemHe10": stmt.excluded.DiemHe10,
+                "DiemHe4": stmt.excluded.DiemHe4,
+                "DiemChu": stmt.excluded.DiemChu,
+                "TinhDiemTichLuy": stmt.excluded.TinhDiemTichLuy,
+            },
+        )
     else:
-        for r in existing:
-            r.LaDiemCuoiCung = False
-        new_rec.LaDiemCuoiCung = True
-
+        stmt = stmt.on_conflict_do_nothing(index_elements=["MaSV", "MaHP", "HocKy"])
+    for part in _chunks(records, _UPSERT_CHUNK):
+        db.session.execute(stmt, [{"LaDiemCuoiCung": True, **r} for r in part])
+
+
+def _norm_text(s: str) -> str:
+    s = unicodedata.normalize("NFKD", s or "")
+    s = "".join(c for c in s if not unicodedata.combining(c))
+    return s.strip().lower()
+
+
+def _norm_key(s: str) -> str:
+    s = _norm_text(s)
+    s = re.sub(r'[\s\u00A0\u200B-\u200D\uFEFF]+', '', s)
+    for ch in ("_", "-", ".", "/"):
+        s = s.replace(ch, "")
+    return s
+
+
+def _norm_subject_name(s: str) -> str:
+    s = _norm_key(str(s))
+    s = re.sub(r'^(diem|diemmon|mon|hp|hocphan|tbc|tbcht|tbcht4|gpa|xeploai)+', '', s)
+    s = re.sub(r'\(.*?\)', '', s)
+    s = re.sub(r'(lan|thi|hk)\d+$', '', s)
+    s = re.sub(r'_{2,}', '_', s).strip('_')
+    s = s.replace('lt', 'laptrinh')  # 'LT C' -> 'laptrinhc'
+    return s
+
+
+@dataclass(frozen=True)
+class _Course:
+    # Bản sao thuần của HocPhan cho pha chuẩn hoá (gửi được sang process con)
+    MaHP: str
+    TenHP: str
+    SoTinChi: int
+    TinhDiemTichLuy: bool
+
+
+def _course_catalog() -> Tuple[Dict[str, _Course], Dict[str, _Course]]:
+    # -> (theo MaHP viết hoa, theo TenHP chuẩn hoá)
+    by_ma, by_ten = {}, {}
+    for h in db.session.query(HocPhan).all():
+        c = _Course(h.MaHP, h.TenHP, int(h.SoTinChi or 0), bool(h.TinhDiemTichLuy))
+        by_ma[(h.MaHP or "").strip().upper()] = c
+        if h.TenHP:
+            by_ten[_norm_subject_name(h.TenHP)] = c
+    return by_ma, by_ten
+
+
+def _subject_aliases(keys=None) -> Dict[str, Tuple[str, str]]:
+    # RawKey -> (MaHP, Source); keys=None: cả bảng (gửi kèm sang process con)
+    q = db.session.query(SubjectAlias.RawKey, SubjectAlias.MaHP, SubjectAlias.Source)
+    if keys is None:
+        return {k: (m, src) for k, m, src in q}
+    out = {}
+    for part in _chunks({k for k in keys if k}, _IN_CHUNK):
+        out.update((k, (m, src)) for k, m, src in q.filter(SubjectAlias.RawKey.in_(part)))
+    return out
+
+
+def _resolve_subject_columns(cols, by_ma: Dict[str, _Course], by_ten: Dict[str, _Course],
+                             aliases: Optional[Dict[str, Tuple[str, str]]] = None):
+    # Khớp cột -> học phần một lần cho cả sheet. Thứ tự: alias nhập tay, mã/tên chính xác,
+    # alias đã học từ lần nhập trước, rồi fuzzy qua chỉ mục trigram.
+    # aliases=None: nạp từ SubjectAlias; truyền sẵn thì không chạm DB (process con).
+    keys = {c: _norm_subject_name(str(c)) for c in cols}
+    if aliases is None:
+        aliases = _subject_aliases(keys.values())
+    index = None
+
+    resolved: Dict[Any, Tuple[Optional[_Course], str, Optional[str]]] = {}
+    hints: List[str] = []
+    for col, key in keys.items():
+        al = aliases.get(key)
+        hobj, source = None, None
+        if al is not None and al[1] == "manual":
+            hobj, source = by_ma.get(al[0]), "alias"
+        if not hobj:
+            hobj = by_ma.get(str(col).strip().upper()) or by_ten.get(key)
+            source = "exact" if hobj else None
+        if not hobj and al is not None:
+            hobj, source = by_ma.get(al[0]), "alias"
+        if not hobj:
+            if index is None:
+                index = course_index({k: h.MaHP for k, h in by_ten.items()})
+            cand = by_ma.get(index.lookup(key) or "")
+            if cand:
+                hobj, source = cand, "fuzzy"
+                hints.append(f"[gợi ý] Cột '{col}' khớp gần với học phần '{cand.TenHP}' (fuzzy)")
+        resolved[col] = (hobj, key, source)
+    return resolved, hints
+
+
+def _remember_subject_aliases(resolved):
+    rows = [{"RawKey": key, "MaHP": hobj.MaHP, "Source": "fuzzy", "UpdatedAt": datetime.utcnow()}
+            for hobj, key, source in resolved.values() if source == "fuzzy" and key]
+    if not rows:
+        return
+    stmt = sqlite_insert(SubjectAlias.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["RawKey"],
+        set_={"MaHP": stmt.excluded.MaHP, "UpdatedAt": stmt.excluded.UpdatedAt},
+        where=(SubjectAlias.__table__.c.Source != "manual"),
+    )
+    db.session.execute(stmt, rows)
 
 
 def import_curriculum(*, preview: bool = True, allow_update: bool = True, replace: bool = False):
@@ -245,6 +431,7 @@ def import_curriculum(*, preview: bool = True, allow_update: bool = True, replac
     if preview:
         db.session.rollback()
     else:
+        bump_global()
         db.session.commit()
 
     try:
@@ -266,11 +453,9 @@ def import_curriculum(*, preview: bool = True, allow_update: bool = True, replac
 
 def import_class_roster(*, preview: bool = True, allow_update: bool = True):
 
-    import io, math, unicodedata
-    from datetime import datetime, timedelta
+    import unicodedata
     import pandas as pd
     from flask import request, jsonify
-    from passlib.hash import bcrypt
 
     HEADER_TOKENS = {
         "masinhvien": {"masinhvien", "ma sinh vien", "masv", "mssv", "studentid", "id", "mã sinh viên"},
@@ -280,17 +465,6 @@ def import_class_roster(*, preview: bool = True, allow_update: bool = True):
     }
 
 
-    def _is_header_like(masv_txt: str, hoten_txt: str, ngs_raw: str, nois_txt: str) -> bool:
-        m = _norm_key(masv_txt or "")
-        h = _norm_key(hoten_txt or "")
-        d = _norm_key(ngs_raw or "")
-        n = _norm_key(nois_txt or "")
-        return (
-                m in HEADER_TOKENS["masinhvien"] or
-                h in HEADER_TOKENS["hovaten"] or
-                d in HEADER_TOKENS["ngaysinh"] or
-                n in HEADER_TOKENS["noisinh"]
-        )
     def _norm_text(s: str) -> str:
         s = unicodedata.normalize("NFKD", s or "")
         s = "".join(c for c in s if not unicodedata.combining(c))
@@ -302,40 +476,12 @@ def import_class_roster(*, preview: bool = True, allow_update: bool = True):
             s = s.replace(ch, "")
         return s
 
-    def _parse_date(v):
-        if v is None or (isinstance(v, float) and math.isnan(v)) or str(v).strip() == "":
-            return None
-        if isinstance(v, (int, float)) and not isinstance(v, bool):
-            try:
-                return (datetime(1899, 12, 30) + timedelta(days=float(v))).date()
-            except Exception:
-                pass
-        dt = pd.to_datetime(str(v).replace("-", "/"), dayfirst=True, errors="coerce")
-        return None if pd.isna(dt) else dt.date()
-
-    def _email_domain() -> str:
-        row = db.session.get(SystemConfig, "EMAIL_DOMAIN")
-        return row.ConfigValue if row else "vui.edu.vn"
-
     def _ensure_role_sinhvien_id():
         r = db.session.query(VaiTro).filter(VaiTro.TenVaiTro.in_(["SinhVien", "Sinh Viên", "student"])).first()
         if not r:
             r = VaiTro(TenVaiTro="SinhVien"); db.session.add(r); db.session.flush()
         return r.MaVaiTro
 
-    def _ensure_user_for_sv(masv: str, email_domain: str) -> int:
-        u = db.session.query(NguoiDung).filter_by(TenDangNhap=masv).first()
-        if u: return u.MaNguoiDung
-        u = NguoiDung(
-            TenDangNhap=masv,
-            MatKhauMaHoa=bcrypt.hash(masv),
-            Email=f"{masv}@{email_domain}".lower(),
-            TrangThai="Hoạt động",
-            MaVaiTro=_ensure_role_sinhvien_id(),
-        )
-        db.session.add(u); db.session.flush()
-        return u.MaNguoiDung
-
     lop = (request.args.get("lop") or "").strip().upper()
     if not lop:
         payload = {
@@ -362,20 +508,24 @@ def import_class_roster(*, preview: bool = True, allow_update: bool = True):
         }
         return jsonify(payload), 400
 
-    up = request.files["file"]; fname = up.filename; raw = up.read()
-    try:
-        if fname.lower().endswith(".csv"):
-            df = pd.read_csv(io.BytesIO(raw), dtype=object, encoding="utf-8")
-        else:
-            df = pd.read_excel(io.BytesIO(raw), dtype=object)
-    except Exception as e:
+    up = request.files["file"]; fname = up.filename
+
+    def _read_failed(msg):
+        db.session.rollback()
         payload = {
             "summary": {"total_rows": 0, "created": 0, "updated": 0, "skipped": 0,
-                        "warnings": [f"Lỗi đọc file: {e}"]},
-            "preview": [], "warnings": [f"Lỗi đọc file: {e}"], "file": fname
+                        "warnings": [msg]},
+            "preview": [], "warnings": [msg], "file": fname
         }
         return jsonify(payload), 400
 
+    # Tệp được chép ra file tạm rồi xử lý từng lô dòng: bộ nhớ không tăng theo kích thước tệp
+    frames = upload_reader.iter_upload(up, dtype=object)
+    try:
+        df = next(frames)
+    except ValueError as e:
+        return _read_failed(str(e))
+
     cols = { _norm_key(c): c for c in df.columns }
     need_map = {
         "masinhvien": ["mã sinh viên","masinhvien","ma sinh vien","masv","mssv","studentid","id"],
@@ -397,205 +547,424 @@ def import_class_roster(*, preview: bool = True, allow_update: bool = True):
                    "preview":[], "warnings":warn, "file": fname}
         return jsonify(payload), 400
 
-    email_domain = _email_domain()
+    email_domain = config_service.email_domain()
+    role_id = _ensure_role_sinhvien_id()
 
     total=0; created=0; updated=0; skipped=0
-    warnings=[]; preview_rows=[]
+    warnings=[]; preview_rows=[]; touched=set()
+    provisioning = {"accounts_created": 0, "hash_seconds": 0.0, "insert_seconds": 0.0, "hash_workers": 0}
+
+    # Chuẩn hoá cả cột một lần bằng pandas thay vì từng ô
+    def _text_col(df, key):
+        col = df[resolved[key]]
+        return col.where(col.notna(), "").astype(str).str.strip()
+
+    def _key_col(col):
+        col = col.str.normalize("NFKD").str.replace(r"[\u0300-\u036f]", "", regex=True).str.strip().str.lower()
+        return col.str.replace(r"[ _\-./]", "", regex=True)
+
+    t = SinhVien.__table__
+    sv_cols = (t.c.MaSV, t.c.HoTen, t.c.NgaySinh, t.c.NoiSinh, t.c.MaLop)
+    # Trạng thái SV theo MaSV. Khi ghi, lô trước đã nằm trong DB nên xoá sau mỗi lô;
+    # preview không ghi gì nên phải giữ qua các lô để dòng trùng ở lô sau được đếm đúng
+    known = {}
+
+    while df is not None:
+        records = []
+        c_masv, c_hoten, c_ngs, c_nois = (_text_col(df, k) for k in ("masinhvien", "hovaten", "ngaysinh", "noisinh"))
+        header_like = (_key_col(c_masv).isin(HEADER_TOKENS["masinhvien"]) | _key_col(c_hoten).isin(HEADER_TOKENS["hovaten"])
+                       | _key_col(c_ngs).isin(HEADER_TOKENS["ngaysinh"]) | _key_col(c_nois).isin(HEADER_TOKENS["noisinh"]))
+        c_date = pd.to_datetime(c_ngs.str.replace("-", "/"), dayfirst=True, format="mixed", errors="coerce")
+        # Ô ngày của Excel: số serial hoặc datetime -> không đi qua chuỗi (chuỗi "yyyy-mm-dd" bị đọc dayfirst)
+        raw_ngs = df[resolved["ngaysinh"]]
+        is_serial = raw_ngs.map(lambda v: isinstance(v, (int, float, np.number)) and not isinstance(v, bool)
+                                and not pd.isna(v)).astype(bool)
+        is_dt = raw_ngs.map(lambda v: isinstance(v, datetime)).astype(bool)
+        if is_serial.any():
+            serial = pd.to_numeric(raw_ngs.where(is_serial), errors="coerce")
+            c_date = c_date.mask(is_serial, pd.to_datetime(serial, unit="D", origin="1899-12-30", errors="coerce"))
+        if is_dt.any():
+            c_date = c_date.mask(is_dt, pd.to_datetime(raw_ngs.where(is_dt), errors="coerce"))
+
+        for i, masv, hoten, ngs, nois, is_header in zip(df.index, c_masv, c_hoten, c_date, c_nois, header_like):
+            if is_header:
+                skipped += 1
+                warnings.append(f"Dòng {i + 2}: bỏ qua vì trùng tiêu đề cột")
+                continue
 
-    for i, row in df.iterrows():
-        masv = str(row[resolved["masinhvien"]]).strip() if pd.notna(row[resolved["masinhvien"]]) else ""
-        hoten = str(row[resolved["hovaten"]]).strip() if pd.notna(row[resolved["hovaten"]]) else ""
-        ngs_raw = str(row[resolved["ngaysinh"]]).strip() if pd.notna(row[resolved["ngaysinh"]]) else ""
-        nois = str(row[resolved["noisinh"]]).strip() if pd.notna(row[resolved["noisinh"]]) else ""
-
-        if _is_header_like(masv, hoten, ngs_raw, nois):
-            skipped += 1
-            warnings.append(f"Dòng {i + 2}: bỏ qua vì trùng tiêu đề cột")
-            continue
+            ngs = None if pd.isna(ngs) else ngs.date()
 
-        ngs = _parse_date(ngs_raw) if ngs_raw else None
+            if not masv and not hoten:
+                continue
+            total += 1
 
-        if not masv and not hoten:
-            continue
-        total += 1
+            if not masv or not hoten:
+                skipped += 1
+                warnings.append(f"Dòng {i+2}: Thiếu Mã SV hoặc Họ tên")
+                continue
+            records.append((masv, hoten, ngs, nois))
+
+        # Pha tạo tài khoản: một lần cho mọi SV mới của lô
+        fresh = [r[0] for r in records if r[0] not in known]
+        uids, stats = _provision_accounts(fresh, email_domain, role_id, preview=preview)
+        for k in ("accounts_created", "hash_seconds", "insert_seconds"):
+            provisioning[k] += stats[k]
+        provisioning["hash_workers"] = max(provisioning["hash_workers"], stats["hash_workers"])
+
+        # SV đã có: một lượt IN theo lô; sau đó chỉ so sánh trong bộ nhớ
+        for part in _chunks(set(fresh), _IN_CHUNK):
+            for row in db.session.execute(sa.select(*sv_cols).where(t.c.MaSV.in_(part))):
+                known[row.MaSV] = dict(row._mapping)
+        inserts, updates = {}, {}
+
+        for masv, hoten, ngs, nois in records:
+            sv = inserts.get(masv) or known.get(masv)
+            if not sv:
+                inserts[masv] = {"MaSV": masv, "HoTen": hoten, "NgaySinh": ngs, "NoiSinh": nois, "MaLop": lop,
+                                 "MaNguoiDung": uids.get(masv)}
+                created += 1; touched.add(masv)
+            else:
+                changed = False
+                if allow_update:
+                    if hoten and sv["HoTen"] != hoten: sv["HoTen"] = hoten; changed = True
+                    if ngs and sv["NgaySinh"] != ngs: sv["NgaySinh"] = ngs; changed = True
+                    if nois is not None and sv["NoiSinh"] != nois: sv["NoiSinh"] = nois; changed = True
+                    if sv["MaLop"] != lop: sv["MaLop"] = lop; changed = True
+                if changed:
+                    updated += 1; touched.add(masv)
+                    if masv not in inserts:
+                        updates[masv] = sv
+                else: skipped += 1
+
+            if len(preview_rows) < 10:
+                preview_rows.append({
+                    "Mã sinh viên": masv,
+                    "Họ và tên": hoten,
+                    "Ngày sinh": (ngs.isoformat() if ngs else None),
+                    "Nơi sinh": nois,
+                    "Tên lớp (chọn)": lop,
+                })
+
+        if preview:
+            known.update(inserts)
+        else:
+            for part in _chunks(inserts.values(), _UPSERT_CHUNK):
+                db.session.execute(t.insert(), part)
+            if updates:
+                stmt = t.update().where(t.c.MaSV == sa.bindparam("_masv")).values(
+                    HoTen=sa.bindparam("HoTen"), NgaySinh=sa.bindparam("NgaySinh"),
+                    NoiSinh=sa.bindparam("NoiSinh"), MaLop=sa.bindparam("MaLop"))
+                for part in _chunks(updates.values(), _UPSERT_CHUNK):
+                    db.session.execute(stmt, [{**r, "_masv": r["MaSV"]} for r in part])
+            known.clear()
 
-        if not masv or not hoten:
-            skipped += 1
-            warnings.append(f"Dòng {i+2}: Thiếu Mã SV hoặc Họ tên")
-            continue
+        try:
+            df = next(frames, None)
+        except ValueError as e:
+            return _read_failed(str(e))
 
-        uid = _ensure_user_for_sv(masv, email_domain)
-        sv = db.session.get(SinhVien, masv)
-        if not sv:
-            sv = SinhVien(MaSV=masv, HoTen=hoten, NgaySinh=ngs, NoiSinh=nois, MaLop=lop, MaNguoiDung=uid)
-            if hasattr(SinhVien, "Lop"): setattr(sv, "Lop", lop)
-            db.session.add(sv); created += 1
-        else:
-            changed = False
-            if allow_update:
-                if hoten and sv.HoTen != hoten: sv.HoTen = hoten; changed = True
-                if ngs and getattr(sv, "NgaySinh", None) != ngs: sv.NgaySinh = ngs; changed = True
-                if nois is not None and getattr(sv, "NoiSinh", None) != nois: sv.NoiSinh = nois; changed = True
-                if hasattr(SinhVien, "MaLop") and getattr(sv, "MaLop", None) != lop:
-                    sv.MaLop = lop; changed = True
-                if hasattr(SinhVien, "Lop") and getattr(sv, "Lop", None) != lop:
-                    sv.Lop = lop; changed = True
-            if changed: updated += 1
-            else: skipped += 1
-
-        if len(preview_rows) < 10:
-            preview_rows.append({
-                "Mã sinh viên": masv,
-                "Họ và tên": hoten,
-                "Ngày sinh": (ngs.isoformat() if ngs else None),
-                "Nơi sinh": nois,
-                "Tên lớp (chọn)": lop,
-            })
-
-    summary = {"total_rows": total, "created": created, "updated": updated, "skipped": skipped, "warnings": warnings}
+    summary = {"total_rows": total, "created": created, "updated": updated, "skipped": skipped, "warnings": warnings,
+               "provisioning": provisioning}
 
     if preview:
         db.session.rollback()
         return jsonify({"summary": summary, "preview": preview_rows, "warnings": warnings, "file": fname}), 200
 
     try:
+        bump_students(touched)
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         summary["warnings"].append(f"Lỗi commit DB: {e}")
         return jsonify({"summary": summary, "preview": preview_rows, "warnings": summary["warnings"], "file": fname}), 400
 
-    try:
-        db.session.add(ImportLog(Endpoint="/api/admin/import/class-roster",
-                                 Summary=json.dumps(summary, ensure_ascii=False),
-                                 Filename=fname, AffectedTable="SinhVien"))
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
+    _audit_import(endpoint="/api/admin/import/class-roster", affected="SinhVien", summary=summary, filename=fname)
 
     return jsonify({"summary": summary, "preview": preview_rows, "warnings": warnings, "file": fname}), 200
 
 
+# --- Bảng điểm. Pha đọc + chuẩn hoá không chạm DB (danh mục truyền vào dạng dữ liệu thuần) nên chạy
+# được ở process con khi workbook có nhiều sheet; pha ghi DB trong import_grades vẫn tuần tự theo thứ tự sheet.
+
+_GRADE_ALIAS = {
+    "stt": {"stt","so","sott","sothutu"},
+    "masv": {"masv","ma sv","mssv","masinhvien","ma sinh vien","id","studentid","mãsinhviên"},
+    "hoten": {"hovaten","ho va ten","hoten","ten","fullname","name","họ và tên"},
+    "ngaysinh": {"ngaysinh","ngay sinh","dob","dateofbirth","ngày sinh"},
+    "noisinh": {"noisinh","noi sinh","quequan","que quan","birthplace","nơi sinh"},
+    "tenlop": {"tenlop","ten lop","lop","malop"},
+    "tbcht10": {"tbcht10","tbc ht10","tbcht 10","tbc he 10","tbc10","gpa10"},
+    "sohpno": {"sohpno","so hp no","somonno","nohp"},
+    "sotcno": {"sotinchino","so tin chi no","sotcno","notinchi"},
+}
+_GRADE_META_KEYS = {_norm_key(k) for k in ("STT", "Mã sinh viên", "Họ và tên", "Ngày sinh", "Nơi sinh", "Tên lớp",
+                                           "TBC HT10", "Số HP nợ", "Số tín chỉ nợ", "Ngày tổng hợp", "Người tổng hợp")}
+_GRADE_META_KEYS |= {_norm_key(a) for names in _GRADE_ALIAS.values() for a in names}
+_GRADE_HEADER_TOKENS = {"masinhvien","ma sinh vien","mssv","mã sinh viên","hovaten","họ và tên",
+                        "ngaysinh","ngay sinh","nơi sinh","noisinh","tbc ht10","số hp nợ","số tín chỉ nợ"}
+_GRADE_CELL_COLS = ["_row", "MaSV", "MaHP", "HocKy", "SoTinChi", "DiemHe10", "DiemHe4", "DiemChu", "TinhDiemTichLuy"]
+
+_PARSE_POOL: Dict[str, Any] = {"workers": 0, "executor": None}
+
+
+def _is_grade_meta_header(key_norm: str) -> bool:
+    if key_norm in {'stt', 'masv', 'mssv', 'hovaten', 'hoten', 'ngaysinh', 'noisinh', 'tenlop', 'lop',
+                    'tbcht10', 'tbhk', 'sohpno', 'sotcno', 'ngaytonghop', 'nguoitonghop'}:
+        return True
+    if re.match(r'^(tbc|tbcht|tbcht4|gpa|xeploai|xeploai10|xeploai4)$', key_norm):
+        return True
+    if 'tbc' in key_norm or 'ht4' in key_norm or 'xeploai' in key_norm or 'thang10' in key_norm or 'thang4' in key_norm:
+        return True
+    return False
+
+
+def _parse_grade_date(v):
+    if v is None or (isinstance(v, float) and math.isnan(v)) or str(v).strip() == "":
+        return None
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        try: return (datetime(1899,12,30)+timedelta(days=float(v))).date()
+        except Exception: pass
+    dt = pd.to_datetime(str(v).replace("-","/"), dayfirst=True, errors="coerce")
+    return None if pd.isna(dt) else dt.date()
+
+
+def _grade_layout(columns, by_ma, by_ten, aliases=None) -> Optional[Dict[str, Any]]:
+    # Vai trò các cột của một sheet; None nếu không có cột Mã sinh viên
+    cols_norm = {_norm_key(c): c for c in columns}
+
+    def _col(key):
+        for a in _GRADE_ALIAS.get(key, set()):
+            k = _norm_key(a)
+            if k in cols_norm: return cols_norm[k]
+        return None
+
+    col_masv = _col("masv")
+    if not col_masv:
+        return None
+    start_idx = list(columns).index(col_masv) + 1
+    grade_cols = [c for idx, c in enumerate(columns)
+                  if idx >= start_idx and not _is_grade_meta_header(_norm_key(str(c)))
+                  and _norm_key(str(c)) not in _GRADE_META_KEYS]
+    col_hp, hints = _resolve_subject_columns(grade_cols, by_ma, by_ten, aliases)
+    return {"columns": [str(c) for c in columns], "masv": col_masv, "hoten": _col("hoten"),
+            "ngaysinh": _col("ngaysinh"), "noisinh": _col("noisinh"), "tbcht10": _col("tbcht10"),
+            "sohpno": _col("sohpno"), "sotcno": _col("sotcno"), "grade_cols": grade_cols,
+            "col_hp": col_hp, "hints": hints}
+
+
+def _parse_grade_chunk(df: pd.DataFrame, layout: Dict[str, Any], ctx: Dict[str, Any]) -> Dict[str, Any]:
+    # Một lô dòng -> thông tin từng dòng, ô điểm đã chuẩn hoá (bảng dài), cảnh báo theo dòng và TBC tính lại.
+    # Các dòng bị pha ghi loại sau đó (SV chưa có, trùng dấu vết) chỉ cần lọc theo "_row".
+    where = ctx.get("where", "")
+    col_masv, col_hoten, col_ngs, col_nois = layout["masv"], layout["hoten"], layout["ngaysinh"], layout["noisinh"]
+    col_tb10, col_sohp, col_sotc = layout["tbcht10"], layout["sohpno"], layout["sotcno"]
+    grade_cols, col_hp = layout["grade_cols"], layout["col_hp"]
+
+    masv_col = {i: (str(x).strip() if pd.notna(x) else "") for i, x in df[col_masv].items()}
+    tb10_col = {}
+    if col_tb10:
+        v, ok = parse_scores(df[col_tb10], lo=-np.inf, hi=np.inf)
+        tb10_col = {i: float(x) for i, x, good in zip(df.index, v, ok) if good}
+    fps = import_fingerprint.row_hashes(df)
+
+    # (chỉ số, MaSV, meta); meta None: dòng lặp lại tiêu đề
+    rows = []
+    for i, row in df.iterrows():
+        masv = masv_col[i]
+        if not masv: continue
+        if _norm_key(masv) in _GRADE_HEADER_TOKENS:
+            rows.append((i, masv, None)); continue
+        hoten = (str(row[col_hoten]).strip() if (col_hoten and pd.notna(row[col_hoten])) else None)
+        ngs   = _parse_grade_date(row[col_ngs]) if (col_ngs and pd.notna(row[col_ngs])) else None
+        nois  = (str(row[col_nois]).strip() if (col_nois and pd.notna(row[col_nois])) else None)
+        sohp=None
+        if col_sohp and pd.notna(row[col_sohp]):
+            try: sohp=int(str(row[col_sohp]).strip())
+            except Exception: sohp=None
+        sotcno=None
+        if col_sotc and pd.notna(row[col_sotc]):
+            try: sotcno=int(str(row[col_sotc]).strip())
+            except Exception: sotcno=None
+        rows.append((i, masv, (hoten, ngs, nois, tb10_col.get(i), sohp, sotcno)))
+
+    # Bảng rộng -> bảng dài (một dòng mỗi ô điểm)
+    masv_of = {i: masv for i, masv, meta in rows if meta is not None}
+    wide = df.loc[list(masv_of), grade_cols].copy()
+    wide["_row"] = wide.index
+    tall = wide.melt(id_vars=["_row"], var_name="_col", value_name="_raw")
+    tall = tall[tall["_raw"].notna()]
+    tall = tall.sort_values(["_row"], kind="stable")
+
+    # Chuẩn hoá cả cột một lượt: parse + làm tròn + tra bảng ngưỡng điểm chữ/hệ 4
+    he10, ok = parse_scores(tall["_raw"])
+    hp_of_col = {col: h for col, (h, _, _) in col_hp.items() if h is not None}
+    matched = tall["_col"].map(lambda c: c in hp_of_col).to_numpy(dtype=bool)
+    cell_warn: Dict[Any, List[str]] = {}
+    for i, col, raw, good, has_hp in zip(tall["_row"].tolist(), tall["_col"].tolist(),
+                                         tall["_raw"].tolist(), ok.tolist(), matched.tolist()):
+        if not good:
+            cell_warn.setdefault(i, []).append(f"{where}Dòng {i + 2}: Điểm không hợp lệ '{raw}' ở môn '{col}'")
+        elif not has_hp:
+            cell_warn.setdefault(i, []).append(
+                f"{where}Dòng {i + 2}: Không khớp học phần cho cột '{col}' (norm='{col_hp[col][1]}'). "
+                f"→ Kiểm tra TenHP trong Danh mục HọcPhan hoặc chuẩn hoá tiêu đề cột."
+            )
+
+    keep = ok & matched
+    cells = pd.DataFrame({
+        "_row": tall["_row"].to_numpy()[keep],
+        "MaSV": tall["_row"].map(masv_of).to_numpy()[keep],
+        "MaHP": tall["_col"].map(lambda c: hp_of_col[c].MaHP if c in hp_of_col else None).to_numpy()[keep],
+        "SoTinChi": tall["_col"].map(lambda c: int(hp_of_col[c].SoTinChi or 0) if c in hp_of_col else 0).to_numpy()[keep],
+        "TinhDiemTichLuy": tall["_col"].map(lambda c: bool(hp_of_col[c].TinhDiemTichLuy) if c in hp_of_col else True).to_numpy()[keep],
+        "DiemHe10": he10[keep],
+    })
+    cells["HocKy"] = cells["MaHP"].map(ctx["hk_by_hp"]).fillna(ctx["hoc_ky"])
+    cells["DiemChu"], cells["DiemHe4"] = grade_points(cells["DiemHe10"].to_numpy())
+
+    # TBC hệ 10 tính lại theo tín chỉ cho từng dòng, trên mọi ô của dòng (kể cả khóa điểm lặp lại ở
+    # dòng/cột khác); ô trùng khóa được gộp ở pha ghi, theo thứ tự dòng
+    weighted = cells[cells["SoTinChi"] > 0]
+    w_sum = (weighted["DiemHe10"] * weighted["SoTinChi"]).groupby(weighted["_row"]).sum()
+    w_cnt = weighted["SoTinChi"].groupby(weighted["_row"]).sum()
+    calc_by_row = (np.floor(w_sum / w_cnt * 100.0 + 0.5 + 1e-9) / 100.0).to_dict()
+
+    return {"n": len(df), "rows": rows, "fps": {i: fps[i] for i in masv_of}, "cells": cells[_GRADE_CELL_COLS],
+            "cell_warn": cell_warn, "calc": calc_by_row}
+
+
+def _iter_grade_sheet(path: str, filename: str, sheet, engine: str, size: int, ctx: Dict[str, Any]):
+    # Một sheet -> (layout, lô đã chuẩn hoá) từng lô một; sheet không có cột Mã sinh viên -> (None, None)
+    frames = upload_reader.iter_frames(path, filename, sheet=sheet, engine=engine, size=size,
+                                       dtype=str, header=detect_header_row)
+    df = next(frames)
+    layout = _grade_layout(df.columns, ctx["by_ma"], ctx["by_ten"], ctx.get("aliases"))
+    if layout is None:
+        yield None, None
+        return
+    while df is not None:
+        yield layout, _parse_grade_chunk(df, layout, ctx)
+        df = next(frames, None)
+
+
+def _parse_grade_sheet(path: str, filename: str, sheet, engine: str, size: int, ctx: Dict[str, Any]):
+    # Chạy ở process con: đọc + chuẩn hoá một sheet, mỗi lô pickle nối vào một file tạm ngay khi xong
+    # (bộ nhớ process con chỉ giữ một lô) -> {"layout", "spool", "chunks"} hoặc {"error"}
+    fd, spool = tempfile.mkstemp(prefix="grades_", suffix=".pkl")
+    layout, n = None, 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for layout, chunk in _iter_grade_sheet(path, filename, sheet, engine, size, ctx):
+                if chunk is not None:
+                    pickle.dump(chunk, out, protocol=pickle.HIGHEST_PROTOCOL)
+                    n += 1
+        return {"layout": layout, "spool": spool, "chunks": n}
+    except ValueError as e:
+        _unlink(spool)
+        return {"error": str(e)}
+    except BaseException:
+        _unlink(spool)
+        raise
+
+
+def _unlink(path: Optional[str]):
+    try:
+        if path:
+            os.unlink(path)
+    except OSError:
+        pass
+
+
+def _drop_spool(fut):
+    # Kết quả không được đọc (lỗi sheet trước, generator bị đóng): xoá file tạm khi tác vụ xong
+    if not fut.cancelled() and fut.exception() is None:
+        _unlink(fut.result().get("spool"))
+
+
+def _parse_executor(workers: int) -> ProcessPoolExecutor:
+    if _PARSE_POOL["workers"] != workers:
+        if _PARSE_POOL["executor"] is not None:
+            _PARSE_POOL["executor"].shutdown(wait=False)
+        _PARSE_POOL["executor"] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        _PARSE_POOL["workers"] = workers
+    return _PARSE_POOL["executor"]
+
+
+def _grade_sheets(storage, filename: str, digest, ctx: Dict[str, Any]):
+    # Generator: trước hết -> danh sách sheet (nội dung tệp đã vào digest), sau đó -> (thứ tự sheet, tên sheet,
+    # layout, lô đã chuẩn hoá) theo đúng thứ tự sheet; sheet không có cột Mã sinh viên -> layout None.
+    # Một sheet (hoặc CSV) hoặc một worker: đọc từng lô ngay trong process. Nhiều sheet: mỗi sheet một tác vụ
+    # ở IMPORT_PARSE_WORKERS process, lô đã chuẩn hoá được ghi ra file tạm và đọc lại từng lô theo thứ tự
+    # sheet, nên bộ nhớ không tăng theo kích thước sheet. Lỗi đọc -> ValueError.
+    path = upload_reader.spool(storage, digest)
+    futures = []
+    try:
+        sheets = upload_reader.sheet_names(path, filename)
+        yield sheets
+        engine, size = upload_reader.xlsx_engine(), upload_reader.chunk_rows()
+        workers = min(len(sheets), int(current_app.config.get("IMPORT_PARSE_WORKERS", 0) or os.cpu_count() or 1))
+        if workers <= 1:
+            for k, name in enumerate(sheets or [None]):
+                sheet_ctx = {**ctx, "where": f"[{name}] "} if len(sheets) > 1 else ctx
+                try:
+                    for layout, chunk in _iter_grade_sheet(path, filename, name if sheets else 0, engine, size,
+                                                           sheet_ctx):
+                        yield k, name, layout, chunk
+                except ValueError as e:
+                    raise ValueError(f"[{name}] {e}" if len(sheets) > 1 else str(e)) from None
+            return
+
+        ctx = {**ctx, "aliases": _subject_aliases()}
+        pool = _parse_executor(workers)
+        futures = [pool.submit(_parse_grade_sheet, path, filename, name, engine, size, {**ctx, "where": f"[{name}] "})
+                   for name in sheets]
+        for k, name in enumerate(sheets):
+            res = futures[k].result()
+            futures[k] = None
+            if "error" in res:
+                raise ValueError(f"[{name}] {res['error']}")
+            try:
+                if res["layout"] is None:
+                    yield k, name, None, None
+                with open(res["spool"], "rb") as fh:
+                    for _ in range(res["chunks"]):
+                        yield k, name, res["layout"], pickle.load(fh)
+            finally:
+                _unlink(res["spool"])
+    finally:
+        for fut in futures:
+            if fut is not None and not fut.cancel():
+                fut.add_done_callback(_drop_spool)
+        _unlink(path)
+
+
 def import_grades(*, preview: bool = True,
                   allow_update: bool = True,
                   hoc_ky_default: str | None = None,
-                  retake_policy: str = "keep-latest"):
+                  retake_policy: str | None = None):
 
-    import re, unicodedata, math
-    import pandas as pd
     from flask import request, jsonify
-    from passlib.hash import bcrypt
-    from decimal import Decimal, ROUND_HALF_UP
-    EPS = Decimal("0.05")
+    EPS = 0.05
     tbc_policy = (request.args.get("tbc_policy") or "calc_only").strip().lower()
 
-    def _norm_subject_name(s: str) -> str:
-        s = _norm_key(str(s))
-        s = re.sub(r'^(diem|diemmon|mon|hp|hocphan|tbc|tbcht|tbcht4|gpa|xeploai)+', '', s)
-        s = re.sub(r'\(.*?\)', '', s)
-        s = re.sub(r'(lan|thi|hk)\d+$', '', s)
-        s = re.sub(r'_{2,}', '_', s).strip('_')
-        s = s.replace('lt', 'laptrinh')  # 'LT C' -> 'laptrinhc'
-        return s
-    def _fuzzy_pick_subject(key_norm: str, by_ten: dict, threshold: float = 0.78):
-        best, score = None, 0.0
-        for k, h in by_ten.items():
-            overlap = len(set(k.split('_')) & set(key_norm.split('_')))
-            r = SequenceMatcher(a=k, b=key_norm).ratio() + overlap * 0.05
-            if r > score:
-                best, score = h, r
-        return best if score >= threshold else None
-
-    def _is_meta_header(key_norm: str) -> bool:
-        if key_norm in {'stt', 'masv', 'mssv', 'hovaten', 'hoten', 'ngaysinh', 'noisinh', 'tenlop', 'lop',
-                        'tbcht10', 'tbhk', 'sohpno', 'sotcno', 'ngaytonghop', 'nguoitonghop'}:
-            return True
-        if re.match(r'^(tbc|tbcht|tbcht4|gpa|xeploai|xeploai10|xeploai4)$', key_norm):
-            return True
-        if 'tbc' in key_norm or 'ht4' in key_norm or 'xeploai' in key_norm or 'thang10' in key_norm or 'thang4' in key_norm:
-            return True
-        return False
-
-    def _norm_text(s: str) -> str:
-        s = unicodedata.normalize("NFKD", s or "")
-        s = "".join(c for c in s if not unicodedata.combining(c))
-        return s.strip().lower()
-    def _norm_key(s: str) -> str:
-        s = _norm_text(s)
-        s = re.sub(r'[\s\u00A0\u200B-\u200D\uFEFF]+', '', s)
-        for ch in ("_", "-", ".", "/"):
-            s = s.replace(ch, "")
-        return s
-
-    def _num_2(x) -> float | None:
-        if x is None:
-            return None
-        s = str(x).strip()
-        if s == "":
-            return None
-        s = s.replace(",", ".")
-        s = re.sub(r"[^0-9.\-]", "", s)
-        try:
-            v = Decimal(s)
-        except Exception:
-            try:
-                v = Decimal(str(float(s)))
-            except Exception:
-                return None
-        return float(v.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
-
-    def _parse_date(v):
-        if v is None or (isinstance(v, float) and math.isnan(v)) or str(v).strip() == "":
-            return None
-        if isinstance(v, (int, float)) and not isinstance(v, bool):
-            from datetime import datetime, timedelta
-            try: return (datetime(1899,12,30)+timedelta(days=float(v))).date()
-            except Exception: pass
-        dt = pd.to_datetime(str(v).replace("-","/"), dayfirst=True, errors="coerce")
-        return None if pd.isna(dt) else dt.date()
-
-    def _grade_letter(v: float) -> tuple[str, float, str]:
-        if v >= 8.5:   return "A", 4.0, "Đạt"
-        if v >= 7.8:   return "B+", 3.5, "Đạt"
-        if v >= 7.0:   return "B",  3.0, "Đạt"
-        if v >= 6.3:   return "C+", 2.5, "Đạt"
-        if v >= 5.5:   return "C",  2.0, "Đạt"
-        if v >= 4.8:   return "D+", 1.5, "Đạt"
-        if v >= 4.0:   return "D",  1.0, "Đạt"
-        return "F", 0.0, "Không đạt"
-
-    def _email_domain() -> str:
-        row = db.session.get(SystemConfig, "EMAIL_DOMAIN")
-        return row.ConfigValue if row else "vui.edu.vn"
-
     def _ensure_role_sinhvien_id():
         r = db.session.query(VaiTro).filter(VaiTro.TenVaiTro.in_(["SinhVien","Sinh Viên","student"])).first()
         if not r:
             r = VaiTro(TenVaiTro="SinhVien"); db.session.add(r); db.session.flush()
         return r.MaVaiTro
 
-    def _ensure_user_and_student(masv: str, ho_ten: str|None, ngay_sinh, noi_sinh, lop: str|None):
-        u = db.session.query(NguoiDung).filter_by(TenDangNhap=masv).first()
-        if not u:
-            u = NguoiDung(TenDangNhap=masv, MatKhauMaHoa=bcrypt.hash(masv),
-                          Email=f"{masv}@{_email_domain()}".lower(),
-                          TrangThai="Hoạt động", MaVaiTro=_ensure_role_sinhvien_id())
-            db.session.add(u); db.session.flush()
-        sv = db.session.get(SinhVien, masv)
-        if not sv:
-            sv = SinhVien(MaSV=masv, HoTen=(ho_ten or masv), MaNguoiDung=u.MaNguoiDung)
-            if ngay_sinh: setattr(sv, "NgaySinh", ngay_sinh)
-            if noi_sinh is not None: setattr(sv, "NoiSinh", noi_sinh)
-            if lop:
-                if hasattr(SinhVien,"MaLop"): setattr(sv,"MaLop",lop)
-                if hasattr(SinhVien,"Lop"):   setattr(sv,"Lop",lop)
-            db.session.add(sv)
-
-    def _hp_lookup_builder():
-        all_hp = db.session.query(HocPhan).all()
-        by_ma = {(h.MaHP or "").strip().upper(): h for h in all_hp}
-        by_ten = {_norm_subject_name(h.TenHP or ""): h for h in all_hp if h.TenHP}
-        return by_ma, by_ten
+    def _create_students(rows: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+        # SV mới của một lô: tài khoản qua _provision_accounts (băm song song, một executemany) như nhập
+        # danh sách lớp, SinhVien chèn bằng Core. Preview chỉ đếm, không ghi -> {MaSV: MaNguoiDung}
+        uids, stats = _provision_accounts(list(rows), config_service.email_domain(), _ensure_role_sinhvien_id(),
+                                          preview=preview)
+        for k in ("accounts_created", "hash_seconds", "insert_seconds"):
+            provisioning[k] += stats[k]
+        provisioning["hash_workers"] = max(provisioning["hash_workers"], stats["hash_workers"])
+        if not preview:
+            for part in _chunks([{**r, "MaNguoiDung": uids[m]} for m, r in rows.items()], _UPSERT_CHUNK):
+                db.session.execute(SinhVien.__table__.insert(), part)
+        return uids
 
     def _build_ctdt_hocky_map_for_lop(lop_code: str) -> dict[str, int]:
         if not lop_code:
@@ -620,217 +989,253 @@ def import_grades(*, preview: bool = True,
 
     ctdt_map = _build_ctdt_hocky_map_for_lop(lop)
 
+    f = request.files.get("file")
+    if not f:
+        msg = "Thiếu file (form field 'file')"
+        return jsonify({"summary":{"total_rows":0,"created":0,"updated":0,"skipped":0,"warnings":[msg]},
+                        "preview":[], "warnings":[msg], "file":None}), 400
+    fname = f.filename or "upload.xlsx"
+    hoc_ky = (request.args.get("hocky") or hoc_ky_default or "").strip() or "HK"
+    retake_policy = retake_policy or config_service.retake_policy()
+
+    # Tệp chép ra file tạm, đọc từng lô dòng; dòng tiêu đề được dò trong vài dòng đầu (mẫu của phòng
+    # đào tạo có tiêu đề trường/bảng điểm phía trên). Workbook nhiều sheet (mỗi lớp một sheet) được
+    # đọc + chuẩn hoá song song, rồi ghi DB tuần tự theo thứ tự sheet
+    by_ma, by_ten = _course_catalog()
+    hk_by_hp = {mahp: str(hk) for mahp, hk in ctdt_map.items() if hk is not None}
+    digest = hashlib.sha256()
+    stream = _grade_sheets(f, fname, digest, {"by_ma": by_ma, "by_ten": by_ten, "hk_by_hp": hk_by_hp, "hoc_ky": hoc_ky})
     try:
-        df, fname = _get_file_df()
-    except Exception as e:
+        sheets = next(stream)
+    except ValueError as e:
         return jsonify({"summary":{"total_rows":0,"created":0,"updated":0,"skipped":0,"warnings":[str(e)]},
                         "preview":[], "warnings":[str(e)], "file":None}), 400
+    file_hash = digest.hexdigest()
+    multi = len(sheets) > 1
+
+    # Tệp trùng lần nhập gần nhất (cùng tham số) và dữ liệu chưa đổi từ đó -> không xử lý lại.
+    # Preview luôn đọc tệp. ?force=1 bỏ qua cả kiểm tra này lẫn dấu vết từng dòng
+    force = request.args.get("force") == "1"
+    last = None if (force or preview) else import_fingerprint.last_run_match(
+        "/api/admin/import/grades", file_hash, request.args.to_dict())
+    if last is not None:
+        stream.close()
+        msg = (f"Tệp trùng lần nhập lúc {last.FinishedAt:%d/%m/%Y %H:%M} và dữ liệu chưa đổi → bỏ qua. "
+               f"Thêm ?force=1 để nhập lại.")
+        return jsonify({"summary":{"total_rows":0,"created":0,"updated":0,"skipped":0,"unchanged":0,
+                                   "warnings":[msg],"file_hash":file_hash,
+                                   "same_as_import":last.FinishedAt.isoformat(timespec="seconds")},
+                        "preview":[], "warnings":[msg], "file":fname}), 200
+
+    total=0; created=0; updated=0; skipped=0; unchanged=0; unchanged_rows=0
+    warnings=[]; preview_rows=[]; sheet_stats=[]
+    provisioning = {"accounts_created": 0, "hash_seconds": 0.0, "insert_seconds": 0.0, "hash_workers": 0}
+
+    def _counts():
+        return {"total_rows": total, "created": created, "updated": updated, "skipped": skipped,
+                "unchanged": unchanged, "unchanged_rows": unchanged_rows, "warnings": len(warnings)}
+
+    # Dấu vết từng dòng: dòng trùng lần áp dụng trước (cùng tiêu đề cột, tham số, danh mục) của SV
+    # chưa đổi dữ liệu từ đó được bỏ qua. Chỉ lần xuất hiện đầu của một MaSV mới được bỏ qua
+    # (lần sau vẫn phải ghi đè như khi nhập đủ), dòng có cảnh báo không được ghi nhớ.
+    catalog_version = versions([GLOBAL])[GLOBAL]
+    seen = set(); applied = {}; new_students = set(); col_hp_all = {}
+
+    # Mỗi lô: một lượt IN cho SV, một lượt cho giá trị điểm, một upsert. SV lặp lại ở lô sau được so với
+    # giá trị lô trước đã ghi (đã flush), nên số đếm giống như khi cả tệp là một lô; preview không ghi gì
+    # nên giữ các giá trị đã "áp dụng" qua các lô (preview_state)
+    touched = set(); rows_done = 0; grades_total = 0; preview_state = {}
+    cur_sheet = None
+    while True:
+        try:
+            item = next(stream, None)
+        except ValueError as e:
+            db.session.rollback()
+            warnings.append(str(e))
+            return jsonify({"summary":{"total_rows":total,"created":0,"updated":0,"skipped":skipped,"warnings":warnings},
+                            "preview":[], "warnings":warnings, "file":fname}), 400
+        if item is None:
+            break
+        k, sheet, layout, chunk = item
+        if k != cur_sheet:
+            cur_sheet = k
+            if layout is None:
+                warnings.append(f"[{sheet}] Không có cột Mã sinh viên → bỏ qua sheet")
+                sheet_stats.append({"sheet": sheet, **{key: 0 for key in _counts()}, "warnings": 1})
+                continue
+            prefix = f"[{sheet}] " if multi else ""
+            warnings.extend(prefix + h for h in layout["hints"])
+            col_hp_all.update(layout["col_hp"])
+            fp_scope = import_fingerprint.row_scope(
+                "grades", layout["columns"], lop, hoc_ky, allow_update, tbc_policy, retake_policy, catalog_version)
+            applied.setdefault(fp_scope, {})
+            sheet_stats.append({"sheet": sheet, "_from": _counts()})
+        before = sheet_stats[-1]["_from"]
+
+        # Pha 1: thông tin từng dòng; sinh viên đã có được nạp sẵn bằng một lượt IN
+        sv_by_ma = _prefetch_students([masv for _, masv, _ in chunk["rows"]])
+        same = set()
+        if not force:
+            first_fp = {}
+            for i, masv, meta in chunk["rows"]:
+                if meta is not None and masv not in seen and masv not in first_fp:
+                    first_fp[masv] = chunk["fps"][i]
+            same = import_fingerprint.unchanged(fp_scope, first_fp)
+
+        row_meta = {}; flagged = set(); fresh = {}
+        job_progress(stage="rows", rows_processed=rows_done)
+        for n, (i, masv, meta) in enumerate(chunk["rows"], rows_done + 1):
+            if n % 500 == 0:
+                job_progress(rows_processed=n)
+            if meta is None:
+                skipped += 1; warnings.append(f"{prefix}Dòng {i+2}: bỏ qua vì trùng tiêu đề"); continue
+
+            total += 1
+            first = masv not in seen
+            seen.add(masv)
+            if first and masv in same:
+                unchanged_rows += 1; continue
+            hoten, ngs, nois, tb10, sohp, sotcno = meta
+
+            # SV mới của lô trước: đã tạo (hoặc preview đã đếm), không tạo lại
+            sv_exist = sv_by_ma.get(masv)
+            if not sv_exist and masv not in fresh and masv not in new_students:
+                if not lop:
+                    skipped += 1
+                    warnings.append(f"{prefix}Dòng {i+2}: MaSV '{masv}' chưa có, thiếu ?lop để gán lớp → bỏ qua")
+                    continue
+                fresh[masv] = {"MaSV": masv, "HoTen": hoten or masv, "NgaySinh": ngs, "NoiSinh": nois, "MaLop": lop}
+                new_students.add(masv)
+            elif sv_exist:
+                try:
+                    if tb10 is not None:
+                        for attr in ("TBCHe10","TBCHT10","TBC_HT10","GPA10","DiemTBC10"):
+                            if hasattr(sv_exist, attr): setattr(sv_exist, attr, tb10); break
+                    if sohp is not None:
+                        for attr in ("SoHPNo","SoMonNo","SoHocPhanNo"):
+                            if hasattr(sv_exist, attr): setattr(sv_exist, attr, sohp); break
+                    if sotcno is not None:
+                        for attr in ("SoTinChiNo","SoTCNo"):
+                            if hasattr(sv_exist, attr): setattr(sv_exist, attr, sotcno); break
+                except Exception:
+                    pass
+
+            row_meta[i] = (masv, hoten, tb10, sohp, sotcno)
+
+        # SV mới của lô được tạo một lần, trước khi ghi điểm (khóa ngoại)
+        if fresh:
+            _create_students(fresh)
+            if not preview:
+                sv_by_ma.update(_prefetch_students(fresh))
+
+        # Pha 2: ô điểm đã chuẩn hoá của các dòng được giữ lại
+        job_progress(stage="cells", rows_processed=rows_done + chunk["n"])
+        for i in row_meta:
+            if i in chunk["cell_warn"]:
+                flagged.add(i)
+                warnings.extend(chunk["cell_warn"][i])
+        cells = chunk["cells"]
+        cells = cells[cells["_row"].isin(list(row_meta))]
+        records = [{
+            "MaSV": r["MaSV"], "MaHP": r["MaHP"], "HocKy": r["HocKy"],
+            "DiemHe10": float(r["DiemHe10"]), "DiemHe4": float(r["DiemHe4"]), "DiemChu": r["DiemChu"],
+            "TinhDiemTichLuy": bool(r["TinhDiemTichLuy"]),
+        } for r in cells[["MaSV", "MaHP", "HocKy", "DiemHe10", "DiemHe4", "DiemChu", "TinhDiemTichLuy"]].to_dict("records")]
+
+        # Pha 3: so với giá trị đã có (một lượt nạp); chỉ ô mới hoặc đổi giá trị được ghi (upsert theo lô).
+        # Khóa lặp lại trong tệp được xét lần lượt theo thứ tự dòng, như khi ghi từng ô: lần sau so với
+        # giá trị lần trước vừa áp dụng (không cho cập nhật -> giữ lần đầu)
+        existing = _prefetch_grades({r["MaSV"] for r in records})
+        state = preview_state if preview else {}; writes = {}
+        for rec in records:
+            key = (rec["MaSV"], rec["MaHP"], rec["HocKy"])
+            vals = tuple(rec[c] for c in _GRADE_VALUES)
+            old = state[key] if key in state else existing.get(key)
+            if old is None:
+                created += 1
+            elif not allow_update:
+                skipped += 1; continue
+            elif old == vals:
+                unchanged += 1; continue
+            else:
+                updated += 1
+            state[key] = vals; writes[key] = rec
+
+        grades_total += len(records)
+        job_progress(stage="write", grades_total=grades_total, created=created, updated=updated)
+        touched.update(key[0] for key in writes)
+        if not preview:
+            db.session.flush()
+            _upsert_grades(list(writes.values()), allow_update=allow_update)
+
+        calc_by_row = chunk["calc"]
+        for i, (masv, hoten, tb10, sohp, sotcno) in row_meta.items():
+            calc = calc_by_row.get(i)
+            if tb10 is not None:
+                if calc is not None and abs(tb10 - calc) > EPS + 1e-9:
+                    flagged.add(i)
+                    warnings.append(
+                        f"{prefix}MaSV {masv}: TBC_HT10 file = {tb10}, tính lại = {float(calc)} (lệch)"
+                    )
+                chosen = tb10
+            else:
+                chosen = calc
+
+            if not preview and chosen is not None:
+                val = float(chosen)
+                sv_row = sv_by_ma.get(masv)
+                if sv_row:
+                    for attr in ("TBCHe10", "TBCHT10", "TBC_HT10", "GPA10", "DiemTBC10"):
+                        if hasattr(sv_row, attr):
+                            setattr(sv_row, attr, val)
+                            break
+
+            if len(preview_rows) < 80:
+                preview_rows.append({"MaSV":masv,"HoTen":hoten,"TBC_HT10(file)":tb10,"SoHPNo":sohp,"SoTCNo":sotcno})
+
+            if i in flagged:
+                applied[fp_scope].pop(masv, None)
+            else:
+                applied[fp_scope][masv] = chunk["fps"][i]
 
-    cols_norm = {_norm_key(c): c for c in df.columns}
-    alias = {
-        "stt": {"stt","so","sott","sothutu"},
-        "masv": {"masv","ma sv","mssv","masinhvien","ma sinh vien","id","studentid","mãsinhviên"},
-        "hoten": {"hovaten","ho va ten","hoten","ten","fullname","name","họ và tên"},
-        "ngaysinh": {"ngaysinh","ngay sinh","dob","dateofbirth","ngày sinh"},
-        "noisinh": {"noisinh","noi sinh","quequan","que quan","birthplace","nơi sinh"},
-        "tenlop": {"tenlop","ten lop","lop","malop"},
-        "tbcht10": {"tbcht10","tbc ht10","tbcht 10","tbc he 10","tbc10","gpa10"},
-        "sohpno": {"sohpno","so hp no","somonno","nohp"},
-        "sotcno": {"sotinchino","so tin chi no","sotcno","notinchi"},
-    }
-    def _col(key):
-        for a in alias.get(key,set()):
-            k=_norm_key(a)
-            if k in cols_norm: return cols_norm[k]
-        return None
+        rows_done += chunk["n"]
+        now = _counts()
+        sheet_stats[-1].update({key: now[key] - before[key] for key in now})
 
-    col_masv  = _col("masv")
-    col_hoten = _col("hoten")
-    col_ngs   = _col("ngaysinh")
-    col_nois  = _col("noisinh")
-    col_tb10  = _col("tbcht10")
-    col_sohp  = _col("sohpno")
-    col_sotc  = _col("sotcno")
-    if not col_masv:
+    if not any("_from" in st for st in sheet_stats):
+        # Không sheet nào có cột Mã sinh viên
+        db.session.rollback()
         return jsonify({"summary":{"total_rows":0,"created":0,"updated":0,"skipped":0,
                                    "warnings":["Thiếu cột Mã sinh viên"]},
                         "preview":[], "warnings":["Thiếu cột Mã sinh viên"], "file":fname}), 400
 
-    META_KEYS = {
-        _norm_key("STT"), _norm_key("Mã sinh viên"), _norm_key("Họ và tên"),
-        _norm_key("Ngày sinh"), _norm_key("Nơi sinh"), _norm_key("Tên lớp"),
-        _norm_key("TBC HT10"), _norm_key("Số HP nợ"), _norm_key("Số tín chỉ nợ"),
-        _norm_key("Ngày tổng hợp"), _norm_key("Người tổng hợp")
-    }
-    for k in ("stt", "masv", "hoten", "ngaysinh", "noisinh", "tenlop", "tbcht10", "sohpno", "sotcno"):
-        for a in alias.get(k, set()):
-            META_KEYS.add(_norm_key(a))
-    start_idx = list(df.columns).index(col_masv) + 1 if col_masv in df.columns else 0
-    subject_cols = []
-    for idx, c in enumerate(df.columns):
-        if idx < start_idx:
-            continue
-        key = _norm_key(str(c))
-        if _is_meta_header(key):
-            continue
-        subject_cols.append(c)
-    by_ma, by_ten = _hp_lookup_builder()
-
-    total=0; created=0; updated=0; skipped=0
-    warnings=[]; preview_rows=[]
-    hoc_ky = (request.args.get("hocky") or hoc_ky_default or "").strip() or "HK"
-
-    def _format_hk_for_save(hk_val):
-        return str(hk_val) if hk_val is not None else None
-
-    header_tokens = {"masinhvien","ma sinh vien","mssv","mã sinh viên","hovaten","họ và tên",
-                     "ngaysinh","ngay sinh","nơi sinh","noisinh","tbc ht10","số hp nợ","số tín chỉ nợ"}
-
-    for i, row in df.iterrows():
-        masv = str(row[col_masv]).strip() if pd.notna(row[col_masv]) else ""
-        if not masv: continue
-        if _norm_key(masv) in header_tokens:
-            skipped += 1; warnings.append(f"Dòng {i+2}: bỏ qua vì trùng tiêu đề"); continue
-
-        total += 1
-        hoten = (str(row[col_hoten]).strip() if (col_hoten and pd.notna(row[col_hoten])) else None)
-        ngs   = _parse_date(row[col_ngs]) if (col_ngs and pd.notna(row[col_ngs])) else None
-        nois  = (str(row[col_nois]).strip() if (col_nois and pd.notna(row[col_nois])) else None)
-        tb10  = _num_2(row[col_tb10]) if (col_tb10 and pd.notna(row[col_tb10])) else None
-
-        sohp=None
-        if col_sohp and pd.notna(row[col_sohp]):
-            try: sohp=int(str(row[col_sohp]).strip())
-            except Exception: sohp=None
-        sotcno=None
-        if col_sotc and pd.notna(row[col_sotc]):
-            try: sotcno=int(str(row[col_sotc]).strip())
-            except Exception: sotcno=None
-
-        sv_exist = db.session.get(SinhVien, masv)
-        if not sv_exist:
-            if not lop:
-                skipped += 1
-                warnings.append(f"Dòng {i+2}: MaSV '{masv}' chưa có, thiếu ?lop để gán lớp → bỏ qua")
-                continue
-            _ensure_user_and_student(masv, hoten, ngs, nois, lop)
-        else:
-            try:
-                if tb10 is not None:
-                    for attr in ("TBCHe10","TBCHT10","TBC_HT10","GPA10","DiemTBC10"):
-                        if hasattr(sv_exist, attr): setattr(sv_exist, attr, tb10); break
-                if sohp is not None:
-                    for attr in ("SoHPNo","SoMonNo","SoHocPhanNo"):
-                        if hasattr(sv_exist, attr): setattr(sv_exist, attr, sohp); break
-                if sotcno is not None:
-                    for attr in ("SoTinChiNo","SoTCNo"):
-                        if hasattr(sv_exist, attr): setattr(sv_exist, attr, sotcno); break
-            except Exception:
-                pass
-
-        w_sum=Decimal("0"); w_cnt=Decimal("0")
-        for col in subject_cols:
-            key = _norm_key(str(col))
-            if key in META_KEYS:
-                continue
-
-            raw = row[col]
-            if pd.isna(raw):
-                continue
-            v = _num_2(raw)
-            if v is None or not (0.0 <= v <= 10.0):
-                warnings.append(f"Dòng {i + 2}: Điểm không hợp lệ '{raw}' ở môn '{col}'")
-                continue
-
-            subj_key = _norm_subject_name(str(col))
-            hobj = by_ten.get(subj_key)
-            if not hobj:
-                cand = _fuzzy_pick_subject(subj_key, by_ten)
-                if cand:
-                    hobj = cand
-                    warnings.append(f"[gợi ý] Cột '{col}' khớp gần với học phần '{cand.TenHP}' (fuzzy)")
-
-            if not hobj:
-                warnings.append(
-                    f"Dòng {i + 2}: Không khớp học phần cho cột '{col}' (norm='{subj_key}'). "
-                    f"→ Kiểm tra TenHP trong Danh mục HọcPhan hoặc chuẩn hoá tiêu đề cột."
-                )
-                continue
-            mahp = hobj.MaHP
-
-            hk_from_ctdt = ctdt_map.get(mahp)
-            if hk_from_ctdt is not None:
-                hk_for_row = _format_hk_for_save(hk_from_ctdt)
-            else:
-                hk_for_row = hoc_ky
-
-            diemchu, he4, kq = _grade_letter(v)
-            stc = int(hobj.SoTinChi or 0)
-            if stc>0:
-                w_sum += Decimal(str(v))*Decimal(str(stc))
-                w_cnt += Decimal(str(stc))
-
-            rec = (db.session.query(KetQuaHocTap)
-                   .filter(KetQuaHocTap.MaSV==masv,
-                           KetQuaHocTap.MaHP==mahp,
-                           KetQuaHocTap.HocKy==hk_for_row)
-                   .first())
-            if rec:
-                if allow_update:
-                    rec.DiemHe10 = float(v)
-                    if hasattr(rec,"DiemHe4"):  rec.DiemHe4  = he4
-                    if hasattr(rec,"DiemChu"):  rec.DiemChu  = diemchu
-                    if hasattr(rec,"KetQua"):   rec.KetQua   = kq
-                    if hasattr(rec,"TinhDiemTichLuy"): rec.TinhDiemTichLuy = bool(hobj.TinhDiemTichLuy)
-                    updated += 1
-                else:
-                    skipped += 1
-            else:
-                obj = KetQuaHocTap(MaSV=masv, MaHP=mahp, HocKy=hk_for_row, DiemHe10=float(v))
-                if hasattr(obj,"DiemHe4"):  obj.DiemHe4  = he4
-                if hasattr(obj,"DiemChu"):  obj.DiemChu  = diemchu
-                if hasattr(obj,"KetQua"):   obj.KetQua   = kq
-                if hasattr(obj,"TinhDiemTichLuy"): obj.TinhDiemTichLuy = bool(hobj.TinhDiemTichLuy)
-                db.session.add(obj); created += 1
-
-        chosen = None
-        calc = None
-        if w_cnt > 0:
-            calc = (w_sum / w_cnt).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-        if tb10 is not None:
-            if calc is not None and abs(Decimal(str(tb10)) - calc) > EPS:
-                warnings.append(
-                    f"MaSV {masv}: TBC_HT10 file = {tb10}, tính lại = {float(calc)} (lệch)"
-                )
-            chosen = Decimal(str(tb10))
-        else:
-            chosen = calc
-
-        if not preview and chosen is not None:
-            val = float(Decimal(chosen).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
-            sv_row = db.session.get(SinhVien, masv)
-            if sv_row:
-                for attr in ("TBCHe10", "TBCHT10", "TBC_HT10", "GPA10", "DiemTBC10"):
-                    if hasattr(sv_row, attr):
-                        setattr(sv_row, attr, val)
-                        break
-
-        if len(preview_rows) < 80:
-            preview_rows.append({"MaSV":masv,"HoTen":hoten,"TBC_HT10(file)":tb10,"SoHPNo":sohp,"SoTCNo":sotcno})
+    touched |= new_students
+    if not preview:
+        _remember_subject_aliases(col_hp_all)
+        apply_retake_policy(touched, retake_policy)
+        refresh_student_aggregates(touched)
+        mark_students_dirty(touched)
 
-    summary={"total_rows":total,"created":created,"updated":updated,"skipped":skipped,"warnings":warnings}
+    summary={"total_rows":total,"created":created,"updated":updated,"skipped":skipped,"unchanged":unchanged,
+             "unchanged_rows":unchanged_rows,"warnings":warnings,"file_hash":file_hash,"provisioning":provisioning,
+             "sheets":[{key: v for key, v in s.items() if key != "_from"} for s in sheet_stats]}
 
     if preview:
         db.session.rollback()
         return jsonify({"summary":summary,"preview":preview_rows,"warnings":warnings,"file":fname}), 200
 
     try:
+        bump_students(touched)
+        for scope, fps in applied.items():
+            import_fingerprint.remember(scope, fps)
+        # Phiên bản sau lần nhập này: tệp gửi lại chỉ được bỏ qua khi chưa có thay đổi nào khác
+        import_fingerprint.remember_run("/api/admin/import/grades", file_hash, request.args.to_dict())
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         summary["warnings"].append(f"Lỗi commit DB: {e}")
         return jsonify({"summary":summary,"preview":preview_rows,"warnings":summary["warnings"],"file":fname}), 400
 
-    _audit_import(endpoint="/api/admin/import/grades", affected="KetQuaHocTap", summary=summary, filename=fname)
-    return jsonify({"summary":summary,"preview":preview_rows,"warnings":warnings,"file":fname}), 200
\ No newline at end of file
+    _audit_import(endpoint="/api/admin/import/grades", affected="KetQuaHocTap", summary=summary, filename=fname,
+                  file_hash=file_hash)
+    return jsonify({"summary":summary,"preview":preview_rows,"warnings":warnings,"file":fname}), 200
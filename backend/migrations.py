@@ -0,0 +1,182 @@
+# backend/migrations.py
+from __future__ import annotations
+import logging
+from typing import Callable, List, Tuple
+
+from sqlalchemy.engine import Connection, Engine
+
+from .models import db
+
+log = logging.getLogger(__name__)
+
+# db.create_all() chỉ tạo bảng còn thiếu, không thêm index/cột cho bảng đã có
+# trong app.db cũ. Mỗi bước dưới đây chạy đúng một lần, phiên bản lưu ở PRAGMA user_version.
+
+
+_M001_BACKUP = "KetQuaHocTap_trung_m001"
+
+
+def _m001_hot_lookup_indexes(conn: Connection):
+    # Bản ghi trùng (MaSV, MaHP, HocKy) sẽ chặn unique index. Không xoá mất: bản ghi cũ hơn (MaKQ nhỏ hơn)
+    # được chuyển nguyên dòng sang bảng _M001_BACKUP để phòng đào tạo đối chiếu, bản mới nhất ở lại.
+    losers = "SELECT * FROM KetQuaHocTap WHERE MaKQ NOT IN (SELECT MAX(MaKQ) FROM KetQuaHocTap GROUP BY MaSV, MaHP, HocKy)"
+    n_dup = conn.exec_driver_sql(f"SELECT COUNT(*) FROM ({losers})").scalar() or 0
+    if n_dup:
+        conn.exec_driver_sql(f'CREATE TABLE IF NOT EXISTS "{_M001_BACKUP}" AS SELECT * FROM KetQuaHocTap WHERE 0')
+        conn.exec_driver_sql(f'INSERT INTO "{_M001_BACKUP}" {losers}')
+        conn.exec_driver_sql(f'DELETE FROM KetQuaHocTap WHERE MaKQ IN (SELECT MaKQ FROM "{_M001_BACKUP}")')
+        log.warning("[migrate] %d bản ghi KetQuaHocTap trùng (MaSV, MaHP, HocKy) đã chuyển sang bảng %s "
+                    "(giữ bản ghi MaKQ lớn nhất của mỗi khóa)", n_dup, _M001_BACKUP)
+    for ddl in (
+        'CREATE UNIQUE INDEX IF NOT EXISTS "ux_KetQuaHocTap_MaSV_MaHP_HocKy" '
+        'ON "KetQuaHocTap" ("MaSV", "MaHP", "HocKy")',
+        'CREATE INDEX IF NOT EXISTS "ix_KetQuaHocTap_MaHP_LaDiemCuoiCung" '
+        'ON "KetQuaHocTap" ("MaHP", "LaDiemCuoiCung")',
+        'CREATE INDEX IF NOT EXISTS "ix_KetQuaHocTap_final_MaSV" '
+        'ON "KetQuaHocTap" ("MaSV", "MaHP", "DiemHe4") WHERE LaDiemCuoiCung = 1',
+        'CREATE INDEX IF NOT EXISTS "ix_WarningCase_RuleId_MaSV_Status" '
+        'ON "WarningCase" ("RuleId", "MaSV", "Status")',
+        'CREATE INDEX IF NOT EXISTS "ix_SinhVien_MaLop" ON "SinhVien" ("MaLop")',
+        'CREATE INDEX IF NOT EXISTS "ix_ChuongTrinhDaoTao_MaNganh_MaHP" '
+        'ON "ChuongTrinhDaoTao" ("MaNganh", "MaHP")',
+    ):
+        conn.exec_driver_sql(ddl)
+    conn.exec_driver_sql("ANALYZE")
+
+
+def _m002_student_aggregates(conn: Connection):
+    # Dựng bảng tổng hợp từ điểm cuối cùng hiện có; sau đó được cập nhật khi ghi điểm
+    from .models import StudentAggregate
+    from .services.aggregate_service import refresh_student_aggregates
+    StudentAggregate.__table__.create(conn, checkfirst=True)
+    refresh_student_aggregates(conn=conn)
+
+
+def _m003_data_version_epoch(conn: Connection):
+    # Phiên bản "global" khởi tạo theo thời điểm dựng DB: ETag "…-0-0" của DB cũ không khớp DB mới
+    import time
+    from .models import DataVersion
+    DataVersion.__table__.create(conn, checkfirst=True)
+    conn.exec_driver_sql(
+        "INSERT OR IGNORE INTO DataVersion (Scope, Version) VALUES ('global', ?)", (int(time.time() * 1000),))
+
+
+def _m004_student_search_fts(conn: Connection):
+    # Chỉ mục FTS5 cho tìm SV theo MaSV/HoTen không dấu. unicode61 bỏ dấu nhưng không coi "đ" là "d"
+    # nên HoTen được thay đ/Đ trước khi ghi vào chỉ mục (cùng cách ở services.student_search).
+    # Bảng FTS giữ bản sao riêng (không dùng content=) vì nội dung đã khác cột gốc.
+    from sqlalchemy.exc import OperationalError
+    try:
+        conn.exec_driver_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS SinhVien_fts USING fts5("
+            "MaSV, HoTen, tokenize = 'unicode61 remove_diacritics 2')")
+    except OperationalError as e:
+        # SQLite build không có FTS5 -> tìm kiếm dùng LIKE như cũ
+        log.warning("[migrate] FTS5 không khả dụng, bỏ qua chỉ mục tìm kiếm: %s", e)
+        return
+    folded = "replace(replace({0}.HoTen, 'đ', 'd'), 'Đ', 'D')"
+    for ddl in (
+        "DROP TRIGGER IF EXISTS SinhVien_fts_ai",
+        "DROP TRIGGER IF EXISTS SinhVien_fts_ad",
+        "DROP TRIGGER IF EXISTS SinhVien_fts_au",
+        "CREATE TRIGGER SinhVien_fts_ai AFTER INSERT ON SinhVien BEGIN "
+        f"INSERT INTO SinhVien_fts (rowid, MaSV, HoTen) VALUES (new.rowid, new.MaSV, {folded.format('new')}); END",
+        "CREATE TRIGGER SinhVien_fts_ad AFTER DELETE ON SinhVien BEGIN "
+        "DELETE FROM SinhVien_fts WHERE rowid = old.rowid; END",
+        "CREATE TRIGGER SinhVien_fts_au AFTER UPDATE OF MaSV, HoTen ON SinhVien BEGIN "
+        "DELETE FROM SinhVien_fts WHERE rowid = old.rowid; "
+        f"INSERT INTO SinhVien_fts (rowid, MaSV, HoTen) VALUES (new.rowid, new.MaSV, {folded.format('new')}); END",
+        "DELETE FROM SinhVien_fts",
+        f"INSERT INTO SinhVien_fts (rowid, MaSV, HoTen) SELECT rowid, MaSV, {folded.format('SinhVien')} FROM SinhVien",
+    ):
+        conn.exec_driver_sql(ddl)
+
+
+def _m005_import_fingerprints(conn: Connection):
+    # Băm tệp nhập (ImportLog.FileHash) và dấu vân tay từng dòng đã áp dụng
+    from .models import ImportFingerprint
+    cols = {row[1] for row in conn.exec_driver_sql('PRAGMA table_info("ImportLog")')}
+    if "FileHash" not in cols:
+        conn.exec_driver_sql('ALTER TABLE "ImportLog" ADD COLUMN "FileHash" VARCHAR(64)')
+    conn.exec_driver_sql(
+        'CREATE INDEX IF NOT EXISTS "ix_ImportLog_Endpoint_FileHash" ON "ImportLog" ("Endpoint", "FileHash")')
+    ImportFingerprint.__table__.create(conn, checkfirst=True)
+
+
+def _m006_import_runs(conn: Connection):
+    # Bản ghi lần nhập gần nhất (đồng bộ) để nhận ra tệp gửi lại, thay cho việc đọc ImportLog
+    from .models import ImportRun
+    ImportRun.__table__.create(conn, checkfirst=True)
+
+
+def _m007_student_search_fts_by_masv(conn: Connection):
+    # Dựng lại chỉ mục của migration 4 theo khóa MaSV: SinhVien không có INTEGER PRIMARY KEY nên VACUUM
+    # có thể đánh số lại rowid, chỉ mục theo rowid sẽ trỏ nhầm SV. Rowid của bảng FTS không còn ý nghĩa;
+    # trigger tìm dòng cũ bằng MATCH trên cột MaSV (dùng chỉ mục FTS) + so bằng. MaSV không có chữ/số
+    # (không sinh token) thì MATCH không thấy -> câu DELETE thứ hai quét theo MaSV, chỉ chạy khi đó.
+    from sqlalchemy.exc import OperationalError
+    for ddl in ("DROP TRIGGER IF EXISTS SinhVien_fts_ai", "DROP TRIGGER IF EXISTS SinhVien_fts_ad",
+                "DROP TRIGGER IF EXISTS SinhVien_fts_au", "DROP TABLE IF EXISTS SinhVien_fts"):
+        conn.exec_driver_sql(ddl)
+    try:
+        conn.exec_driver_sql(
+            "CREATE VIRTUAL TABLE SinhVien_fts USING fts5("
+            "MaSV, HoTen, tokenize = 'unicode61 remove_diacritics 2')")
+    except OperationalError as e:
+        log.warning("[migrate] FTS5 không khả dụng, bỏ qua chỉ mục tìm kiếm: %s", e)
+        return
+    folded = "replace(replace({0}.HoTen, 'đ', 'd'), 'Đ', 'D')"
+    delete_old = (
+        "DELETE FROM SinhVien_fts WHERE rowid IN (SELECT rowid FROM SinhVien_fts WHERE SinhVien_fts MATCH "
+        "'MaSV : \"' || replace(old.MaSV, '\"', '\"\"') || '\"') AND MaSV = old.MaSV; "
+        "DELETE FROM SinhVien_fts WHERE old.MaSV NOT GLOB '*[0-9A-Za-z]*' AND MaSV = old.MaSV; ")
+    insert_new = f"INSERT INTO SinhVien_fts (MaSV, HoTen) VALUES (new.MaSV, {folded.format('new')}); "
+    for ddl in (
+        f"CREATE TRIGGER SinhVien_fts_ai AFTER INSERT ON SinhVien BEGIN {insert_new}END",
+        f"CREATE TRIGGER SinhVien_fts_ad AFTER DELETE ON SinhVien BEGIN {delete_old}END",
+        f"CREATE TRIGGER SinhVien_fts_au AFTER UPDATE OF MaSV, HoTen ON SinhVien BEGIN {delete_old}{insert_new}END",
+        f"INSERT INTO SinhVien_fts (MaSV, HoTen) SELECT MaSV, {folded.format('SinhVien')} FROM SinhVien",
+    ):
+        conn.exec_driver_sql(ddl)
+
+
+def _m008_job_worker(conn: Connection):
+    # Process chạy job: worker khác không coi job đang chạy ở process khác là bị gián đoạn
+    cols = {row[1] for row in conn.exec_driver_sql('PRAGMA table_info("Job")')}
+    if cols and "Worker" not in cols:
+        conn.exec_driver_sql('ALTER TABLE "Job" ADD COLUMN "Worker" VARCHAR(128)')
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "hot lookup indexes", _m001_hot_lookup_indexes),
+    (2, "student aggregates backfill", _m002_student_aggregates),
+    (3, "data version epoch", _m003_data_version_epoch),
+    (4, "student search FTS5 index", _m004_student_search_fts),
+    (5, "import file hash and row fingerprints", _m005_import_fingerprints),
+    (6, "synchronous last import run", _m006_import_runs),
+    (7, "student search FTS5 keyed by MaSV", _m007_student_search_fts_by_masv),
+    (8, "job worker column", _m008_job_worker),
+]
+
+
+def schema_version(engine: Engine) -> int:
+    with engine.connect() as conn:
+        return int(conn.exec_driver_sql("PRAGMA user_version").scalar() or 0)
+
+
+def upgrade(engine: Engine) -> int:
+    current = schema_version(engine)
+    for version, name, step in MIGRATIONS:
+        if version <= current:
+            continue
+        log.info("[migrate] %d -> %d: %s", current, version, name)
+        with engine.begin() as conn:
+            step(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+        current = version
+    return current
+
+
+def init_db():
+    db.create_all()
+    return upgrade(db.engine)
@@ -48,6 +48,9 @@ class NguoiDung(db.Model):
 
 class SinhVien(db.Model):
     __tablename__ = 'SinhVien'
+    __table_args__ = (
+        db.Index('ix_SinhVien_MaLop', 'MaLop'),
+    )
     MaSV = db.Column(db.String(50), primary_key=True)
     HoTen = db.Column(db.String(100), nullable=False)
     NgaySinh = db.Column(db.Date, nullable=True)
@@ -68,6 +71,9 @@ class HocPhan(db.Model):
 
 class ChuongTrinhDaoTao(db.Model):
     __tablename__ = 'ChuongTrinhDaoTao'
+    __table_args__ = (
+        db.Index('ix_ChuongTrinhDaoTao_MaNganh_MaHP', 'MaNganh', 'MaHP'),
+    )
     MaCTDT = db.Column(db.Integer, primary_key=True, autoincrement=True)
     HocKy = db.Column(db.Integer, nullable=False)
     LaMonBatBuoc = db.Column(db.Boolean, default=True)
@@ -77,6 +83,15 @@ class ChuongTrinhDaoTao(db.Model):
 
 class KetQuaHocTap(db.Model):
     __tablename__ = 'KetQuaHocTap'
+    __table_args__ = (
+        # (MaSV, MaHP, HocKy) là khóa nghiệp vụ của một lần thi; prefix (MaSV, MaHP) phục vụ chính sách thi lại
+        db.Index('ux_KetQuaHocTap_MaSV_MaHP_HocKy', 'MaSV', 'MaHP', 'HocKy', unique=True),
+        db.Index('ix_KetQuaHocTap_MaHP_LaDiemCuoiCung', 'MaHP', 'LaDiemCuoiCung'),
+        # chỉ mục một phần cho tổng hợp trên điểm cuối cùng; truy vấn phải lọc "LaDiemCuoiCung = 1"
+        # (== true()), dạng "IS 1" của .is_(True) không khớp điều kiện của index
+        db.Index('ix_KetQuaHocTap_final_MaSV', 'MaSV', 'MaHP', 'DiemHe4',
+                 sqlite_where=db.text('LaDiemCuoiCung = 1')),
+    )
     MaKQ = db.Column(db.Integer, primary_key=True, autoincrement=True)
     HocKy = db.Column(db.String(50), nullable=False)
     DiemHe10 = db.Column(db.Float, nullable=False)
@@ -89,6 +104,26 @@ class KetQuaHocTap(db.Model):
     MaHP = db.Column(db.String(50), db.ForeignKey('HocPhan.MaHP'), nullable=False)
     hoc_phan_rel = db.relationship('HocPhan', backref='ket_qua_hoc_tap_rel')
 
+class StudentAggregate(db.Model):
+    # Tổng hợp trên điểm cuối cùng (LaDiemCuoiCung) của mỗi SV, cập nhật khi ghi điểm
+    # qua services.aggregate_service.refresh_student_aggregates
+    __tablename__ = "StudentAggregate"
+    MaSV = db.Column(db.String(50), db.ForeignKey('SinhVien.MaSV'), primary_key=True)
+    GPA4 = db.Column(db.Float, nullable=True)
+    GPA10 = db.Column(db.Float, nullable=True)
+    Credits = db.Column(db.Integer, nullable=False, default=0)         # tổng TC đã có điểm cuối cùng
+    CreditsEarned = db.Column(db.Integer, nullable=False, default=0)
+    DebtCredits = db.Column(db.Integer, nullable=False, default=0)
+    FailCount = db.Column(db.Integer, nullable=False, default=0)
+    UpdatedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class SubjectAlias(db.Model):
+    __tablename__ = "SubjectAlias"
+    RawKey = db.Column(db.String(255), primary_key=True)   # tiêu đề cột đã chuẩn hoá
+    MaHP = db.Column(db.String(50), db.ForeignKey('HocPhan.MaHP'), nullable=False)
+    Source = db.Column(db.String(20), nullable=False, default="fuzzy")   # fuzzy|manual
+    UpdatedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
 class SystemConfig(db.Model):
     __tablename__ = 'SystemConfig'
     ConfigKey = db.Column(db.String(50), primary_key=True)
@@ -122,6 +157,9 @@ class WarningRule(db.Model):
 
 class WarningCase(db.Model):
     __tablename__ = "WarningCase"
+    __table_args__ = (
+        db.Index('ix_WarningCase_RuleId_MaSV_Status', 'RuleId', 'MaSV', 'Status'),
+    )
     Id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     RuleId = db.Column(db.Integer, db.ForeignKey('WarningRule.Id'), nullable=False)
     MaSV = db.Column(db.String(50), db.ForeignKey('SinhVien.MaSV'), nullable=False)
@@ -131,8 +169,59 @@ class WarningCase(db.Model):
     CreatedAt = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     ClosedAt = db.Column(db.DateTime, nullable=True)
 
+class WarningScanDirty(db.Model):
+    # Sinh viên có điểm thay đổi kể từ lần quét cảnh báo gần nhất
+    __tablename__ = "WarningScanDirty"
+    MaSV = db.Column(db.String(50), primary_key=True)
+    MarkedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class DataVersion(db.Model):
+    # Bộ đếm phiên bản theo phạm vi ("student:<MaSV>", "global"), tăng khi dữ liệu đổi;
+    # dùng làm ETag/khóa cache (services.data_version)
+    __tablename__ = "DataVersion"
+    Scope = db.Column(db.String(80), primary_key=True)
+    Version = db.Column(db.Integer, nullable=False, default=0)
+
+class Job(db.Model):
+    # Job nền (quét cảnh báo, nhập điểm) chạy qua services.jobs; Progress/Result là JSON
+    __tablename__ = "Job"
+    Id = db.Column(db.String(32), primary_key=True)
+    Kind = db.Column(db.String(50), nullable=False)
+    Status = db.Column(db.String(20), nullable=False, default="queued")  # queued|running|done|failed
+    Progress = db.Column(db.Text, nullable=True)
+    Result = db.Column(db.Text, nullable=True)
+    Error = db.Column(db.Text, nullable=True)
+    CreatedBy = db.Column(db.String(64), nullable=True)
+    Worker = db.Column(db.String(128), nullable=True)  # "host:pid" của process chạy job
+    CreatedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    StartedAt = db.Column(db.DateTime, nullable=True)
+    FinishedAt = db.Column(db.DateTime, nullable=True)
+
+class ImportFingerprint(db.Model):
+    # Dấu vân tay dòng đã áp dụng lần nhập gần nhất (Scope = loại nhập, RowKey = MaSV); chỉ còn hiệu lực
+    # khi Version còn bằng phiên bản DataVersion của SV (services.import_fingerprint)
+    __tablename__ = "ImportFingerprint"
+    Scope = db.Column(db.String(32), primary_key=True)
+    RowKey = db.Column(db.String(64), primary_key=True)
+    Hash = db.Column(db.String(64), nullable=False)
+    Version = db.Column(db.Integer, nullable=False, default=0)
+    UpdatedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class ImportRun(db.Model):
+    # Lần nhập đã commit gần nhất của mỗi endpoint, ghi trong cùng transaction với dữ liệu nhập
+    # (ImportLog ghi nền qua audit_sink, chỉ để kiểm toán). DataVersion = phiên bản GRADES sau lần đó
+    __tablename__ = "ImportRun"
+    Endpoint = db.Column(db.String(128), primary_key=True)
+    FileHash = db.Column(db.String(64), nullable=False)
+    Params = db.Column(db.Text, nullable=True)
+    DataVersion = db.Column(db.Integer, nullable=False, default=0)
+    FinishedAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
 class ImportLog(db.Model):
     __tablename__ = "ImportLog"
+    __table_args__ = (
+        db.Index('ix_ImportLog_Endpoint_FileHash', 'Endpoint', 'FileHash'),
+    )
     RunId = db.Column(db.Integer, primary_key=True, autoincrement=True)
     When = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     Actor = db.Column(db.String(64), nullable=True)
@@ -142,6 +231,7 @@ class ImportLog(db.Model):
     Summary = db.Column(db.Text, nullable=True)
     AffectedTable = db.Column(db.String(64), nullable=True)
     InsertedIds = db.Column(db.Text, nullable=True)
+    FileHash = db.Column(db.String(64), nullable=True)   # sha256 nội dung tệp nhập
 
 class AuditLog(db.Model):
     __tablename__ = "AuditLog"
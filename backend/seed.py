@@ -4,9 +4,9 @@ from __future__ import annotations
 
 import os
 
-from passlib.hash import bcrypt
-
 from .app import create_app
+from .migrations import init_db
+from .services.auth_service import hash_password
 from .models import (
     db,
     VaiTro, NguoiDung,
@@ -35,7 +35,7 @@ def ensure_user(username: str, role_name: str, email: str, password: str) -> int
         return u.MaNguoiDung
     u = NguoiDung(
         TenDangNhap=username,
-        MatKhauMaHoa=bcrypt.hash(password),
+        MatKhauMaHoa=hash_password(password, role_name),
         Email=email,
         TrangThai="Hoạt động",
         MaVaiTro=role_id,
@@ -93,7 +93,7 @@ def ensure_student(masv: str, hoten: str, malop: str | None, user_id: int | None
 def run_seed():
     app = create_app()
     with app.app_context():
-        db.create_all()
+        init_db()
 
         ensure_role("Admin")
         ensure_role("Cán bộ đào tạo")
@@ -0,0 +1,101 @@
+# backend/services/aggregate_service.py
+from __future__ import annotations
+from datetime import datetime
+
+import sqlalchemy as sa
+
+from ..models import db, KetQuaHocTap, HocPhan, StudentAggregate
+
+_IN_CHUNK = 900
+
+_AGG_COLUMNS = ["MaSV", "GPA4", "GPA10", "Credits", "CreditsEarned", "DebtCredits", "FailCount", "UpdatedAt"]
+
+
+def _chunks(seq, size):
+    seq = list(seq)
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def _failed():
+    # Trượt: DiemHe10 < 4.0 hoặc điểm chữ F - đúng điều kiện của warning_scan trước đây. Danh sách SV nguy
+    # cơ trên dashboard trước đây dùng DiemHe4 < 1.0; nay cả hai dùng chung điều kiện này (xem README)
+    return sa.or_(KetQuaHocTap.DiemHe10 < 4.0, KetQuaHocTap.DiemChu == "F")
+
+
+def aggregate_select():
+    # Chỉ điểm cuối cùng (LaDiemCuoiCung, theo chính sách thi lại): lần thi trượt đã thi lại đạt không còn
+    # tính nợ/số môn trượt. Quét cảnh báo trước đây tính mọi lần thi. Nối trong với HocPhan như quét cũ:
+    # điểm của học phần không có trong danh mục không được tính
+    credits = sa.func.coalesce(HocPhan.SoTinChi, 0)
+    w = sa.func.sum(credits)
+    debt = sa.func.sum(sa.case((_failed(), credits), else_=0))
+    return (sa.select(
+                KetQuaHocTap.MaSV,
+                (sa.func.sum(KetQuaHocTap.DiemHe4 * credits) / sa.func.nullif(w, 0)).label("GPA4"),
+                (sa.func.sum(KetQuaHocTap.DiemHe10 * credits) / sa.func.nullif(w, 0)).label("GPA10"),
+                w.label("Credits"),
+                (w - debt).label("CreditsEarned"),
+                debt.label("DebtCredits"),
+                sa.func.sum(sa.case((_failed(), 1), else_=0)).label("FailCount"),
+                sa.literal(datetime.utcnow(), sa.DateTime).label("UpdatedAt"),
+            )
+            .select_from(KetQuaHocTap)
+            .join(HocPhan, HocPhan.MaHP == KetQuaHocTap.MaHP)
+            .where(KetQuaHocTap.LaDiemCuoiCung == sa.true())
+            .group_by(KetQuaHocTap.MaSV))
+
+
+def refresh_student_aggregates(masvs=None, *, conn=None):
+    # masvs=None: dựng lại toàn bộ bảng. Gọi trong cùng transaction với thao tác ghi điểm.
+    ex = conn if conn is not None else db.session
+    table = StudentAggregate.__table__
+    if masvs is None:
+        ex.execute(table.delete())
+        ex.execute(table.insert().from_select(_AGG_COLUMNS, aggregate_select()))
+        return
+    for part in _chunks({m for m in masvs if m}, _IN_CHUNK):
+        ex.execute(table.delete().where(table.c.MaSV.in_(part)))
+        ex.execute(table.insert().from_select(
+            _AGG_COLUMNS, aggregate_select().where(KetQuaHocTap.MaSV.in_(part))))
+
+
+def apply_retake_policy(masvs=None, policy: str = "keep-latest", *, conn=None):
+    # Đặt lại LaDiemCuoiCung cho mỗi cặp (MaSV, MaHP): keep-latest giữ lần nhập sau cùng,
+    # best giữ lần có DiemHe4 cao nhất (hoà thì HocKy lớn hơn).
+    ex = conn if conn is not None else db.session
+    policy = (policy or "keep-latest").strip().lower()
+    if policy == "best":
+        order = (sa.func.coalesce(KetQuaHocTap.DiemHe4, 0.0).desc(),
+                 sa.func.coalesce(KetQuaHocTap.HocKy, "").desc(),
+                 KetQuaHocTap.MaKQ.desc())
+    else:
+        order = (KetQuaHocTap.MaKQ.desc(),)
+
+    def _run(where):
+        ranked = sa.select(
+            KetQuaHocTap.MaKQ,
+            sa.func.row_number().over(
+                partition_by=(KetQuaHocTap.MaSV, KetQuaHocTap.MaHP), order_by=order,
+            ).label("rn"),
+        )
+        if where is not None:
+            ranked = ranked.where(where)
+        ranked = ranked.subquery()
+        winners = sa.select(ranked.c.MaKQ).where(ranked.c.rn == 1)
+        upd = sa.update(KetQuaHocTap.__table__).values(
+            LaDiemCuoiCung=KetQuaHocTap.__table__.c.MaKQ.in_(winners))
+        if where is not None:
+            upd = upd.where(where)
+        ex.execute(upd)
+
+    if masvs is None:
+        _run(None)
+        return
+    for part in _chunks({m for m in masvs if m}, _IN_CHUNK):
+        _run(KetQuaHocTap.__table__.c.MaSV.in_(part))
+
+
+def course_students(mahp: str):
+    return [m for (m,) in db.session.query(KetQuaHocTap.MaSV)
+            .filter(KetQuaHocTap.MaHP == mahp).distinct().all()]
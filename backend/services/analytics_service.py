@@ -1,52 +1,57 @@
 # backend/services/analytics_service.py
-from sqlalchemy import func, case, and_, desc
-from ..models import db, SinhVien, KetQuaHocTap, HocPhan, SystemConfig, LopHoc
+import threading
+import time
+from typing import Dict
 
-def _cfg_float(dct, key, default):
-    try:
-        return float(dct.get(key, default))
-    except Exception:
-        return float(default)
+from flask import current_app
+from sqlalchemy import func, case, and_, or_, desc, select, true
+from ..models import db, SinhVien, KetQuaHocTap, HocPhan, LopHoc, StudentAggregate
+from .data_version import ANALYTICS, versions
+from .config_service import gpa_warn_threshold, debt_warn_credits
 
 def get_system_configs():
-    cfg = {c.ConfigKey: c.ConfigValue for c in SystemConfig.query.all()}
     return {
-        "GPA_WARN_THRESHOLD": _cfg_float(cfg, "GPA_TRUNGBINH_THRESHOLD", 2.0),
-        "DEBT_WARN_TINCHI" : _cfg_float(cfg, "TINCHI_NO_CANHCAO_THRESHOLD", 10.0),
+        "GPA_WARN_THRESHOLD": gpa_warn_threshold(),
+        "DEBT_WARN_TINCHI" : debt_warn_credits(),
     }
 
-def get_dashboard_analytics(ma_nganh=None):
-    q_sv = db.session.query(func.count(SinhVien.MaSV))
+def kpi_counts(passed, ma_nganh=None):
+    # Một truy vấn: số SV/HP là subquery vô hướng, tổng KQ và KQ đạt bằng SUM(CASE ...) trên một lượt quét
+    # -> (số SV, số HP, số KQ, số KQ đạt)
+    q_sv = select(func.count(SinhVien.MaSV))
     if ma_nganh:
         q_sv = q_sv.join(LopHoc, LopHoc.MaLop == SinhVien.MaLop, isouter=True)\
-                   .filter(LopHoc.MaNganh == ma_nganh)
-    total_students = int(q_sv.scalar() or 0)
-    total_courses  = int(db.session.query(func.count(HocPhan.MaHP)).scalar() or 0)
+                   .where(LopHoc.MaNganh == ma_nganh)
+    q = select(
+        q_sv.scalar_subquery(),
+        select(func.count(HocPhan.MaHP)).scalar_subquery(),
+        func.count(KetQuaHocTap.MaKQ),
+        func.coalesce(func.sum(case((passed, 1), else_=0)), 0),
+    ).select_from(KetQuaHocTap)
+    n_sv, n_hp, n_kq, n_pass = db.session.execute(q).one()
+    return int(n_sv or 0), int(n_hp or 0), int(n_kq or 0), int(n_pass or 0)
 
-    total_kq = db.session.query(func.count(KetQuaHocTap.MaKQ)).scalar() or 1
-    pass_kq  = db.session.query(func.count(KetQuaHocTap.MaKQ))\
-                         .filter(KetQuaHocTap.DiemHe4 >= 2.0).scalar() or 0
-    pass_rate = float(pass_kq) / float(total_kq) * 100.0
+def _kpis(ma_nganh):
+    total_students, total_courses, total_kq, pass_kq = kpi_counts(KetQuaHocTap.DiemHe4 >= 2.0, ma_nganh)
+    pass_rate = float(pass_kq) / float(total_kq or 1) * 100.0
+    return {
+        "total_students": total_students,
+        "total_courses": total_courses,
+        "pass_rate": pass_rate
+    }
 
+def _students_at_risk(ma_nganh):
+    # Lọc ngưỡng ngay trong SQL (GPA/TC nợ đã có sẵn trong StudentAggregate nên là WHERE, không cần
+    # GROUP BY ... HAVING): chỉ SV thực sự có nguy cơ được trả về, tối đa 50 SV nợ nhiều nhất
     cfg = get_system_configs()
-    sub = (db.session.query(
-                KetQuaHocTap.MaSV.label("MaSV"),
-                func.sum((KetQuaHocTap.DiemHe4* (case((HocPhan.SoTinChi != None, HocPhan.SoTinChi), else_=0)))).label("S"),
-                func.sum(case((HocPhan.SoTinChi != None, HocPhan.SoTinChi), else_=0)).label("W"),
-                func.sum(case((KetQuaHocTap.DiemHe4 < 1.0, HocPhan.SoTinChi), else_=0)).label("DebtTC"),
-            )
-            .join(HocPhan, HocPhan.MaHP == KetQuaHocTap.MaHP, isouter=True)
-            .filter(KetQuaHocTap.LaDiemCuoiCung.is_(True))
-            .group_by(KetQuaHocTap.MaSV)
-            ).subquery()
-
+    gpa = func.coalesce(StudentAggregate.GPA4, 0.0)
+    debt = func.coalesce(StudentAggregate.DebtCredits, 0)
     q_risk = (db.session.query(
                 SinhVien.MaSV, SinhVien.HoTen, SinhVien.MaLop,
-                (sub.c.S / func.nullif(sub.c.W, 0)).label("GPA4"),
-                sub.c.DebtTC
-            )
-            .join(sub, sub.c.MaSV == SinhVien.MaSV, isouter=True)
-            .order_by(desc("DebtTC"))
+                gpa.label("GPA"), debt.label("DebtTC"))
+            .join(StudentAggregate, StudentAggregate.MaSV == SinhVien.MaSV, isouter=True)
+            .filter(or_(gpa <= cfg["GPA_WARN_THRESHOLD"], debt >= cfg["DEBT_WARN_TINCHI"]))
+            .order_by(desc("DebtTC"), SinhVien.MaSV)
             .limit(50)
             )
 
@@ -56,38 +61,65 @@ def get_dashboard_analytics(ma_nganh=None):
 
     students_at_risk = []
     for r in q_risk:
-        gpa = float(r.GPA4 or 0.0)
-        debt = int(r.DebtTC or 0)
-        if gpa <= cfg["GPA_WARN_THRESHOLD"] or debt >= cfg["DEBT_WARN_TINCHI"]:
-            students_at_risk.append({
-                "MaSV": r.MaSV, "HoTen": r.HoTen, "Lop": r.MaLop,
-                "Rule": "GPA_BELOW" if gpa <= cfg["GPA_WARN_THRESHOLD"] else "DEBT_OVER",
-                "Value": round(gpa, 2) if gpa <= cfg["GPA_WARN_THRESHOLD"] else debt,
-            })
+        low_gpa = float(r.GPA) <= cfg["GPA_WARN_THRESHOLD"]
+        students_at_risk.append({
+            "MaSV": r.MaSV, "HoTen": r.HoTen, "Lop": r.MaLop,
+            "Rule": "GPA_BELOW" if low_gpa else "DEBT_OVER",
+            "Value": round(float(r.GPA), 2) if low_gpa else int(r.DebtTC),
+        })
+    return students_at_risk
 
+def _top_failing_courses(ma_nganh):
     q_top = (db.session.query(
                 KetQuaHocTap.MaHP.label("MaHP"),
                 func.count(KetQuaHocTap.MaKQ).label("N"),
                 func.sum(case((KetQuaHocTap.DiemHe4 == 0, 1), else_=0)).label("F"))
              .join(HocPhan, HocPhan.MaHP == KetQuaHocTap.MaHP)
-             .filter(KetQuaHocTap.LaDiemCuoiCung.is_(True), HocPhan.TinhDiemTichLuy.is_(True))
+             .filter(KetQuaHocTap.LaDiemCuoiCung == true(), HocPhan.TinhDiemTichLuy.is_(True))
              .group_by(KetQuaHocTap.MaHP)
              .order_by((func.sum(case((KetQuaHocTap.DiemHe4 == 0, 1), else_=0))*1.0/func.count(KetQuaHocTap.MaKQ)).desc())
              .limit(10)
             )
     name_map = {hp.MaHP: hp.TenHP for hp in HocPhan.query.all()}
-    top_failing_courses = [{
+    return [{
         "MaHP": m, "TenHP": name_map.get(m, ""),
         "failure_rate": (float(f or 0)/float(max(1, n)))*100.0,
         "total": int(n)
     } for (m, n, f) in q_top.all()]
 
-    return {
-        "kpis": {
-            "total_students": total_students,
-            "total_courses": total_courses,
-            "pass_rate": pass_rate
-        },
-        "students_at_risk": students_at_risk,
-        "top_failing_courses": top_failing_courses
-    }
+# Mỗi phần tính riêng khi được hỏi; phần không phụ thuộc ngành dùng chung một khóa
+_SECTIONS = {
+    "kpis": (_kpis, True),
+    "students_at_risk": (_students_at_risk, True),
+    "top_failing_courses": (_top_failing_courses, False),
+}
+
+# (phần, ma_nganh, phiên bản "analytics") -> (hết hạn, giá trị). Ghi dữ liệu tăng phiên bản
+# (services.data_version) nên khóa cũ không còn được dùng; TTL chặn số liệu cũ khi có thay đổi
+# không đi qua bump (sửa tay trong DB, đóng case...).
+_CACHE: Dict[tuple, tuple] = {}
+_CACHE_LOCK = threading.Lock()
+
+def invalidate_analytics_cache():
+    with _CACHE_LOCK:
+        _CACHE.clear()
+
+def _section(name, ma_nganh, version):
+    fn, per_major = _SECTIONS[name]
+    key = (name, ma_nganh if per_major else None, version)
+    now = time.monotonic()
+    with _CACHE_LOCK:
+        hit = _CACHE.get(key)
+    if hit and hit[0] > now:
+        return hit[1]
+    value = fn(ma_nganh)
+    ttl = float(current_app.config.get("ANALYTICS_CACHE_TTL", 300))
+    with _CACHE_LOCK:
+        for k in [k for k, (exp, _) in _CACHE.items() if k[2] != version or exp <= now]:
+            del _CACHE[k]
+        _CACHE[key] = (now + ttl, value)
+    return value
+
+def get_dashboard_analytics(ma_nganh=None, sections=None):
+    version = versions([ANALYTICS])[ANALYTICS]
+    return {name: _section(name, ma_nganh or None, version) for name in (sections or _SECTIONS)}
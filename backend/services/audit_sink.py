@@ -0,0 +1,124 @@
+# backend/services/audit_sink.py
+from __future__ import annotations
+import atexit
+import logging
+import queue
+import threading
+from typing import Any, Dict, List
+
+from flask import current_app
+
+from ..models import db, ImportLog
+
+log = logging.getLogger(__name__)
+
+# Bản ghi ImportLog xếp hàng trong bộ nhớ, một luồng nền ghi theo lô (executemany, một commit/lô)
+# nên request không phải trả thêm một transaction ghi. Hàng đợi đầy, AUDIT_ASYNC=0 hoặc đang tắt
+# -> ghi đồng bộ trên kết nối riêng. Bản ghi còn trong hàng đợi được ghi nốt khi tiến trình thoát
+# (atexit); tiến trình bị kill thì mất tối đa một khoảng AUDIT_FLUSH_INTERVAL.
+_LOCK = threading.Lock()
+_STATE: Dict[str, Any] = {"queue": None, "thread": None, "stopping": False}
+
+
+def _write(app, rows: List[Dict[str, Any]]):
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(ImportLog.__table__.insert(), rows)
+
+
+def _write_grouped(items):
+    # items: [(app, row)] -> mỗi app (mỗi DB) một lệnh executemany
+    by_app: Dict[int, tuple] = {}
+    for app, row in items:
+        by_app.setdefault(id(app), (app, []))[1].append(row)
+    for app, rows in by_app.values():
+        try:
+            _write(app, rows)
+        except Exception:
+            log.exception("[audit] ghi %d bản ghi thất bại", len(rows))
+
+
+def _worker(q: "queue.Queue", batch_size: int, interval: float):
+    while True:
+        try:
+            first = q.get(timeout=interval)
+        except queue.Empty:
+            if _STATE["stopping"]:
+                return
+            continue
+        if first is None:
+            return
+        items = [first]
+        while len(items) < batch_size:
+            try:
+                nxt = q.get_nowait()
+            except queue.Empty:
+                break
+            if nxt is None:
+                _write_grouped(items)
+                return
+            items.append(nxt)
+        _write_grouped(items)
+
+
+def _ensure_started(app) -> "queue.Queue | None":
+    with _LOCK:
+        if _STATE["stopping"]:
+            return None
+        if _STATE["queue"] is None:
+            q = queue.Queue(maxsize=int(app.config.get("AUDIT_QUEUE_SIZE", 10000)))
+            t = threading.Thread(
+                target=_worker, name="audit-sink", daemon=True,
+                args=(q, int(app.config.get("AUDIT_BATCH_SIZE", 200)),
+                      float(app.config.get("AUDIT_FLUSH_INTERVAL", 1.0))))
+            _STATE.update(queue=q, thread=t)
+            t.start()
+        return _STATE["queue"]
+
+
+def record(**row):
+    # row: các cột ImportLog. Gọi trong app context; không ném lỗi ra request
+    app = current_app._get_current_object()
+    q = _ensure_started(app) if app.config.get("AUDIT_ASYNC", True) else None
+    if q is not None:
+        try:
+            q.put_nowait((app, row))
+            return
+        except queue.Full:
+            log.warning("[audit] hàng đợi đầy, ghi đồng bộ")
+    try:
+        _write(app, [row])
+    except Exception:
+        log.exception("[audit] ghi đồng bộ thất bại")
+
+
+def flush(timeout: float = 5.0):
+    # Ghi nốt hàng đợi rồi dừng luồng nền (atexit, khi test); trong lúc đó record() ghi đồng bộ,
+    # lần record() kế tiếp khởi động lại luồng
+    with _LOCK:
+        q, t = _STATE["queue"], _STATE["thread"]
+        _STATE.update(queue=None, thread=None, stopping=True)
+    if q is None:
+        _STATE["stopping"] = False
+        return
+    try:
+        q.put(None, timeout=timeout)
+    except queue.Full:
+        pass
+    if t is not None:
+        t.join(timeout)
+    rest = []
+    while True:
+        try:
+            item = q.get_nowait()
+        except queue.Empty:
+            break
+        if item is not None:
+            rest.append(item)
+    if rest:
+        _write_grouped(rest)
+    with _LOCK:
+        _STATE["stopping"] = False
+
+
+atexit.register(flush)
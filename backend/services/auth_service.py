@@ -0,0 +1,124 @@
+# backend/services/auth_service.py
+from __future__ import annotations
+import multiprocessing
+import os
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app, has_app_context
+from passlib.context import CryptContext
+from passlib.hash import bcrypt, pbkdf2_sha256
+from sqlalchemy.orm import joinedload
+
+from ..models import db, NguoiDung
+
+DEFAULT_ROLE = "Sinh viên"
+
+# Xác thực chấp nhận cả hai dạng; băm mới luôn theo chính sách bên dưới
+_verify_ctx = CryptContext(schemes=["bcrypt", "pbkdf2_sha256"])
+
+
+def _cfg(key, default):
+    return current_app.config.get(key, default) if has_app_context() else default
+
+
+def _role_key(name: Optional[str]) -> str:
+    # TenVaiTro không thống nhất giữa các nguồn ("Sinh viên" của seed, "SinhVien" do import tạo):
+    # so khớp không dấu, không phân biệt hoa thường và khoảng trắng
+    s = unicodedata.normalize("NFKD", (name or "").replace("đ", "d").replace("Đ", "D"))
+    return "".join(c for c in s if not unicodedata.combining(c) and not c.isspace()).lower()
+
+
+def bcrypt_rounds(role: Optional[str] = None) -> int:
+    # PASSWORD_BCRYPT_ROUNDS_BY_ROLE = {"Admin": 13, "Sinh viên": 10, ...} theo TenVaiTro;
+    # vai trò khác dùng PASSWORD_BCRYPT_ROUNDS
+    by_role = {_role_key(k): v for k, v in (_cfg("PASSWORD_BCRYPT_ROUNDS_BY_ROLE", None) or {}).items()}
+    return int(by_role.get(_role_key(role)) or _cfg("PASSWORD_BCRYPT_ROUNDS", 12))
+
+
+@lru_cache(maxsize=None)
+def _bcrypt(rounds: int):
+    return bcrypt.using(rounds=rounds)
+
+
+@lru_cache(maxsize=None)
+def _pbkdf2(rounds: int):
+    return pbkdf2_sha256.using(rounds=rounds)
+
+
+def hash_password(password: str, role: Optional[str] = None) -> str:
+    return _bcrypt(bcrypt_rounds(role)).hash(password)
+
+
+def hash_provisioned(password: str) -> str:
+    # Tài khoản tạo hàng loạt khi nhập danh sách/điểm (mật khẩu ban đầu = MaSV): pbkdf2 rẻ hơn
+    # bcrypt nhiều lần, và được băm lại theo chính sách vai trò ở lần đăng nhập đầu tiên
+    return _pbkdf2(int(_cfg("PASSWORD_BULK_PBKDF2_ROUNDS", 29000))).hash(password)
+
+
+def _hash_chunk(rounds: int, passwords: List[str]) -> List[str]:
+    # Chạy trong process con: không có app context nên nhận rounds từ process cha
+    h = _pbkdf2(rounds)
+    return [h.hash(p) for p in passwords]
+
+
+_POOL: Dict[str, object] = {"workers": 0, "executor": None}
+
+# Dưới ngưỡng này băm ngay trong process hiện tại: khởi động pool (spawn) tốn hơn phần tiết kiệm
+_PARALLEL_MIN = 64
+
+
+def _executor(workers: int) -> ProcessPoolExecutor:
+    if _POOL["workers"] != workers:
+        if _POOL["executor"] is not None:
+            _POOL["executor"].shutdown(wait=False)
+        _POOL["executor"] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        _POOL["workers"] = workers
+    return _POOL["executor"]  # type: ignore[return-value]
+
+
+def hash_provisioned_many(passwords: List[str], workers: Optional[int] = None) -> Tuple[List[str], int]:
+    # -> (hash theo đúng thứ tự passwords, số process đã dùng). Băm là việc CPU thuần,
+    # chia lô sang PASSWORD_HASH_WORKERS process để không bị GIL giới hạn
+    rounds = int(_cfg("PASSWORD_BULK_PBKDF2_ROUNDS", 29000))
+    workers = int(workers or _cfg("PASSWORD_HASH_WORKERS", 0) or os.cpu_count() or 1)
+    if workers <= 1 or len(passwords) < _PARALLEL_MIN:
+        return _hash_chunk(rounds, passwords), 1
+    size = -(-len(passwords) // (workers * 4))
+    chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+    out: List[str] = []
+    for part in _executor(workers).map(_hash_chunk, [rounds] * len(chunks), chunks):
+        out.extend(part)
+    return out, workers
+
+
+def needs_rehash(stored: str, role: Optional[str] = None) -> bool:
+    if not bcrypt.identify(stored):
+        return True
+    return _bcrypt(bcrypt_rounds(role)).needs_update(stored)
+
+
+def authenticate(username: str, password: str) -> Optional[Tuple[NguoiDung, str]]:
+    # -> (user, tên vai trò) hoặc None. Vai trò nạp cùng truy vấn với user.
+    user = (NguoiDung.query.options(joinedload(NguoiDung.vai_tro_rel))
+            .filter_by(TenDangNhap=username).first())
+    if not user:
+        return None
+    role = user.vai_tro_rel.TenVaiTro if user.vai_tro_rel else DEFAULT_ROLE
+    stored = user.MatKhauMaHoa or ""
+    try:
+        if stored.startswith("$"):
+            ok = _verify_ctx.verify(password, stored)
+        else:
+            ok = (password == stored)
+    except Exception:
+        ok = False
+    if not ok:
+        return None
+    # Mật khẩu lưu thô, pbkdf2 khởi tạo hàng loạt, hoặc bcrypt khác cost hiện hành -> băm lại
+    if not stored.startswith("$") or needs_rehash(stored, role):
+        user.MatKhauMaHoa = hash_password(password, role)
+        db.session.commit()
+    return user, role
@@ -0,0 +1,83 @@
+# backend/services/config_service.py
+from __future__ import annotations
+import threading
+import time
+from typing import Dict, Optional
+
+from flask import current_app, has_app_context
+
+from ..models import SystemConfig
+
+RETAKE_POLICIES = ("keep-latest", "best")
+
+DEFAULTS = {
+    "EMAIL_DOMAIN": "vui.edu.vn",
+    "GPA_TRUNGBINH_THRESHOLD": "2.0",
+    "TINCHI_NO_CANHCAO_THRESHOLD": "10",
+    "RETAKE_POLICY_DEFAULT": "keep-latest",
+}
+
+# Toàn bộ SystemConfig nạp một lần: {"values": {...}, "meta": {...}, "expires": t}.
+# PUT /api/admin/configs gọi invalidate_config_cache() sau commit; TTL để các process khác
+# (nhiều worker) cũng thấy thay đổi sau tối đa CONFIG_CACHE_TTL giây.
+_CACHE: Dict[str, object] = {"values": None, "meta": None, "expires": 0.0}
+_CACHE_LOCK = threading.Lock()
+
+
+def invalidate_config_cache():
+    with _CACHE_LOCK:
+        _CACHE["values"] = None
+
+
+def _load():
+    now = time.monotonic()
+    with _CACHE_LOCK:
+        if _CACHE["values"] is not None and _CACHE["expires"] > now:
+            return _CACHE["values"], _CACHE["meta"]
+    rows = SystemConfig.query.all()
+    values = {r.ConfigKey: r.ConfigValue for r in rows}
+    meta = {r.ConfigKey: r.Description or "" for r in rows}
+    ttl = float(current_app.config.get("CONFIG_CACHE_TTL", 60)) if has_app_context() else 60.0
+    with _CACHE_LOCK:
+        _CACHE.update(values=values, meta=meta, expires=now + ttl)
+    return values, meta
+
+
+def all_configs() -> Dict[str, str]:
+    return dict(_load()[0])
+
+
+def config_meta() -> Dict[str, str]:
+    return dict(_load()[1])
+
+
+def get_str(key: str, default: Optional[str] = None) -> Optional[str]:
+    v = _load()[0].get(key)
+    if v is None or str(v).strip() == "":
+        return DEFAULTS.get(key) if default is None else default
+    return v
+
+
+def get_float(key: str, default: Optional[float] = None) -> float:
+    try:
+        return float(get_str(key))
+    except (TypeError, ValueError):
+        return float(default if default is not None else DEFAULTS.get(key, 0))
+
+
+def email_domain() -> str:
+    return get_str("EMAIL_DOMAIN")
+
+
+def gpa_warn_threshold() -> float:
+    return get_float("GPA_TRUNGBINH_THRESHOLD", 2.0)
+
+
+def debt_warn_credits() -> float:
+    return get_float("TINCHI_NO_CANHCAO_THRESHOLD", 10.0)
+
+
+def retake_policy() -> str:
+    # Giá trị lạ trong DB -> mặc định keep-latest
+    v = (get_str("RETAKE_POLICY_DEFAULT") or "").strip().lower()
+    return v if v in RETAKE_POLICIES else "keep-latest"
@@ -0,0 +1,70 @@
+# backend/services/course_matcher.py
+from __future__ import annotations
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def _trigrams(key: str) -> set:
+    s = f"  {key} "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+class CourseIndex:
+    # Chỉ mục trigram trên TenHP đã chuẩn hoá: chỉ chấm SequenceMatcher cho vài ứng viên
+    # chung nhiều trigram nhất thay vì toàn bộ danh mục.
+
+    def __init__(self, names: Iterable[Tuple[str, str]], *, candidates: int = 25):
+        self.candidates = candidates
+        self.keys: List[str] = []
+        self.codes: List[str] = []
+        self.sizes: List[int] = []
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        for key, mahp in names:
+            if not key:
+                continue
+            idx = len(self.keys)
+            self.keys.append(key)
+            self.codes.append(mahp)
+            grams = _trigrams(key)
+            self.sizes.append(len(grams))
+            for g in grams:
+                self.postings[g].append(idx)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, key_norm: str, threshold: float = 0.78) -> Optional[str]:
+        if not key_norm or not self.keys:
+            return None
+        grams = _trigrams(key_norm)
+        hits: Dict[int, int] = defaultdict(int)
+        for g in grams:
+            for idx in self.postings.get(g, ()):
+                hits[idx] += 1
+        if not hits:
+            return None
+        n = len(grams)
+        ranked = sorted(hits, key=lambda i: 2.0 * hits[i] / (n + self.sizes[i]), reverse=True)[: self.candidates]
+
+        parts = set(key_norm.split('_'))
+        best, score = None, 0.0
+        for idx in ranked:
+            k = self.keys[idx]
+            overlap = len(set(k.split('_')) & parts)
+            r = SequenceMatcher(a=k, b=key_norm).ratio() + overlap * 0.05
+            if r > score:
+                best, score = self.codes[idx], r
+        return best if score >= threshold else None
+
+
+_INDEX_CACHE: Dict[str, object] = {"sig": None, "index": None}
+
+
+def course_index(names: Dict[str, str]) -> CourseIndex:
+    # names: {TenHP chuẩn hoá: MaHP}; chỉ dựng lại khi danh mục đổi
+    sig = hash(frozenset(names.items()))
+    if _INDEX_CACHE["sig"] != sig:
+        _INDEX_CACHE["index"] = CourseIndex(names.items())
+        _INDEX_CACHE["sig"] = sig
+    return _INDEX_CACHE["index"]  # type: ignore[return-value]
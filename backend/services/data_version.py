@@ -0,0 +1,52 @@
+# backend/services/data_version.py
+from __future__ import annotations
+import time
+from typing import Dict, Iterable
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from ..models import db, DataVersion
+
+GLOBAL = "global"  # danh mục học phần/lớp/ngành, CTĐT, chính sách thi lại
+ANALYTICS = "analytics"  # mọi thay đổi ảnh hưởng số liệu dashboard
+GRADES = "grades"  # dữ liệu SV/điểm hoặc danh mục đổi (không gồm quét cảnh báo, cấu hình): nhập điểm dựa vào
+
+_IN_CHUNK = 900
+
+
+def student_scope(masv: str) -> str:
+    return f"student:{masv}"
+
+
+def bump(scopes: Iterable[str]):
+    # Gọi trong transaction ghi dữ liệu. Bản ghi mới bắt đầu từ mốc thời gian (ms) để
+    # ETag cũ ở client không trùng lại sau khi dựng lại DB.
+    rows = [{"Scope": s, "Version": int(time.time() * 1000)} for s in {s for s in scopes if s}]
+    if not rows:
+        return
+    stmt = sqlite_insert(DataVersion.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["Scope"], set_={"Version": DataVersion.__table__.c.Version + 1})
+    db.session.execute(stmt, rows)
+
+
+def bump_students(masvs: Iterable[str]):
+    scopes = {student_scope(m) for m in masvs if m}
+    if scopes:
+        bump(scopes | {ANALYTICS, GRADES})
+
+
+def bump_global():
+    bump([GLOBAL, ANALYTICS, GRADES])
+
+
+def bump_analytics():
+    bump([ANALYTICS])
+
+
+def versions(scopes: Iterable[str]) -> Dict[str, int]:
+    scopes = list(scopes)
+    found = dict(db.session.execute(
+        sa.select(DataVersion.Scope, DataVersion.Version).where(DataVersion.Scope.in_(scopes))).all())
+    return {s: int(found.get(s, 0)) for s in scopes}
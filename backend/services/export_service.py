@@ -0,0 +1,85 @@
+# backend/services/export_service.py
+from __future__ import annotations
+import csv
+import io
+import os
+import tempfile
+from typing import Iterable, Iterator, Sequence
+
+from openpyxl import Workbook
+
+from ..models import db, SinhVien, LopHoc, NganhHoc, HocPhan, KetQuaHocTap
+
+# Số dòng đọc mỗi lượt từ cursor và gom vào mỗi chunk gửi đi
+_BATCH = 1000
+_FILE_CHUNK = 64 * 1024
+
+STUDENT_HEADER = ["MaSV", "HoTen", "Lop", "Nganh"]
+GRADEBOOK_HEADER = ["MaSV", "HoTen", "MaLop", "HocKy", "MaHP", "TenHP", "SoTinChi",
+                    "DiemHe10", "DiemHe4", "DiemChu", "LaDiemCuoiCung"]
+
+
+def student_rows() -> Iterator[tuple]:
+    q = (db.session.query(SinhVien.MaSV, SinhVien.HoTen, LopHoc.TenLop, NganhHoc.TenNganh)
+         .join(LopHoc, LopHoc.MaLop == SinhVien.MaLop, isouter=True)
+         .join(NganhHoc, NganhHoc.MaNganh == LopHoc.MaNganh, isouter=True)
+         .execution_options(yield_per=_BATCH))
+    for msv, ht, lop, nganh in q:
+        yield msv, ht, lop or "", nganh or ""
+
+
+def gradebook_rows(ma_lop=None, ma_nganh=None, hoc_ky=None) -> Iterator[tuple]:
+    q = (db.session.query(
+            SinhVien.MaSV, SinhVien.HoTen, SinhVien.MaLop, KetQuaHocTap.HocKy,
+            KetQuaHocTap.MaHP, HocPhan.TenHP, HocPhan.SoTinChi,
+            KetQuaHocTap.DiemHe10, KetQuaHocTap.DiemHe4, KetQuaHocTap.DiemChu,
+            KetQuaHocTap.LaDiemCuoiCung)
+         .join(SinhVien, SinhVien.MaSV == KetQuaHocTap.MaSV)
+         .join(HocPhan, HocPhan.MaHP == KetQuaHocTap.MaHP, isouter=True))
+    if ma_lop:
+        q = q.filter(SinhVien.MaLop == ma_lop)
+    if ma_nganh:
+        q = q.join(LopHoc, LopHoc.MaLop == SinhVien.MaLop).filter(LopHoc.MaNganh == ma_nganh)
+    if hoc_ky:
+        q = q.filter(KetQuaHocTap.HocKy == hoc_ky)
+    q = q.order_by(SinhVien.MaSV, KetQuaHocTap.MaKQ).execution_options(yield_per=_BATCH)
+    for r in q:
+        yield tuple(r[:-1]) + (1 if r[-1] else 0,)
+
+
+def iter_csv(header: Sequence[str], rows: Iterable[Sequence]) -> Iterator[str]:
+    # Mỗi lần yield tối đa _BATCH dòng; bộ nhớ không phụ thuộc tổng số dòng
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(header)
+    n = 0
+    for row in rows:
+        w.writerow(["" if v is None else v for v in row])
+        n += 1
+        if n % _BATCH == 0:
+            yield buf.getvalue()
+            buf.seek(0); buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def iter_xlsx(header: Sequence[str], rows: Iterable[Sequence], title: str = "Sheet1") -> Iterator[bytes]:
+    # openpyxl write_only ghi từng dòng ra file tạm thay vì giữ cây ô trong RAM;
+    # file .xlsx (zip) chỉ hoàn chỉnh sau save() nên gửi theo từng khúc sau đó
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    ws.append(list(header))
+    for row in rows:
+        ws.append(list(row))
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        wb.save(path)
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(_FILE_CHUNK)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
@@ -0,0 +1,108 @@
+# backend/services/import_fingerprint.py
+from __future__ import annotations
+import hashlib
+import json
+from datetime import datetime
+from typing import Dict, Optional
+
+import pandas as pd
+import sqlalchemy as sa
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from ..models import db, ImportFingerprint, ImportRun
+from .data_version import GRADES, student_scope, versions
+
+# Bỏ qua việc nhập lại tệp/dòng không đổi:
+# - cả tệp: sha256 trùng lần chạy gần nhất của cùng endpoint, cùng tham số, và dữ liệu SV/điểm/danh mục
+#   chưa đổi kể từ đó (phiên bản GRADES lưu ở ImportRun bằng phiên bản hiện tại; quét cảnh báo hay lưu
+#   cấu hình không tính). ImportRun được ghi trong transaction nhập, không phụ thuộc audit log ghi nền.
+#   Chỉ áp dụng cho lần ghi thật: preview luôn xử lý tệp
+# - từng dòng: băm các ô của dòng; dòng được bỏ qua khi băm trùng lần áp dụng trước (cùng Scope)
+#   và phiên bản DataVersion của SV chưa đổi từ lần đó
+_IGNORED_PARAMS = {"preview", "async", "force"}
+_IN_CHUNK = 900
+
+
+def _params(args: Dict[str, str]) -> Dict[str, str]:
+    return {k: v for k, v in args.items() if k not in _IGNORED_PARAMS}
+
+
+def last_run_match(endpoint: str, file_hash: str, args: Dict[str, str]) -> Optional[ImportRun]:
+    # -> bản ghi ImportRun của lần chạy trùng, hoặc None nếu phải nhập lại
+    last = db.session.get(ImportRun, endpoint)
+    if not last or last.FileHash != file_hash:
+        return None
+    try:
+        same_params = _params(json.loads(last.Params or "{}")) == _params(args)
+    except ValueError:
+        return None
+    if not same_params:
+        return None
+    return last if data_version() == last.DataVersion else None
+
+
+def remember_run(endpoint: str, file_hash: str, args: Dict[str, str]):
+    # Gọi trong transaction ghi, sau mọi bump: phiên bản lưu lại là phiên bản sau lần nhập này
+    stmt = sqlite_insert(ImportRun.__table__).values(
+        Endpoint=endpoint, FileHash=file_hash, Params=json.dumps(_params(args), ensure_ascii=False),
+        DataVersion=data_version(), FinishedAt=datetime.utcnow())
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=["Endpoint"],
+        set_={c: stmt.excluded[c] for c in ("FileHash", "Params", "DataVersion", "FinishedAt")}))
+
+
+def row_scope(kind: str, *context) -> str:
+    # Ngữ cảnh (tiêu đề cột, tham số, phiên bản danh mục) nằm trong Scope: đổi kỳ/lớp không ghi đè
+    # dấu vết của tệp khác
+    digest = hashlib.sha1(json.dumps(context, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+    return f"{kind}:{digest[:16]}"
+
+
+def row_hashes(df: pd.DataFrame) -> Dict:
+    # -> {chỉ số dòng: băm nội dung dòng}; hash_pandas_object cố định giữa các lần chạy (khóa băm mặc định)
+    return {i: f"{int(v):016x}" for i, v in pd.util.hash_pandas_object(df, index=False).items()}
+
+
+def _student_versions(masvs) -> Dict[str, int]:
+    out = {}
+    keys = list(masvs)
+    for i in range(0, len(keys), _IN_CHUNK):
+        out.update(versions(student_scope(m) for m in keys[i:i + _IN_CHUNK]))
+    return out
+
+
+def unchanged(scope: str, fps: Dict[str, str]) -> set:
+    # fps: {MaSV: băm dòng} -> các MaSV có dòng trùng lần áp dụng trước và dữ liệu SV chưa đổi
+    stored = {}
+    keys = list(fps)
+    for i in range(0, len(keys), _IN_CHUNK):
+        part = keys[i:i + _IN_CHUNK]
+        for key, h, ver in db.session.execute(
+                sa.select(ImportFingerprint.RowKey, ImportFingerprint.Hash, ImportFingerprint.Version)
+                .where(ImportFingerprint.Scope == scope, ImportFingerprint.RowKey.in_(part))):
+            if fps[key] == h:
+                stored[key] = ver
+    if not stored:
+        return set()
+    current = _student_versions(stored)
+    return {m for m, ver in stored.items() if current[student_scope(m)] == ver}
+
+
+def remember(scope: str, fps: Dict[str, str]):
+    # Gọi trong transaction ghi, sau bump_students: lưu kèm phiên bản SV sau lần áp dụng này
+    if not fps:
+        return
+    current = _student_versions(fps)
+    now = datetime.utcnow()
+    rows = [{"Scope": scope, "RowKey": m, "Hash": h, "Version": current[student_scope(m)], "UpdatedAt": now}
+            for m, h in fps.items()]
+    stmt = sqlite_insert(ImportFingerprint.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["Scope", "RowKey"],
+        set_={"Hash": stmt.excluded.Hash, "Version": stmt.excluded.Version, "UpdatedAt": stmt.excluded.UpdatedAt})
+    for i in range(0, len(rows), 2000):
+        db.session.execute(stmt, rows[i:i + 2000])
+
+
+def data_version() -> int:
+    return versions([GRADES])[GRADES]
@@ -0,0 +1,153 @@
+# backend/services/jobs.py
+from __future__ import annotations
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+import sqlalchemy as sa
+from flask import current_app
+
+from ..models import db, Job
+
+log = logging.getLogger(__name__)
+
+# Trạng thái (queued/running/done/failed), kết quả và tiến độ cuối nằm trong bảng Job: mọi worker đều đọc
+# được và còn sau khi khởi động lại. Bộ đếm tiến độ *trong lúc chạy* chỉ giữ trong bộ nhớ của process chạy
+# job (job đang giữ transaction ghi của SQLite nên không ghi được xuống DB giữa chừng): hỏi process khác
+# thì chỉ thấy Status, Progress có khi job kết thúc. Job.Worker = process chạy job.
+_WORKER = f"{socket.gethostname()}:{os.getpid()}"
+_LOCK = threading.Lock()
+_ACTIVE: Dict[str, Dict[str, Any]] = {}
+_POOL: Dict[str, Optional[ThreadPoolExecutor]] = {"executor": None}
+_current = threading.local()
+
+
+def _executor(app) -> ThreadPoolExecutor:
+    with _LOCK:
+        if _POOL["executor"] is None:
+            # Mặc định 1 luồng: SQLite chỉ có một writer, job chạy nối tiếp nhau
+            _POOL["executor"] = ThreadPoolExecutor(
+                max_workers=int(app.config.get("JOB_WORKERS", 1)), thread_name_prefix="job")
+        return _POOL["executor"]
+
+
+def actor() -> Optional[str]:
+    # Danh tính người gửi job (đã xác thực lúc gửi); ngoài job -> None
+    return getattr(_current, "actor", None)
+
+
+def progress(**counters):
+    # Gọi được ở bất cứ đâu; ngoài job thì không làm gì
+    job_id = getattr(_current, "job_id", None)
+    if job_id is None:
+        return
+    with _LOCK:
+        if job_id in _ACTIVE:
+            _ACTIVE[job_id].update(counters)
+
+
+def _payload(rv):
+    # Kết quả của view Flask -> (json, status)
+    code = None
+    if isinstance(rv, tuple):
+        rv, code = rv[0], rv[1]
+    if hasattr(rv, "get_json"):
+        code = code or rv.status_code
+        rv = rv.get_json(silent=True)
+    return {"status": code or 200, "body": rv}
+
+
+def _update(job_id: str, **values):
+    db.session.execute(sa.update(Job).where(Job.Id == job_id).values(**values))
+    db.session.commit()
+
+
+def _run(app, job_id: str, fn: Callable[[], Any], created_by: Optional[str]):
+    with app.app_context():
+        _update(job_id, Status="running", StartedAt=datetime.utcnow())
+        _current.job_id, _current.actor = job_id, created_by
+        result, error = None, None
+        try:
+            result = _payload(fn())
+            if result["status"] >= 400:
+                body = result["body"] if isinstance(result["body"], dict) else {}
+                error = (body.get("msg") or body.get("message")
+                         or next(iter(body.get("warnings") or []), None) or f"HTTP {result['status']}")
+        except Exception as e:
+            log.exception("[job] %s failed", job_id)
+            error = str(e)
+        finally:
+            _current.job_id = _current.actor = None
+            # Phần fn chưa commit (vd. nhập điểm chế độ xem trước) bị bỏ như khi kết thúc request
+            db.session.rollback()
+        with _LOCK:
+            counters = dict(_ACTIVE.get(job_id, {}))
+        _update(job_id,
+                Status="failed" if error else "done",
+                FinishedAt=datetime.utcnow(),
+                Progress=json.dumps(counters, ensure_ascii=False),
+                Result=json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                Error=error)
+        # Chỉ bỏ khỏi bộ nhớ sau khi trạng thái cuối đã commit (get_job dựa vào thứ tự này)
+        with _LOCK:
+            _ACTIVE.pop(job_id, None)
+
+
+def submit(kind: str, fn: Callable[[], Any], *, created_by: str | None = None) -> str:
+    # fn chạy với danh tính created_by (actor()), không cần token của request gửi job
+    app = current_app._get_current_object()
+    job_id = uuid.uuid4().hex
+    db.session.add(Job(Id=job_id, Kind=kind, Status="queued", CreatedBy=created_by, Worker=_WORKER))
+    db.session.commit()
+    with _LOCK:
+        _ACTIVE[job_id] = {}
+    _executor(app).submit(_run, app, job_id, fn, created_by)
+    return job_id
+
+
+def _worker_gone(worker: Optional[str]) -> bool:
+    # Process chạy job đã dừng? Chính process này (job không còn trong _ACTIVE) hoặc process cùng máy
+    # không còn tồn tại. Máy khác / Windows (os.kill không dùng để dò được) -> coi như còn chạy
+    if worker is None or worker == _WORKER:
+        return True
+    host, _, pid = worker.rpartition(":")
+    if host != socket.gethostname() or os.name == "nt" or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass
+    return False
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    # Đọc bộ nhớ trước rồi mới đọc DB: job không còn trong _ACTIVE thì trạng thái cuối đã commit
+    with _LOCK:
+        live = dict(_ACTIVE[job_id]) if job_id in _ACTIVE else None
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return None
+    if live is None and job.Status in ("queued", "running") and _worker_gone(job.Worker):
+        # Tiến trình chạy job đã dừng (khởi động lại) khi job còn dở
+        db.session.execute(sa.update(Job).where(Job.Id == job_id, Job.Status.in_(("queued", "running")))
+                           .values(Status="failed", Error="Job bị gián đoạn do tiến trình dừng",
+                                   FinishedAt=datetime.utcnow()))
+        db.session.commit()
+        db.session.refresh(job)
+    return {
+        "Id": job.Id, "Kind": job.Kind, "Status": job.Status,
+        "Progress": live if live is not None else json.loads(job.Progress or "{}"),
+        "Result": json.loads(job.Result) if job.Result else None,
+        "Error": job.Error, "CreatedBy": job.CreatedBy,
+        "CreatedAt": job.CreatedAt.isoformat() if job.CreatedAt else None,
+        "StartedAt": job.StartedAt.isoformat() if job.StartedAt else None,
+        "FinishedAt": job.FinishedAt.isoformat() if job.FinishedAt else None,
+    }
@@ -0,0 +1,59 @@
+# backend/services/student_search.py
+from __future__ import annotations
+import re
+import unicodedata
+from typing import Optional
+
+import sqlalchemy as sa
+
+from ..models import db, SinhVien
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_FTS = {}  # url DB -> có bảng SinhVien_fts hay không
+
+# Trên ngưỡng này chế độ count=approx chỉ báo "hơn N"
+APPROX_COUNT_CAP = 1000
+
+
+def fold(text: str) -> str:
+    # Giống chỉ mục (migration 4/7): bỏ dấu + đ -> d, chữ thường
+    text = (text or "").replace("đ", "d").replace("Đ", "D")
+    text = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in text if unicodedata.category(ch) != "Mn").lower()
+
+
+def fts_query(text: str) -> Optional[str]:
+    # "nguyen van" -> "nguyen"* AND "van"*: mỗi từ khớp tiền tố, mọi từ đều phải có
+    tokens = _TOKEN.findall(fold(text))
+    return " AND ".join(f'"{t}"*' for t in tokens) if tokens else None
+
+
+def has_fts() -> bool:
+    key = str(db.engine.url)
+    if key not in _FTS:
+        _FTS[key] = db.session.execute(sa.text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'SinhVien_fts'")).first() is not None
+    return _FTS[key]
+
+
+def search_filter(text: str):
+    # -> điều kiện WHERE trên SinhVien; không có FTS5 thì về LIKE '%q%' như trước.
+    # FTS chỉ khớp tiền tố từng từ ("V1" không thấy "SV1") -> MaSV vẫn khớp chuỗi con bằng LIKE
+    match = fts_query(text) if has_fts() else None
+    if match:
+        hits = sa.select(sa.column("MaSV")).select_from(sa.table("SinhVien_fts")).where(
+            sa.text("SinhVien_fts MATCH :fts").bindparams(fts=match))
+        return sa.or_(SinhVien.MaSV.ilike(f"%{text}%"), SinhVien.MaSV.in_(hits))
+    return sa.or_(SinhVien.MaSV.ilike(f"%{text}%"), SinhVien.HoTen.ilike(f"%{text}%"))
+
+
+def approx_count(q, filtered: bool):
+    # -> (số lượng, là ước lượng?). Không lọc: max(rowid) của SinhVien - O(1) nhưng chỉ là ước lượng và có
+    # thể trôi: lệch theo số dòng đã xoá, rowid (không phải khóa, SinhVien khóa MaSV) còn đổi sau VACUUM.
+    # Có lọc: chỉ đếm tối đa APPROX_COUNT_CAP + 1 dòng thay vì quét hết kết quả
+    if not filtered:
+        n = db.session.execute(sa.text("SELECT max(rowid) FROM SinhVien")).scalar()
+        return int(n or 0), True
+    capped = q.with_entities(SinhVien.MaSV).order_by(None).limit(APPROX_COUNT_CAP + 1).subquery()
+    n = db.session.execute(sa.select(sa.func.count()).select_from(capped)).scalar() or 0
+    return min(n, APPROX_COUNT_CAP), n > APPROX_COUNT_CAP
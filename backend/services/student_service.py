@@ -0,0 +1,172 @@
+# backend/services/student_service.py
+from __future__ import annotations
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import func, or_
+
+from ..models import (
+    db, NguoiDung, SinhVien, LopHoc, NganhHoc, Khoa, HocPhan, KetQuaHocTap, ChuongTrinhDaoTao,
+)
+from .data_version import ANALYTICS, GLOBAL, student_scope, versions
+
+# (MaSV, etag) -> JSON đã serialize; phiên bản đổi thì khóa đổi, bản cũ tự rơi khỏi LRU
+_PAYLOADS: "OrderedDict[tuple, bytes]" = OrderedDict()
+_PAYLOADS_LOCK = threading.Lock()
+# Phiên bản GLOBAL -> CTĐT rỗng? (CTĐT chỉ đổi kèm bump_global)
+_PLAN_EMPTY: dict = {}
+
+
+def find_student(uid):
+    # -> (NguoiDung, SinhVien) theo MaNguoiDung; SinhVien None nếu tài khoản không gắn SV
+    row = (db.session.query(NguoiDung, SinhVien)
+           .outerjoin(SinhVien, SinhVien.MaNguoiDung == NguoiDung.MaNguoiDung)
+           .filter(NguoiDung.MaNguoiDung == uid)
+           .first()) if uid else None
+    if not row:
+        return None, None
+    u, sv = row
+    if sv is None and u.TenDangNhap:
+        sv = db.session.get(SinhVien, u.TenDangNhap)
+    return u, sv
+
+
+def _digits_to_int(v):
+    if v is None: return None
+    s = str(v).strip()
+    dg = "".join(ch for ch in s if ch.isdigit())
+    return int(dg) if dg else None
+
+
+def _grades(masv):
+    rows = (db.session.query(
+                KetQuaHocTap.HocKy, KetQuaHocTap.MaHP, KetQuaHocTap.DiemHe10, KetQuaHocTap.DiemHe4,
+                KetQuaHocTap.DiemChu, KetQuaHocTap.TinhDiemTichLuy, KetQuaHocTap.LaDiemCuoiCung,
+                HocPhan.MaHP.label("hp"), HocPhan.TenHP, HocPhan.SoTinChi,
+                HocPhan.TinhDiemTichLuy.label("hp_tichluy"))
+            .outerjoin(HocPhan, HocPhan.MaHP == KetQuaHocTap.MaHP)
+            .filter(KetQuaHocTap.MaSV == masv)
+            .order_by(KetQuaHocTap.MaKQ)
+            .all())
+    return [{
+        "HocKy": r.HocKy,
+        "MaHP": r.MaHP,
+        "TenHP": r.TenHP,
+        "SoTinChi": r.SoTinChi or 0,
+        "DiemHe10": r.DiemHe10,
+        "DiemHe4": r.DiemHe4,
+        "DiemChu": r.DiemChu,
+        "TinhDiemTichLuy": bool(r.hp_tichluy) if r.hp is not None else bool(r.TinhDiemTichLuy),
+        "LaDiemCuoiCung": r.LaDiemCuoiCung,
+    } for r in rows]
+
+
+def _plan(ma_nganh):
+    CTDT = ChuongTrinhDaoTao
+    q = (db.session.query(CTDT.HocKy, CTDT.MaHP, HocPhan.TenHP, HocPhan.SoTinChi)
+         .outerjoin(HocPhan, HocPhan.MaHP == CTDT.MaHP)
+         .order_by(CTDT.HocKy, CTDT.MaHP))
+    rows = []
+    if ma_nganh:
+        rows = q.filter(CTDT.MaNganh == ma_nganh).all()
+    if not rows and ma_nganh:
+        rows = q.filter(CTDT.MaNganh.like(f"{str(ma_nganh)[:5]}%")).all()
+    if not rows:
+        rows = q.all()
+    plan = [{
+        "HocKy": _digits_to_int(r.HocKy),
+        "MaHP": r.MaHP,
+        "TenHP": r.TenHP,
+        "SoTinChi": r.SoTinChi or 0,
+    } for r in rows]
+
+    if not plan:
+        hk_map_kq = dict(db.session.query(
+            KetQuaHocTap.MaHP, func.min(KetQuaHocTap.HocKy)
+        ).group_by(KetQuaHocTap.MaHP).all())
+        hps = (db.session.query(HocPhan)
+               .filter(or_(HocPhan.TinhDiemTichLuy == True, HocPhan.TinhDiemTichLuy.is_(None)))
+               .order_by(HocPhan.MaHP).all())
+        plan = [{
+            "HocKy": _digits_to_int(hk_map_kq.get(hp.MaHP)),
+            "MaHP": hp.MaHP,
+            "TenHP": hp.TenHP,
+            "SoTinChi": hp.SoTinChi or 0,
+        } for hp in hps]
+
+    def _hk_key(x):
+        try:
+            return int(x.get("HocKy") or 0)
+        except Exception:
+            return 0
+
+    plan.sort(key=lambda x: (_hk_key(x), str(x.get("MaHP") or "")))
+    return plan
+
+
+def _email(u, sv):
+    email = getattr(u, "Email", None)
+    if not email and sv.MaNguoiDung:
+        email = db.session.query(NguoiDung.Email).filter_by(MaNguoiDung=sv.MaNguoiDung).scalar()
+    return email
+
+
+def student_payload(u, sv) -> dict:
+    # Lớp/ngành/khoa một truy vấn, điểm kèm học phần một truy vấn, CTĐT kèm học phần một truy vấn
+    ma_lop = sv.MaLop
+    org = (db.session.query(LopHoc.TenLop, LopHoc.MaNganh, NganhHoc.TenNganh, Khoa.TenKhoa)
+           .outerjoin(NganhHoc, NganhHoc.MaNganh == LopHoc.MaNganh)
+           .outerjoin(Khoa, Khoa.MaKhoa == NganhHoc.MaKhoa)
+           .filter(LopHoc.MaLop == ma_lop)
+           .first()) if ma_lop else None
+
+    return {
+        "MaSV": sv.MaSV,
+        "HoTen": sv.HoTen,
+        "NgaySinh": sv.NgaySinh.strftime("%d/%m/%Y") if sv.NgaySinh else None,
+        "Lop": (org.TenLop if org else None) or ma_lop,
+        "Nganh": org.TenNganh if org else None,
+        "Khoa": org.TenKhoa if org else None,
+        "Email": _email(u, sv),
+        "KetQuaHocTap": _grades(sv.MaSV),
+        "ChuongTrinhDaoTao": _plan(org.MaNganh if org else None),
+    }
+
+
+def _plan_empty(global_version: int) -> bool:
+    hit = _PLAN_EMPTY.get(global_version)
+    if hit is None:
+        hit = db.session.query(ChuongTrinhDaoTao.MaHP).first() is None
+        _PLAN_EMPTY.clear()
+        _PLAN_EMPTY[global_version] = hit
+    return hit
+
+
+def student_etag(u, sv) -> str:
+    # Khóa phủ mọi đầu vào của payload: phiên bản SV + GLOBAL; Email tài khoản (không luồng sửa nào
+    # bump phiên bản SV); CTĐT rỗng thì kế hoạch lấy học kỳ nhỏ nhất từ điểm mọi SV -> thêm ANALYTICS
+    s_scope = student_scope(sv.MaSV)
+    v = versions([s_scope, GLOBAL, ANALYTICS])
+    etag = f"{sv.MaSV}-{v[s_scope]}-{v[GLOBAL]}"
+    if _plan_empty(v[GLOBAL]):
+        etag += f"-a{v[ANALYTICS]}"
+    return f"{etag}-{zlib.crc32(str(_email(u, sv) or '').encode('utf-8')):08x}"
+
+
+def cached_payload(u, sv, etag: str) -> bytes:
+    key = (sv.MaSV, etag)
+    with _PAYLOADS_LOCK:
+        body = _PAYLOADS.get(key)
+        if body is not None:
+            _PAYLOADS.move_to_end(key)
+            return body
+    body = current_app.json.dumps(student_payload(u, sv)).encode("utf-8")
+    limit = int(current_app.config.get("STUDENT_PAYLOAD_CACHE_SIZE", 512))
+    with _PAYLOADS_LOCK:
+        _PAYLOADS[key] = body
+        _PAYLOADS.move_to_end(key)
+        while len(_PAYLOADS) > limit:
+            _PAYLOADS.popitem(last=False)
+    return body
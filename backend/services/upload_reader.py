@@ -0,0 +1,252 @@
+# backend/services/upload_reader.py
+from __future__ import annotations
+import csv
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import date, datetime, time as dt_time
+from itertools import chain, islice
+from typing import Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from flask import current_app, has_app_context
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # tuỳ chọn: pip install python-calamine
+    CalamineWorkbook = None
+
+# Tệp tải lên được chép ra file tạm theo khối rồi đọc từng lô IMPORT_CHUNK_ROWS dòng:
+# CSV qua read_csv(chunksize), XLSX qua calamine hoặc openpyxl read_only (xlsx_engine). Mỗi lô
+# giữ chỉ số dòng toàn cục (0, 1, ... như khi đọc cả tệp) nên thông báo "Dòng i+2" không đổi.
+CHUNK_ROWS = 5000
+HEADER_SCAN_ROWS = 10
+_COPY_BLOCK = 64 * 1024
+
+
+def chunk_rows() -> int:
+    if has_app_context():
+        return int(current_app.config.get("IMPORT_CHUNK_ROWS", CHUNK_ROWS))
+    return CHUNK_ROWS
+
+
+def spool(storage, digest=None) -> str:
+    # FileStorage -> đường dẫn file tạm (giữ đuôi tệp); người gọi tự xoá.
+    # digest (hashlib): băm nội dung ngay trong lượt chép, không đọc tệp thêm lần nữa
+    suffix = os.path.splitext(storage.filename or "")[1].lower()
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=suffix)
+    with os.fdopen(fd, "wb") as out:
+        if digest is None:
+            shutil.copyfileobj(storage.stream, out, _COPY_BLOCK)
+        else:
+            for block in iter(lambda: storage.stream.read(_COPY_BLOCK), b""):
+                digest.update(block)
+                out.write(block)
+    return path
+
+
+def _cell(v):
+    # Như pandas.read_excel: ô trống -> NaN, số thực nguyên -> int, ngày -> datetime
+    if v is None or v == "":
+        return np.nan
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    if isinstance(v, date) and not isinstance(v, datetime):
+        return datetime.combine(v, dt_time())
+    return v
+
+
+def _columns(header, width: int):
+    names, seen = [], {}
+    for i in range(width):
+        v = _cell(header[i]) if i < len(header) else np.nan
+        name = f"Unnamed: {i}" if pd.isna(v) or (isinstance(v, str) and not v.strip()) else v
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _frame(rows, columns, start: int, dtype):
+    df = pd.DataFrame(rows, columns=columns, index=pd.RangeIndex(start, start + len(rows)), dtype=object)
+    if dtype is str:
+        df = df.astype(str).where(df.notna())
+    return df
+
+
+@contextmanager
+def _openpyxl_rows(path: str, sheet=0):
+    from openpyxl import load_workbook
+
+    # Mở qua file object: openpyxl không kiểm tra đuôi tệp (file tạm có thể không có đuôi)
+    with open(path, "rb") as fh:
+        wb = load_workbook(fh, read_only=True, data_only=True)
+        try:
+            ws = wb[sheet] if isinstance(sheet, str) else wb.worksheets[sheet]
+            yield ws.iter_rows(values_only=True), (ws.max_column or 0)
+        finally:
+            wb.close()
+
+
+@contextmanager
+def _calamine_rows(path: str, sheet=0):
+    # calamine (Rust) giữ vùng ô của sheet ở dạng gọn; đối tượng Python chỉ tạo khi duyệt từng dòng
+    wb = CalamineWorkbook.from_path(path)
+    try:
+        ws = wb.get_sheet_by_name(sheet) if isinstance(sheet, str) else wb.get_sheet_by_index(sheet)
+        yield ws.iter_rows(), ws.width
+    finally:
+        wb.close()
+
+
+def _openpyxl_names(path: str) -> List[str]:
+    from openpyxl import load_workbook
+
+    with open(path, "rb") as fh:
+        wb = load_workbook(fh, read_only=True)
+        try:
+            return [ws.title for ws in wb.worksheets if ws.sheet_state == "visible"]
+        finally:
+            wb.close()
+
+
+def _calamine_names(path: str) -> List[str]:
+    wb = CalamineWorkbook.from_path(path)
+    try:
+        return [s.name for s in wb.sheets_metadata
+                if s.typ == type(s.typ).WorkSheet and s.visible == type(s.visible).Visible]
+    finally:
+        wb.close()
+
+
+ENGINES = {"openpyxl": _openpyxl_rows, "calamine": _calamine_rows}
+_SHEET_NAMES = {"openpyxl": _openpyxl_names, "calamine": _calamine_names}
+
+
+def xlsx_engine(name: Optional[str] = None) -> str:
+    # IMPORT_XLSX_ENGINE: auto (calamine nếu đã cài, không thì openpyxl) | calamine | openpyxl
+    if name is None and has_app_context():
+        name = current_app.config.get("IMPORT_XLSX_ENGINE")
+    name = (name or "auto").lower()
+    if name not in ENGINES or (name == "calamine" and CalamineWorkbook is None):
+        name = "auto"
+    if name == "auto":
+        return "calamine" if CalamineWorkbook is not None else "openpyxl"
+    return name
+
+
+def _header_at(peek, header) -> Optional[int]:
+    # header: số thứ tự dòng, None (không có tiêu đề) hoặc hàm chọn dòng tiêu đề từ HEADER_SCAN_ROWS dòng đầu
+    return header(peek) if callable(header) else header
+
+
+def _iter_sheet(path: str, engine: str, size: int, header, dtype, sheet=0) -> Iterator[pd.DataFrame]:
+    with ENGINES[engine](path, sheet) as (rows, width):
+        peek = list(islice(rows, HEADER_SCAN_ROWS))
+        if not peek:
+            yield pd.DataFrame()
+            return
+        k = _header_at(peek, header)
+        rows = chain(peek, rows)
+        if k is None:
+            width = max(width, len(peek[0]))
+            columns, start = list(range(width)), 0
+        else:
+            for _ in range(k):
+                next(rows, None)
+            first = next(rows, ())
+            width = max(width, len(first))
+            # Chỉ số dòng = số dòng trên sheet - 2 như khi tiêu đề ở dòng 1 ("Dòng i+2" vẫn đúng)
+            columns, start = _columns(first, width), k
+        batch = []
+        emitted = False
+        for r in rows:
+            batch.append([_cell(v) for v in r[:width]] + [np.nan] * (width - len(r)))
+            if len(batch) >= size:
+                yield _frame(batch, columns, start, dtype)
+                start += len(batch); batch = []; emitted = True
+        if batch or not emitted:
+            yield _frame(batch, columns, start, dtype)
+
+
+def _iter_csv(path: str, size: int, header, dtype) -> Iterator[pd.DataFrame]:
+    k = header
+    if callable(header):
+        # Như pandas (skip_blank_lines): dòng trống không được tính
+        with open(path, newline="", encoding="utf-8") as fh:
+            k = header(list(islice((r for r in csv.reader(fh) if r), HEADER_SCAN_ROWS)))
+    for df in pd.read_csv(path, dtype=dtype, encoding="utf-8", header=k, chunksize=size):
+        if k:
+            df.index = df.index + k
+        yield df
+
+
+def _streamable(name: str, engine: str) -> bool:
+    return name.endswith((".xlsx", ".xlsm")) or (engine == "calamine" and name.endswith((".xls", ".xlsb", ".ods")))
+
+
+def sheet_names(path: str, filename: str, engine: Optional[str] = None) -> List[Optional[str]]:
+    # -> tên các sheet dữ liệu đang hiện, theo thứ tự trong workbook (bỏ sheet ẩn, sheet biểu đồ);
+    # CSV -> [None]. Lỗi đọc -> ValueError như iter_frames
+    name = (filename or "").lower()
+    engine = xlsx_engine(engine)
+    if name.endswith(".csv"):
+        return [None]
+    try:
+        if _streamable(name, engine):
+            return _SHEET_NAMES[engine](path)
+        with pd.ExcelFile(path) as book:
+            return list(book.sheet_names)
+    except Exception as e:
+        raise ValueError(f"Lỗi đọc file: {e}") from e
+
+
+def iter_frames(path: str, filename: str, *, header=0, dtype=object, size: Optional[int] = None,
+                engine: Optional[str] = None, sheet: Union[int, str, None] = 0) -> Iterator[pd.DataFrame]:
+    # -> các DataFrame liên tiếp, cùng cột; luôn có ít nhất một lô (có thể rỗng) để lấy tiêu đề.
+    # sheet: tên hoặc thứ tự sheet trong workbook (bỏ qua với CSV).
+    # Lỗi đọc (ở lô nào cũng vậy) -> ValueError("Lỗi đọc file: ...")
+    size = size or chunk_rows()
+    name = (filename or "").lower()
+    engine = xlsx_engine(engine)
+    sheet = 0 if sheet is None else sheet
+    try:
+        if name.endswith(".csv"):
+            yield from _iter_csv(path, size, header, dtype)
+        elif _streamable(name, engine):
+            yield from _iter_sheet(path, engine, size, header, dtype, sheet)
+        else:
+            # .xls không có calamine (xlrd) không đọc từng dòng được: đọc cả sheet một lần (không stream).
+            # Chỉ số dòng cộng thêm vị trí tiêu đề như _iter_sheet/_iter_csv ("Dòng i+2" đúng dòng trên sheet)
+            peek = pd.read_excel(path, sheet_name=sheet, header=None, nrows=HEADER_SCAN_ROWS)
+            k = _header_at(peek.values.tolist(), header)
+            df = pd.read_excel(path, sheet_name=sheet, dtype=dtype, header=k)
+            if k:
+                df.index = df.index + k
+            yield df
+    except Exception as e:
+        raise ValueError(f"Lỗi đọc file: {e}") from e
+
+
+def read_frame(path: str, filename: str, **kw) -> pd.DataFrame:
+    # Cho các tệp nhỏ cần cả bảng (chương trình đào tạo): vẫn không giữ bytes của tệp trong bộ nhớ
+    frames = list(iter_frames(path, filename, **kw))
+    return frames[0] if len(frames) == 1 else pd.concat(frames)
+
+
+def iter_upload(storage, filename: Optional[str] = None, *, digest=None, **kw) -> Iterator[pd.DataFrame]:
+    # spool + iter_frames; file tạm bị xoá khi đọc hết hoặc khi generator bị đóng/thu hồi.
+    # digest đã đủ nội dung tệp ngay sau lô đầu tiên
+    path = spool(storage, digest)
+    try:
+        yield from iter_frames(path, filename or storage.filename, **kw)
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
@@ -1,8 +1,10 @@
-from io import BytesIO
 import math
+import os
 import re
+import numpy as np
 import pandas as pd
 from unicodedata import normalize as ucnorm
+from .services.upload_reader import spool, read_frame
 
 def _norm(s: str) -> str:
     if s is None:
@@ -44,37 +46,66 @@ def he4_to_chu(d4):
     if d4 >= 1.0: return "D"
     return "F"
 
+# Thang điểm 10 -> chữ/hệ 4: ngưỡng dưới của D, D+, C, C+, B, B+, A
+GRADE_BOUNDS_10 = np.array([4.0, 4.8, 5.5, 6.3, 7.0, 7.8, 8.5])
+GRADE_LETTERS = np.array(["F", "D", "D+", "C", "C+", "B", "B+", "A"], dtype=object)
+GRADE_HE4 = np.array([0.0, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5, 4.0])
+
+def parse_scores(raw: pd.Series, lo: float = 0.0, hi: float = 10.0):
+    # Bản vector hoá của _num_2: "7,25" -> 7.25, bỏ ký tự lạ, làm tròn 0.01 kiểu ROUND_HALF_UP.
+    # Trả về (mảng điểm, mask hợp lệ trong [lo, hi]); NaN ở vị trí không đọc được.
+    s = (raw.astype("string").str.strip()
+         .str.replace(",", ".", regex=False)
+         .str.replace(r"[^0-9.\-]", "", regex=True))
+    v = pd.to_numeric(s, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    v = np.sign(v) * np.floor(np.abs(v) * 100.0 + 0.5 + 1e-9) / 100.0
+    with np.errstate(invalid="ignore"):
+        ok = ~np.isnan(v) & (v >= lo) & (v <= hi)
+    return v, ok
+
+def grade_points(he10: np.ndarray):
+    # -> (DiemChu, DiemHe4) cho cả mảng điểm hệ 10
+    idx = np.searchsorted(GRADE_BOUNDS_10, np.nan_to_num(he10, nan=-1.0), side="right")
+    return GRADE_LETTERS[idx], GRADE_HE4[idx]
+
 def read_excel_from_request(flask_request, field_name="file"):
     if field_name not in flask_request.files:
         raise ValueError("Thiếu file (multipart field 'file').")
     f = flask_request.files[field_name]
-    raw = f.read()
-    if not raw:
-        raise ValueError("File rỗng.")
-    name = (f.filename or "").lower()
-    bio = BytesIO(raw)
-    if name.endswith(".csv"):
-        return pd.read_csv(bio)
-    return pd.read_excel(bio, sheet_name=0, header=None)
+    path = spool(f)
+    try:
+        if not os.path.getsize(path):
+            raise ValueError("File rỗng.")
+        name = (f.filename or "").lower()
+        if name.endswith(".csv"):
+            return read_frame(path, name, dtype=None)
+        return read_frame(path, name, header=None, dtype=None)
+    finally:
+        os.unlink(path)
+
+HEADER_HINTS = {_norm(h) for h in ("masv", "mssv", "ma sv", "mã sv", "mã sinh viên", "hoc ky", "học kỳ",
+                                   "ten hp", "tên học phần", "mahp", "mã hp", "diem", "điểm")}
+
+def _blank(v) -> bool:
+    return v is None or (isinstance(v, float) and math.isnan(v)) or not str(v).strip()
+
+def detect_header_row(rows) -> int:
+    # rows: vài dòng đầu (list giá trị thô); dòng có tên cột quen thuộc, không thì dòng nhiều ô nhất
+    rows = [list(r) for r in rows]
+    for i, r in enumerate(rows):
+        if {_norm(v) for v in r if not _blank(v)} & HEADER_HINTS:
+            return i
+    best, best_i = -1, 0
+    for i, r in enumerate(rows):
+        score = sum(1 for v in r if not _blank(v))
+        if score > best:
+            best, best_i = score, i
+    return best_i
 
 def clean_header_rows(df: pd.DataFrame, header_row_idx: int | None = None) -> pd.DataFrame:
-    hints = {"masv", "mssv", "ma sv", "mã sv", "mã sinh viên", "hoc ky", "học kỳ",
-             "ten hp", "tên học phần", "mahp", "mã hp", "diem", "điểm"}
-    choose = None
-    limit = min(10, len(df))
-    for i in range(limit):
-        vals = [str(x).strip() for x in df.iloc[i].tolist()]
-        normed = { _norm(v) for v in vals if v }
-        if normed & hints:
-            choose = i
-            break
+    choose = header_row_idx
     if choose is None:
-        best, best_i = -1, 0
-        for i in range(limit):
-            score = sum(1 for v in df.iloc[i].tolist() if str(v).strip())
-            if score > best:
-                best, best_i = score, i
-        choose = best_i
+        choose = detect_header_row(df.head(10).itertuples(index=False))
 
     df.columns = [str(x).strip() for x in df.iloc[choose]]
     df = df.iloc[choose+1:].reset_index(drop=True)
@@ -1,102 +1,226 @@
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
 import sqlalchemy as sa
-from .models import db, SinhVien, KetQuaHocTap, WarningRule, WarningCase, HocPhan
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .models import db, SinhVien, WarningRule, WarningCase, WarningScanDirty, StudentAggregate
+from .services.jobs import progress as job_progress
+from .services.data_version import bump_analytics
 from datetime import datetime
 
-def scan_all_warnings():
-    
-    
+_IN_CHUNK = 900
+
+
+def _chunks(seq, size):
+    seq = list(seq)
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def mark_students_dirty(masvs):
+    # Gọi trong cùng transaction với thao tác ghi điểm; lần quét incremental kế tiếp chỉ xét các SV này
+    now = datetime.utcnow()
+    rows = [{"MaSV": m, "MarkedAt": now} for m in {m for m in masvs if m}]
+    if not rows:
+        return
+    stmt = sqlite_insert(WarningScanDirty.__table__)
+    stmt = stmt.on_conflict_do_update(index_elements=["MaSV"], set_={"MarkedAt": stmt.excluded.MarkedAt})
+    db.session.execute(stmt, rows)
+
+
+def mark_all_students_dirty():
+    # Dùng khi đổi chính sách thi lại: mọi SV có thể đổi điểm cuối cùng
+    # WHERE bắt buộc để SQLite không hiểu nhầm ON CONFLICT là một phần của SELECT
+    sel = sa.select(SinhVien.MaSV, sa.literal(datetime.utcnow(), sa.DateTime)).where(sa.true())
+    db.session.execute(
+        sqlite_insert(WarningScanDirty.__table__)
+        .from_select(["MaSV", "MarkedAt"], sel)
+        .on_conflict_do_nothing(index_elements=["MaSV"])
+    )
+
+
+# Code -> (giá trị, phép so sánh với ngưỡng) trên StudentAggregate.
+# GPA NULL (SV chỉ có học phần 0 tín chỉ) tính là 0 như trước.
+_RULE_SQL = {
+    "GPA_BELOW": (lambda: sa.func.coalesce(StudentAggregate.GPA4, 0.0), lambda v, th: v < th),
+    "AVG_BELOW": (lambda: sa.func.coalesce(StudentAggregate.GPA10, 0.0), lambda v, th: v < th),
+    "FAIL_COUNT": (lambda: sa.func.coalesce(StudentAggregate.FailCount, 0), lambda v, th: v >= th),
+    "DEBT_OVER": (lambda: sa.func.coalesce(StudentAggregate.DebtCredits, 0), lambda v, th: v >= th),
+}
+
+
+# Bản rút gọn của WarningRule để gửi sang process con
+_RuleSpec = namedtuple("_RuleSpec", "Id Code Threshold")
+
+
+def compile_rule(rule):
+    # -> SELECT (RuleId, MaSV, Value) các SV vi phạm rule; None nếu Code chưa hỗ trợ
+    spec = _RULE_SQL.get((rule.Code or "").upper().strip())
+    if spec is None or rule.Threshold is None:
+        return None
+    value, cmp = spec
+    v = value()
+    return sa.select(
+        sa.literal(rule.Id, sa.Integer).label("RuleId"),
+        StudentAggregate.MaSV,
+        sa.func.round(v, 2).label("Value"),
+    ).where(cmp(v, float(rule.Threshold)))
+
+
+def _compiled(rules):
+    return [q for q in (compile_rule(r) for r in rules) if q is not None]
+
+
+def _hits(queries, masvs=None):
+    # -> {(RuleId, MaSV): Value}; chỉ các cặp vi phạm đi ra khỏi DB
+    hits = {}
+    for q in queries:
+        if masvs is not None:
+            q = q.where(StudentAggregate.MaSV.in_(masvs))
+        for rule_id, masv, val in db.session.execute(q):
+            hits[(rule_id, masv)] = val
+    return hits
+
+
+def sync_cases(hits, rule_ids, masvs=None, *, now=None, levels=None, insert_only=False):
+    # Đối chiếu tập case mong muốn (hits: {(RuleId, MaSV): Value}) với case đang mở của rule_ids
+    # (giới hạn trong masvs nếu có) rồi ghi bằng vài lệnh executemany.
+    # insert_only: chỉ mở case còn thiếu, không sửa/gỡ case đã có.
+    now = now or datetime.utcnow()
+    levels = levels or {}
+    t = WarningCase.__table__
+    q = sa.select(t.c.Id, t.c.RuleId, t.c.MaSV, t.c.Value).where(
+        t.c.RuleId.in_(rule_ids), t.c.Status == "open")
+    if masvs is not None:
+        q = q.where(t.c.MaSV.in_(masvs))
+    existing = {(rid, m): (cid, val) for cid, rid, m, val in db.session.execute(q)}
+
+    new_keys = hits.keys() - existing.keys()
+    inserts = [{"RuleId": rid, "MaSV": m, "Value": hits[(rid, m)], "Level": levels.get(rid, "warning"),
+                "Status": "open", "CreatedAt": now} for rid, m in new_keys]
+    if inserts:
+        db.session.execute(t.insert(), inserts)
+    if insert_only:
+        return len(inserts), 0, 0
+
+    stale = [cid for key, (cid, _) in existing.items() if key not in hits]
+    changed = [{"_id": cid, "_val": hits[key]} for key, (cid, val) in existing.items()
+               if key in hits and val != hits[key]]
+    for part in _chunks(stale, _IN_CHUNK):
+        db.session.execute(t.delete().where(t.c.Id.in_(part)))
+    if changed:
+        db.session.execute(
+            t.update().where(t.c.Id == sa.bindparam("_id")).values(Value=sa.bindparam("_val")), changed)
+    return len(inserts), len(changed), len(stale)
+
+
+def scan_all_warnings(incremental: bool = False, workers: int = 1):
     rules = WarningRule.query.filter_by(Active=True).all()
     if not rules:
         return {"msg": "Không có rule nào được kích hoạt"}
+    if incremental:
+        return _scan_incremental(rules)
+
+    # Case còn vi phạm giữ nguyên Id/CreatedAt; created chỉ đếm case mới
+    started = datetime.utcnow()
     rule_ids = [r.Id for r in rules]
-    db.session.query(WarningCase).filter(
-        WarningCase.RuleId.in_(rule_ids),
-        WarningCase.Status == "open"
-    ).delete(synchronize_session=False)
+    db_path = db.engine.url.database
+    if workers > 1 and db_path and db_path != ":memory:":
+        hits, shards = _hits_sharded(db_path, rules, workers)
+    else:
+        hits, shards = _hits(_compiled(rules)), 1
+    job_progress(stage="write", students_with_cases=len({m for _, m in hits}))
+    created, updated, removed = sync_cases(hits, rule_ids, now=started)
+    job_progress(cases_created=created, cases_updated=updated, cases_removed=removed)
+    db.session.query(WarningScanDirty).filter(
+        WarningScanDirty.MarkedAt <= started).delete(synchronize_session=False)
+    bump_analytics()
+    db.session.commit()
+    res = {"ok": True, "created": created, "updated": updated, "removed": removed}
+    if shards > 1:
+        res["shards"] = shards
+    return res
 
-    new_cases_count = 0
-    now = datetime.utcnow()
-    stmt = sa.select(
-        KetQuaHocTap.MaSV, 
-        KetQuaHocTap.DiemHe10, 
-        KetQuaHocTap.DiemHe4, 
-        sa.func.coalesce(KetQuaHocTap.DiemChu, ""),
-        HocPhan.SoTinChi
-    ).select_from(KetQuaHocTap).join(HocPhan, KetQuaHocTap.MaHP == HocPhan.MaHP)
-    
-    rows = db.session.execute(stmt).all()
-    sv_stats = {}
-
-    for masv, d10, d4, dchu, stc in rows:
-        if masv not in sv_stats:
-            sv_stats[masv] = {'p4':0.0, 'p10':0.0, 'tc':0, 'fails':0, 'fails_credit':0}
-        
-        stat = sv_stats[masv]
-        d10 = d10 or 0.0
-        d4 = d4 or 0.0
-        stc = int(stc or 0)
-        
-        stat['tc'] += stc
-        stat['p10'] += d10 * stc
-        stat['p4'] += d4 * stc
-        
-        # Fail logic: DiemHe10 < 4.0 or DiemChu = F
-        if d10 < 4.0 or dchu == 'F':
-            stat['fails'] += 1
-            stat['fails_credit'] += stc
-
-    cases_to_add = []
-    
-    for r in rules:
-        code = (r.Code or "").upper().strip()
-        th = r.Threshold
-        
-        for masv, stat in sv_stats.items():
-            val = 0.0
-            is_warn = False
-            msg = ""
-            
-            total_tc = stat['tc']
-            if code == "GPA_BELOW":
-                # GPA he 4
-                val = (stat['p4'] / total_tc) if total_tc > 0 else 0.0
-                if val < th:
-                    is_warn = True
-                    msg = f"GPA tích lũy: {val:.2f} < {th}"
-            
-            elif code == "AVG_BELOW":
-                # AVG he 10
-                val = (stat['p10'] / total_tc) if total_tc > 0 else 0.0
-                if val < th:
-                    is_warn = True
-                    msg = f"TBCHT (hệ 10): {val:.2f} < {th}"
-            
-            elif code == "FAIL_COUNT":
-                val = float(stat['fails'])
-                if val >= th: # Warning if fails >= threshold
-                    is_warn = True
-                    msg = f"Số môn nợ: {int(val)} >= {int(th)}"
-            
-            elif code == "DEBT_OVER":
-                val = float(stat.get('fails_credit', 0))
-                if val >= th:
-                    is_warn = True
-                    # msg = f"Nợ tín chỉ: {int(val)} >= {int(th)}" # Model không có Message
-
-            if is_warn:
-                cases_to_add.append(WarningCase(
-                    RuleId=r.Id,
-                    MaSV=masv,
-                    Value=round(val, 2),
-                    Level="warning",
-                    # Message=msg, # Bỏ vì model chưa có field này
-                    Status="open",
-                    CreatedAt=now
-                ))
-                new_cases_count += 1
-
-    if cases_to_add:
-        db.session.add_all(cases_to_add)
-        db.session.commit()
-
-    return {"ok": True, "created": new_cases_count}
+
+def _shard_classes(n_shards):
+    # Chia lớp (MaLop, kể cả NULL) thành n_shards nhóm có số SV xấp xỉ nhau
+    sizes = db.session.query(SinhVien.MaLop, sa.func.count()).group_by(SinhVien.MaLop).all()
+    shards, load = [[] for _ in range(n_shards)], [0] * n_shards
+    for lop, n in sorted(sizes, key=lambda x: -x[1]):
+        i = load.index(min(load))
+        shards[i].append(lop); load[i] += n
+    return [sh for sh in shards if sh]
+
+
+def _class_filter(lops):
+    named = [l for l in lops if l is not None]
+    cond = SinhVien.MaLop.in_(named)
+    return sa.or_(cond, SinhVien.MaLop.is_(None)) if None in lops else cond
+
+
+def _scan_shard(db_path, rules, lops):
+    # Chạy trong process con: kết nối chỉ đọc riêng trên file WAL, trả về hits của nhóm lớp
+    engine = sa.create_engine(f"sqlite:///file:{db_path}?mode=ro&uri=true")
+    in_shard = StudentAggregate.MaSV.in_(sa.select(SinhVien.MaSV).where(_class_filter(lops)))
+    hits = {}
+    try:
+        with engine.connect() as conn:
+            for q in _compiled(rules):
+                for rule_id, masv, val in conn.execute(q.where(in_shard)):
+                    hits[(rule_id, masv)] = val
+    finally:
+        engine.dispose()
+    return hits
+
+
+_POOL = {"workers": 0, "executor": None}
+
+
+def _executor(workers):
+    # Giữ pool giữa các lần quét để không trả lại chi phí khởi động process mỗi lần.
+    # spawn: không fork tiến trình đang giữ kết nối SQLite/luồng của Flask
+    if _POOL["workers"] != workers:
+        if _POOL["executor"] is not None:
+            _POOL["executor"].shutdown(wait=False)
+        _POOL["executor"] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        _POOL["workers"] = workers
+    return _POOL["executor"]
+
+
+def _hits_sharded(db_path, rules, workers):
+    specs = [_RuleSpec(r.Id, r.Code, r.Threshold) for r in rules]
+    shards = _shard_classes(workers * 2)
+    hits = {}
+    for part in _executor(workers).map(_scan_shard, [db_path] * len(shards), [specs] * len(shards), shards):
+        hits.update(part)
+    return hits, len(shards)
+
+
+def _scan_incremental(rules):
+    # Chỉ tính lại cho SV trong WarningScanDirty, cùng cách đối chiếu như quét toàn bộ.
+    # Đổi ngưỡng/rule không đánh dấu SV nào -> cần quét toàn bộ.
+    started = datetime.utcnow()
+    dirty = [m for (m,) in db.session.query(WarningScanDirty.MaSV)
+             .filter(WarningScanDirty.MarkedAt <= started).all()]
+    if not dirty:
+        return {"ok": True, "mode": "incremental", "students": 0, "created": 0, "updated": 0, "removed": 0}
+
+    rule_ids = [r.Id for r in rules]
+    created = updated = removed = done = 0
+    queries = _compiled(rules)
+    for part in _chunks(dirty, _IN_CHUNK):
+        c, u, r = sync_cases(_hits(queries, part), rule_ids, part, now=started)
+        created += c; updated += u; removed += r
+        done += len(part)
+        job_progress(students_total=len(dirty), students_processed=done,
+                     cases_created=created, cases_updated=updated, cases_removed=removed)
+        db.session.query(WarningScanDirty).filter(
+            WarningScanDirty.MaSV.in_(part),
+            WarningScanDirty.MarkedAt <= started,
+        ).delete(synchronize_session=False)
+
+    bump_analytics()
+    db.session.commit()
+    return {"ok": True, "mode": "incremental", "students": len(dirty),
+            "created": created, "updated": updated, "removed": removed}
@@ -0,0 +1,89 @@
+# benchmarks/bench_analytics.py
+# KPI dashboard: 4 truy vấn COUNT + lọc SV nguy cơ bằng Python (cũ) so với một truy vấn
+# SUM(CASE ...) + lọc trong SQL (mới). Bỏ qua cache để đo đúng chi phí tính.
+#   python -m benchmarks.bench_analytics --students 50000 --subjects 20
+from __future__ import annotations
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from flask import Flask
+from sqlalchemy import create_engine, desc, func
+
+from backend.models import db, SinhVien, HocPhan, KetQuaHocTap, StudentAggregate
+from backend.migrations import upgrade
+from backend.services.analytics_service import _kpis, _students_at_risk, get_system_configs
+from benchmarks.bench_indexes import build_dataset
+
+
+def old_kpis():
+    total_students = int(db.session.query(func.count(SinhVien.MaSV)).scalar() or 0)
+    total_courses = int(db.session.query(func.count(HocPhan.MaHP)).scalar() or 0)
+    total_kq = db.session.query(func.count(KetQuaHocTap.MaKQ)).scalar() or 1
+    pass_kq = db.session.query(func.count(KetQuaHocTap.MaKQ)).filter(KetQuaHocTap.DiemHe4 >= 2.0).scalar() or 0
+    return {"total_students": total_students, "total_courses": total_courses,
+            "pass_rate": float(pass_kq) / float(total_kq) * 100.0}
+
+
+def old_at_risk(limit=None):
+    # limit=None: kéo toàn bộ SV về rồi lọc, như khi muốn danh sách đầy đủ
+    cfg = get_system_configs()
+    q = (db.session.query(SinhVien.MaSV, SinhVien.HoTen, SinhVien.MaLop,
+                          StudentAggregate.GPA4, StudentAggregate.DebtCredits.label("DebtTC"))
+         .join(StudentAggregate, StudentAggregate.MaSV == SinhVien.MaSV, isouter=True)
+         .order_by(desc("DebtTC")))
+    if limit:
+        q = q.limit(limit)
+    out = []
+    for r in q:
+        gpa, debt = float(r.GPA4 or 0.0), int(r.DebtTC or 0)
+        if gpa <= cfg["GPA_WARN_THRESHOLD"] or debt >= cfg["DEBT_WARN_TINCHI"]:
+            out.append(r.MaSV)
+    return out
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        res = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, res
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--students", type=int, default=50_000)
+    ap.add_argument("--subjects", type=int, default=20)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_analytics_"), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    t0 = time.perf_counter()
+    build_dataset(engine, args.students, args.subjects)
+    upgrade(engine)
+    engine.dispose()
+    print(f"dataset: {args.students} SV x {args.subjects} HP -> {path} ({time.perf_counter() - t0:.1f}s)")
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    db.init_app(app)
+    with app.app_context():
+        t_old, k_old = timed(old_kpis, args.repeat)
+        t_new, k_new = timed(lambda: _kpis(None), args.repeat)
+        print(f"{'kpis':<24} old {t_old * 1000:>8.1f}ms  new {t_new * 1000:>8.1f}ms  same={k_old == k_new}")
+        t_new, r_new = timed(lambda: _students_at_risk(None), args.repeat)
+        for label, limit in (("at_risk (top 50)", 50), ("at_risk (all rows)", None)):
+            t_old, r_old = timed(lambda: old_at_risk(limit), args.repeat)
+            print(f"{label:<24} old {t_old * 1000:>8.1f}ms  new {t_new * 1000:>8.1f}ms  "
+                  f"rows old={len(r_old)} new={len(r_new)}")
+
+
+if __name__ == "__main__":
+    main()
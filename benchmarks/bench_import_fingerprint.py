@@ -0,0 +1,84 @@
+# benchmarks/bench_import_fingerprint.py
+# Gửi lại bảng điểm: lần nhập đầu, gửi lại đúng tệp cũ (trùng ImportRun -> bỏ qua cả tệp), tệp có vài
+# dòng sửa (bỏ qua dòng trùng dấu vết) và cùng tệp đó với ?force=1 (xử lý hết, chỉ so từng ô).
+#   python -m benchmarks.bench_import_fingerprint --students 5000 --subjects 40 --edited 50
+from __future__ import annotations
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from flask import Flask
+from sqlalchemy import create_engine, event
+
+from backend.models import db, KetQuaHocTap
+from backend.migrations import upgrade
+from backend.importer import import_grades
+from benchmarks.bench_indexes import build_dataset
+
+
+def make_csv(students: int, subjects: int, edited: int = 0) -> bytes:
+    lines = [",".join(["Mã sinh viên", "Họ và tên"] + [f"Hoc phan {j}" for j in range(subjects)])]
+    step = max(1, students // edited) if edited else 0
+    for i in range(students):
+        bump = 0.5 if step and i % step == 0 else 0.0
+        scores = [f"{min(10.0, (i * 7 + j * 3) % 100 / 10 + bump):.1f}" for j in range(subjects)]
+        lines.append(",".join([f"SV{i:06d}", f"Sinh vien {i}"] + scores))
+    return "\n".join(lines).encode("utf-8")
+
+
+def post(app, data: bytes, extra: str = ""):
+    with app.test_request_context(f"/api/admin/import/grades?preview=0&allow_update=1&hocky=HK1{extra}",
+                                  method="POST", data={"file": (io.BytesIO(data), "grades.csv")},
+                                  content_type="multipart/form-data"):
+        resp, code = import_grades(preview=False, allow_update=True)
+        assert code == 200, resp.get_json()
+        return resp.get_json()["summary"]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--students", type=int, default=5000)
+    ap.add_argument("--subjects", type=int, default=40)
+    ap.add_argument("--edited", type=int, default=50)
+    args = ap.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_fp_"), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    build_dataset(engine, args.students, args.subjects)
+    upgrade(engine)
+    engine.dispose()
+
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{path}", AUDIT_ASYNC=False)
+    db.init_app(app)
+    first = make_csv(args.students, args.subjects)
+    edited = make_csv(args.students, args.subjects, args.edited)
+    runs = [
+        ("first import", first, ""),
+        ("same file", first, ""),
+        (f"{args.edited} rows edited", edited, ""),
+        ("same edits, force=1", edited, "&force=1"),
+    ]
+    print(f"grades: {args.students} students x {args.subjects} subjects")
+    print(f"  {'upload':<30} {'time':>8} {'queries':>8}  created/updated/unchanged  rows skipped")
+    with app.app_context():
+        n_q = {"q": 0}
+        event.listen(db.engine, "before_cursor_execute", lambda *a: n_q.__setitem__("q", n_q["q"] + 1))
+        for label, data, extra in runs:
+            n_q["q"] = 0
+            t0 = time.perf_counter()
+            s = post(app, data, extra)
+            dt = time.perf_counter() - t0
+            print(f"  {label:<30} {dt:>7.2f}s {n_q['q']:>8}  {s['created']}/{s['updated']}/{s['unchanged']}"
+                  f"  {s.get('unchanged_rows', '-')}" + (f" (same as {s['same_as_import']})" if "same_as_import" in s else ""))
+        print(f"  KetQuaHocTap rows: {db.session.query(KetQuaHocTap).count()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# benchmarks/bench_indexes.py
+# So sánh các truy vấn nóng trên KetQuaHocTap/WarningCase/SinhVien trước và sau migration 1.
+#   python -m benchmarks.bench_indexes --students 50000 --subjects 20
+from __future__ import annotations
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine
+
+from backend.models import db
+from backend.migrations import MIGRATIONS, upgrade
+
+INDEXES = [
+    "ux_KetQuaHocTap_MaSV_MaHP_HocKy",
+    "ix_KetQuaHocTap_MaHP_LaDiemCuoiCung",
+    "ix_KetQuaHocTap_final_MaSV",
+    "ix_WarningCase_RuleId_MaSV_Status",
+    "ix_SinhVien_MaLop",
+    "ix_ChuongTrinhDaoTao_MaNganh_MaHP",
+]
+
+
+def build_dataset(engine, n_students: int, n_subjects: int, seed: int = 7):
+    rnd = random.Random(seed)
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for name in INDEXES:
+            conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{name}"')
+        conn.exec_driver_sql("PRAGMA user_version = 0")
+
+        n_classes = max(1, n_students // 50)
+        conn.exec_driver_sql("INSERT INTO Khoa VALUES ('K1', 'Khoa 1')")
+        conn.exec_driver_sql("INSERT INTO NganhHoc VALUES ('N1', 'Nganh 1', 150, 'K1')")
+        conn.exec_driver_sql("INSERT INTO VaiTro (MaVaiTro, TenVaiTro) VALUES (1, 'Sinh viên')")
+        conn.exec_driver_sql("INSERT INTO WarningRule (Id, Code, Name, Threshold, Active) VALUES (1, 'GPA_BELOW', 'GPA', 2.0, 1)")
+        conn.exec_driver_sql(
+            "INSERT INTO LopHoc (MaLop, TenLop, MaNganh) VALUES (?, ?, 'N1')",
+            [(f"L{i:05d}", f"L{i:05d}") for i in range(n_classes)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO HocPhan (MaHP, TenHP, SoTinChi, TinhDiemTichLuy) VALUES (?, ?, ?, 1)",
+            [(f"HP{j:03d}", f"Hoc phan {j}", rnd.choice((2, 3, 4))) for j in range(n_subjects)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO ChuongTrinhDaoTao (HocKy, LaMonBatBuoc, MaNganh, MaHP) VALUES (?, 1, 'N1', ?)",
+            [(1 + j % 8, f"HP{j:03d}") for j in range(n_subjects)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO NguoiDung (MaNguoiDung, TenDangNhap, MatKhauMaHoa, Email, TrangThai, MaVaiTro) "
+            "VALUES (?, ?, 'x', ?, 'Hoạt động', 1)",
+            [(i + 1, f"SV{i:06d}", f"SV{i:06d}@bench") for i in range(n_students)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO SinhVien (MaSV, HoTen, TrangThaiHocTap, MaLop, MaNguoiDung) VALUES (?, ?, 'Đang học', ?, ?)",
+            [(f"SV{i:06d}", f"Sinh vien {i}", f"L{i % n_classes:05d}", i + 1) for i in range(n_students)],
+        )
+        rows = []
+        for i in range(n_students):
+            for j in range(n_subjects):
+                d10 = round(rnd.uniform(2.0, 10.0), 2)
+                rows.append((f"HK{1 + j % 8}", d10, round(d10 * 0.4, 2), "A", 1, 1, f"SV{i:06d}", f"HP{j:03d}"))
+            if len(rows) >= 100_000:
+                conn.exec_driver_sql(
+                    "INSERT INTO KetQuaHocTap (HocKy, DiemHe10, DiemHe4, DiemChu, LaDiemCuoiCung, TinhDiemTichLuy, MaSV, MaHP) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                rows = []
+        if rows:
+            conn.exec_driver_sql(
+                "INSERT INTO KetQuaHocTap (HocKy, DiemHe10, DiemHe4, DiemChu, LaDiemCuoiCung, TinhDiemTichLuy, MaSV, MaHP) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.exec_driver_sql(
+            "INSERT INTO WarningCase (RuleId, MaSV, Value, Level, Status, CreatedAt) "
+            "VALUES (1, ?, 1.5, 'warning', 'open', '2024-01-01 00:00:00')",
+            [(f"SV{i:06d}",) for i in range(0, n_students, 7)],
+        )
+
+
+def _timeit(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run_queries(engine, n_students: int, n_subjects: int, lookups: int):
+    rnd = random.Random(11)
+    keys = [(f"SV{rnd.randrange(n_students):06d}", f"HP{rnd.randrange(n_subjects):03d}") for _ in range(lookups)]
+    classes = max(1, n_students // 50)
+    out = {}
+    with engine.connect() as conn:
+        def grade_cell_lookup():
+            for masv, mahp in keys:
+                j = int(mahp[2:])
+                conn.exec_driver_sql(
+                    "SELECT MaKQ FROM KetQuaHocTap WHERE MaSV = ? AND MaHP = ? AND HocKy = ? LIMIT 1",
+                    (masv, mahp, f"HK{1 + j % 8}")).fetchall()
+
+        def retake_lookup():
+            for masv, mahp in keys:
+                conn.exec_driver_sql(
+                    "SELECT MaKQ FROM KetQuaHocTap WHERE MaSV = ? AND MaHP = ? ORDER BY MaKQ",
+                    (masv, mahp)).fetchall()
+
+        def warning_exists():
+            for masv, _ in keys:
+                conn.exec_driver_sql(
+                    "SELECT Id FROM WarningCase WHERE RuleId = 1 AND MaSV = ? AND Status = 'open' LIMIT 1",
+                    (masv,)).fetchall()
+
+        def class_students():
+            for i in range(min(lookups, classes)):
+                conn.exec_driver_sql("SELECT MaSV FROM SinhVien WHERE MaLop = ?", (f"L{i:05d}",)).fetchall()
+
+        def top_fails():
+            conn.exec_driver_sql(
+                "SELECT MaHP, COUNT(*), SUM(CASE WHEN DiemHe4 = 0 THEN 1 ELSE 0 END) FROM KetQuaHocTap "
+                "WHERE LaDiemCuoiCung = 1 GROUP BY MaHP").fetchall()
+
+        def student_gpa():
+            for masv, _ in keys[: lookups // 4]:
+                conn.exec_driver_sql(
+                    "SELECT SUM(k.DiemHe4 * h.SoTinChi), SUM(h.SoTinChi) FROM KetQuaHocTap k "
+                    "JOIN HocPhan h ON h.MaHP = k.MaHP WHERE k.MaSV = ? AND k.LaDiemCuoiCung = 1",
+                    (masv,)).fetchall()
+
+        for name, fn in (
+            ("grade cell lookup (MaSV,MaHP,HocKy) x%d" % lookups, grade_cell_lookup),
+            ("retake lookup (MaSV,MaHP) x%d" % lookups, retake_lookup),
+            ("open WarningCase exists x%d" % lookups, warning_exists),
+            ("students by MaLop x%d" % min(lookups, classes), class_students),
+            ("per-student GPA (final grades) x%d" % (lookups // 4), student_gpa),
+            ("top failing courses GROUP BY MaHP", top_fails),
+        ):
+            out[name] = _timeit(fn)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--students", type=int, default=50_000)
+    ap.add_argument("--subjects", type=int, default=20)
+    ap.add_argument("--lookups", type=int, default=500)
+    ap.add_argument("--db", default=None, help="đường dẫn file SQLite (mặc định: file tạm)")
+    args = ap.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(prefix="bench_idx_"), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+
+    t0 = time.perf_counter()
+    build_dataset(engine, args.students, args.subjects)
+    print(f"dataset: {args.students} SV x {args.subjects} HP -> {path} ({time.perf_counter() - t0:.1f}s)")
+
+    before = run_queries(engine, args.students, args.subjects, args.lookups)
+    t0 = time.perf_counter()
+    version = upgrade(engine)
+    print(f"migrate -> v{version} ({len(MIGRATIONS)} steps) in {time.perf_counter() - t0:.2f}s")
+    after = run_queries(engine, args.students, args.subjects, args.lookups)
+
+    print(f"{'query':<45} {'before':>10} {'after':>10} {'speedup':>9}")
+    for name in before:
+        b, a = before[name], after[name]
+        print(f"{name:<45} {b * 1000:>8.1f}ms {a * 1000:>8.1f}ms {b / max(a, 1e-9):>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_login.py
+# Độ trễ đăng nhập (p50/p99) dưới tải song song theo chính sách băm mật khẩu, và chi phí
+# tạo tài khoản khi nhập hàng loạt.
+#   python -m benchmarks.bench_login --users 200 --threads 1,4,8 --rounds 12
+from __future__ import annotations
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from flask import Flask
+from passlib.hash import bcrypt
+from sqlalchemy import event
+
+from backend.models import db, VaiTro, NguoiDung
+from backend.services.auth_service import authenticate, hash_provisioned
+
+
+def percentile(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100.0 * (len(xs) - 1))))]
+
+
+def run(app, names, threads):
+    def one(name):
+        with app.app_context():
+            t0 = time.perf_counter()
+            ok = authenticate(name, name) is not None
+            dt = time.perf_counter() - t0
+            db.session.remove()
+        assert ok, name
+        return dt
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        lat = list(ex.map(one, names))
+    wall = time.perf_counter() - t0
+    return (statistics.median(lat) * 1000, percentile(lat, 99) * 1000, len(names) / wall)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--threads", default="1,4,8")
+    ap.add_argument("--rounds", type=int, default=12)
+    args = ap.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_login_"), "bench.db")
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{path}", PASSWORD_BCRYPT_ROUNDS=args.rounds)
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(VaiTro(MaVaiTro=1, TenVaiTro="SinhVien"))
+        names = [f"SV{i:06d}" for i in range(args.users)]
+
+        print(f"provisioning {args.users} accounts (password = MaSV)")
+        for label, fn in (("bcrypt (default)", bcrypt.hash), ("pbkdf2 provisioned", hash_provisioned)):
+            t0 = time.perf_counter()
+            hashes = [fn(n) for n in names]
+            dt = time.perf_counter() - t0
+            print(f"  {label:<20} {dt / len(names) * 1000:>8.1f}ms/account  {dt:>7.1f}s total")
+        db.session.add_all([NguoiDung(TenDangNhap=n, MatKhauMaHoa=h, Email=f"{n}@bench", MaVaiTro=1)
+                            for n, h in zip(names, hashes)])
+        db.session.commit()
+
+        n_q = {"q": 0}
+        event.listen(db.engine, "before_cursor_execute", lambda *a: n_q.__setitem__("q", n_q["q"] + 1))
+        authenticate(names[0], names[0]); db.session.remove()
+        n_q["q"] = 0
+        authenticate(names[0], names[0]); db.session.remove()
+        print(f"queries per login (user + role): {n_q['q']}")
+
+    print(f"login latency, bcrypt rounds={args.rounds}")
+    print(f"  {'threads':<8} {'phase':<24} {'p50':>9} {'p99':>9} {'logins/s':>9}")
+    pending = names[1:]
+    counts = [int(x) for x in args.threads.split(",")]
+    per = max(1, len(pending) // len(counts))
+    for i, threads in enumerate(counts):
+        # Lần đầu: pbkdf2 -> xác thực + băm lại bcrypt; lần sau: chỉ xác thực bcrypt
+        first = pending[i * per:(i + 1) * per]
+        if not first:
+            break
+        for phase, batch in (("first login (rehash)", first), ("repeat login", first)):
+            p50, p99, tput = run(app, batch, threads)
+            print(f"  {threads:<8} {phase:<24} {p50:>8.1f}ms {p99:>8.1f}ms {tput:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/bench_multisheet_import.py
+# Nhập bảng điểm một workbook nhiều sheet (mỗi lớp một sheet): đọc + chuẩn hoá tuần tự trong process
+# (IMPORT_PARSE_WORKERS=1) so với song song ở N process; pha ghi DB luôn tuần tự theo thứ tự sheet.
+# Mỗi cấu hình chạy trên bản sao DB riêng, lấy lần nhanh nhất (lần đầu có thêm thời gian khởi động pool).
+#   python -m benchmarks.bench_multisheet_import --sheets 8 --students 400 --subjects 40 --workers 1,4
+from __future__ import annotations
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from flask import Flask
+from openpyxl import Workbook
+from sqlalchemy import create_engine
+
+from backend.models import db
+from backend.migrations import upgrade
+from backend.importer import import_grades
+from benchmarks.bench_indexes import build_dataset
+
+
+def make_workbook(sheets: int, students: int, subjects: int) -> bytes:
+    wb = Workbook(write_only=True)
+    for s in range(sheets):
+        ws = wb.create_sheet(f"L{s:05d}")
+        ws.append(["TRƯỜNG ĐẠI HỌC"]); ws.append([f"BẢNG ĐIỂM LỚP L{s:05d}"]); ws.append([])
+        ws.append(["STT", "Mã sinh viên", "Họ và tên"] + [f"Hoc phan {j}" for j in range(subjects)])
+        for k in range(students):
+            i = s * students + k
+            ws.append([k + 1, f"SV{i:06d}", f"Sinh vien {i}"]
+                      + [round((i * 7 + j * 3) % 100 / 10, 1) for j in range(subjects)])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def run(template: str, data: bytes, workers: int, repeat: int):
+    best, summary = float("inf"), None
+    for r in range(repeat):
+        path = template.replace("template.db", f"w{workers}_{r}.db")
+        shutil.copy(template, path)
+        app = Flask(__name__)
+        app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{path}", AUDIT_ASYNC=False,
+                          IMPORT_PARSE_WORKERS=workers)
+        db.init_app(app)
+        with app.test_request_context("/api/admin/import/grades?preview=0&allow_update=1&hocky=HK1",
+                                      method="POST", data={"file": (io.BytesIO(data), "bangdiem.xlsx")},
+                                      content_type="multipart/form-data"):
+            t0 = time.perf_counter()
+            resp, code = import_grades(preview=False, allow_update=True)
+            best = min(best, time.perf_counter() - t0)
+            assert code == 200, resp.get_json()
+            summary = resp.get_json()["summary"]
+            db.session.remove()
+    return best, summary
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sheets", type=int, default=8)
+    ap.add_argument("--students", type=int, default=400)
+    ap.add_argument("--subjects", type=int, default=40)
+    ap.add_argument("--workers", default=f"1,{os.cpu_count() or 1}")
+    ap.add_argument("--repeat", type=int, default=2)
+    args = ap.parse_args()
+
+    template = os.path.join(tempfile.mkdtemp(prefix="bench_multisheet_"), "template.db")
+    engine = create_engine(f"sqlite:///{template}")
+    build_dataset(engine, args.sheets * args.students, args.subjects)
+    upgrade(engine)
+    engine.dispose()
+    data = make_workbook(args.sheets, args.students, args.subjects)
+    print(f"workbook: {args.sheets} sheets x {args.students} students x {args.subjects} subjects "
+          f"({len(data) / 2 ** 20:.1f}MB), cpu_count={os.cpu_count()}")
+
+    base = None
+    for workers in sorted({int(w) for w in args.workers.split(",")}):
+        dt, s = run(template, data, workers, args.repeat)
+        base = base or dt
+        print(f"  workers={workers:<3} {dt:>7.2f}s  x{base / dt:>4.1f}  created={s['created']} updated={s['updated']} "
+              f"sheets={len(s['sheets'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# benchmarks/bench_roster_import.py
+# Nhập danh sách lớp cỡ lớn: vòng lặp cũ (mỗi dòng một truy vấn NguoiDung + session.get(SinhVien))
+# so với import_class_roster (chuẩn hoá theo cột, prefetch bằng IN, insert/update Core theo lô).
+#   python -m benchmarks.bench_roster_import --rows 20000 --existing 5000
+from __future__ import annotations
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unicodedata
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd
+from flask import Flask
+from sqlalchemy import create_engine, event
+
+from backend.models import db, NguoiDung, SinhVien, VaiTro
+from backend.migrations import upgrade
+from backend.importer import import_class_roster
+from backend.services.auth_service import hash_provisioned
+from benchmarks.bench_indexes import build_dataset
+
+LOP = "L00000"
+HEADER = {"masinhvien", "masv", "mssv", "hovaten", "hoten", "ngaysinh", "noisinh"}
+
+
+def make_csv(rows: int, existing: int) -> bytes:
+    # Nửa đầu: SV đã có (đổi họ tên -> update), còn lại: SV mới
+    lines = ["Mã sinh viên,Họ và tên,Ngày sinh,Nơi sinh"]
+    for i in range(rows):
+        masv = f"SV{i:06d}" if i < existing else f"NEW{i:07d}"
+        lines.append(f"{masv},Sinh Viên Mới {i},{1 + i % 28:02d}/{1 + i % 12:02d}/2004,Hà Nội")
+    return "\n".join(lines).encode("utf-8")
+
+
+def _norm_key(s: str) -> str:
+    s = unicodedata.normalize("NFKD", s or "")
+    s = "".join(c for c in s if not unicodedata.combining(c)).strip().lower()
+    for ch in (" ", "_", "-", ".", "/"):
+        s = s.replace(ch, "")
+    return s
+
+
+def legacy_import(data: bytes):
+    # Tái hiện vòng lặp trước đây: chuẩn hoá từng ô, một truy vấn NguoiDung và một get(SinhVien) mỗi dòng
+    df = pd.read_csv(io.BytesIO(data), dtype=object, encoding="utf-8")
+    role = db.session.query(VaiTro).filter(VaiTro.TenVaiTro == "SinhVien").first()
+    if not role:
+        role = VaiTro(TenVaiTro="SinhVien"); db.session.add(role); db.session.flush()
+    created = updated = 0
+    for _, row in df.iterrows():
+        masv, hoten, ngs_raw, nois = (str(v).strip() if pd.notna(v) else "" for v in row.iloc[:4])
+        if any(_norm_key(v) in HEADER for v in (masv, hoten, ngs_raw, nois)):
+            continue
+        dt = pd.to_datetime(ngs_raw.replace("-", "/"), dayfirst=True, errors="coerce")
+        ngs = None if pd.isna(dt) else dt.date()
+        u = NguoiDung.query.filter_by(TenDangNhap=masv).first()
+        if not u:
+            u = NguoiDung(TenDangNhap=masv, MatKhauMaHoa=hash_provisioned(masv), Email=f"{masv}@bench".lower(),
+                          TrangThai="Hoạt động", MaVaiTro=role.MaVaiTro)
+            db.session.add(u); db.session.flush()
+        sv = db.session.get(SinhVien, masv)
+        if not sv:
+            db.session.add(SinhVien(MaSV=masv, HoTen=hoten, NgaySinh=ngs, NoiSinh=nois, MaLop=LOP,
+                                    MaNguoiDung=u.MaNguoiDung))
+            created += 1
+        else:
+            sv.HoTen, sv.NgaySinh, sv.NoiSinh, sv.MaLop = hoten, ngs, nois, LOP
+            updated += 1
+    db.session.commit()
+    return {"created": created, "updated": updated}
+
+
+def bulk_import(app, data: bytes):
+    with app.test_request_context(f"/api/admin/import/class-roster?lop={LOP}", method="POST",
+                                  data={"file": (io.BytesIO(data), "roster.csv")},
+                                  content_type="multipart/form-data"):
+        resp, code = import_class_roster(preview=False, allow_update=True)
+        assert code == 200, resp.get_json()
+        s = resp.get_json()["summary"]
+        return {"created": s["created"], "updated": s["updated"]}
+
+
+def run(template: str, label: str, fn, rounds: int):
+    path = template.replace("template.db", f"{label}.db")
+    shutil.copy(template, path)
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{path}", PASSWORD_BULK_PBKDF2_ROUNDS=rounds,
+                      AUDIT_ASYNC=False)
+    db.init_app(app)
+    with app.app_context():
+        n_q = {"q": 0}
+        event.listen(db.engine, "before_cursor_execute", lambda *a: n_q.__setitem__("q", n_q["q"] + 1))
+        t0 = time.perf_counter()
+        res = fn(app)
+        dt = time.perf_counter() - t0
+        n_sv = db.session.query(SinhVien).filter(SinhVien.MaLop == LOP).count()
+        db.session.remove()
+    return dt, n_q["q"], res, n_sv
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=20_000)
+    ap.add_argument("--existing", type=int, default=5_000)
+    # Băm pbkdf2 giống nhau ở cả hai cách; hạ rounds để so phần truy vấn/ghi DB
+    ap.add_argument("--pbkdf2-rounds", type=int, default=1000)
+    args = ap.parse_args()
+
+    template = os.path.join(tempfile.mkdtemp(prefix="bench_roster_"), "template.db")
+    engine = create_engine(f"sqlite:///{template}")
+    build_dataset(engine, args.existing, 1)
+    upgrade(engine)
+    engine.dispose()
+    data = make_csv(args.rows, args.existing)
+    print(f"roster: {args.rows} rows ({args.existing} existing SV, {args.rows - args.existing} new), "
+          f"pbkdf2 rounds={args.pbkdf2_rounds}")
+
+    print(f"  {'path':<10} {'time':>9} {'queries':>9} {'rows/s':>9}  result")
+    for label, fn in (("legacy", lambda app: legacy_import(data)), ("bulk", lambda app: bulk_import(app, data))):
+        dt, n_q, res, n_sv = run(template, label, fn, args.pbkdf2_rounds)
+        print(f"  {label:<10} {dt:>8.2f}s {n_q:>9} {args.rows / dt:>9.0f}  {res} SV in {LOP}: {n_sv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/bench_student_search.py
+# Danh sách SV: LIKE '%q%' so với FTS5 (migration 4), OFFSET trang sâu so với keyset, đếm đúng so với ước lượng.
+#   python -m benchmarks.bench_student_search --students 200000
+from __future__ import annotations
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import sqlalchemy as sa
+from flask import Flask
+from sqlalchemy import create_engine
+
+from backend.models import db, SinhVien
+from backend.migrations import upgrade
+from backend.services.student_search import search_filter, approx_count
+from benchmarks.bench_indexes import build_dataset
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        res = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000, res
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--students", type=int, default=200_000)
+    ap.add_argument("--page-size", type=int, default=50)
+    args = ap.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_search_"), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    t0 = time.perf_counter()
+    build_dataset(engine, args.students, 1)
+    upgrade(engine)
+    engine.dispose()
+    print(f"dataset: {args.students} SV -> {path} ({time.perf_counter() - t0:.1f}s)")
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    db.init_app(app)
+    with app.app_context():
+        base = db.session.query(SinhVien)
+        size = args.page_size
+
+        print("search (page 1 + exact count)")
+        for text in (f"Sinh vien {args.students - 7}", f"SV{args.students // 2:06d}", "vien 12345"):
+            like = base.filter(sa.or_(SinhVien.MaSV.ilike(f"%{text}%"), SinhVien.HoTen.ilike(f"%{text}%")))
+            fts = base.filter(search_filter(text))
+            t_like, n_like = timed(lambda: (like.count(), like.order_by(SinhVien.MaSV).limit(size).all())[0])
+            t_fts, n_fts = timed(lambda: (fts.count(), fts.order_by(SinhVien.MaSV).limit(size).all())[0])
+            print(f"  {text!r:<24} LIKE {t_like:>8.1f}ms ({n_like})  FTS5 {t_fts:>8.1f}ms ({n_fts})")
+
+        print("deep page")
+        ordered = base.order_by(SinhVien.MaSV)
+        for page in (10, 1000, args.students // size - 1):
+            offset = (page - 1) * size
+            after = db.session.query(SinhVien.MaSV).order_by(SinhVien.MaSV).offset(offset - 1).limit(1).scalar()
+            t_off, _ = timed(lambda: ordered.offset(offset).limit(size).all())
+            t_key, _ = timed(lambda: ordered.filter(SinhVien.MaSV > after).limit(size).all())
+            print(f"  page {page:<8} OFFSET {t_off:>8.1f}ms  keyset {t_key:>8.1f}ms")
+
+        print("count")
+        t_exact, n = timed(lambda: base.count())
+        t_approx, (n_est, _) = timed(lambda: approx_count(base, False))
+        print(f"  exact {t_exact:>8.1f}ms ({n})  approx {t_approx:>8.1f}ms ({n_est})")
+
+
+if __name__ == "__main__":
+    main()
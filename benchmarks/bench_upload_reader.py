@@ -0,0 +1,80 @@
+# benchmarks/bench_upload_reader.py
+# Bộ nhớ đỉnh (tracemalloc) khi đọc tệp nhập: cả tệp (bytes + pd.read_csv/read_excel như trước)
+# so với services.upload_reader (file tạm + từng lô IMPORT_CHUNK_ROWS dòng).
+#   python -m benchmarks.bench_upload_reader --rows 20000,60000 --subjects 30
+from __future__ import annotations
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd
+
+from backend.services.upload_reader import iter_frames
+
+
+def make_file(path: str, rows: int, subjects: int):
+    # Bảng điểm dạng rộng: mỗi dòng một SV, mỗi cột một học phần
+    df = pd.DataFrame({"Mã sinh viên": [f"SV{i:06d}" for i in range(rows)],
+                       "Họ và tên": [f"Sinh vien {i}" for i in range(rows)]})
+    for j in range(subjects):
+        df[f"Học phần {j}"] = [round((i * 7 + j * 3) % 100 / 10, 1) for i in range(rows)]
+    if path.endswith(".csv"):
+        df.to_csv(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+
+
+def whole(path: str):
+    with open(path, "rb") as f:
+        raw = f.read()
+    if path.endswith(".csv"):
+        df = pd.read_csv(io.BytesIO(raw), dtype=str)
+    else:
+        df = pd.read_excel(io.BytesIO(raw), dtype=str)
+    return len(df)
+
+
+def chunked(path: str, size: int):
+    return sum(len(df) for df in iter_frames(path, path, dtype=str, size=size))
+
+
+def measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    n = fn()
+    dt = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return n, dt, peak / 2 ** 20
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", default="20000,60000")
+    ap.add_argument("--subjects", type=int, default=30)
+    ap.add_argument("--chunk", type=int, default=5000)
+    ap.add_argument("--formats", default="csv,xlsx")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_upload_")
+    print(f"  {'file':<18} {'size':>8} {'path':<8} {'time':>8} {'peak':>10}")
+    for rows in (int(x) for x in args.rows.split(",")):
+        for ext in args.formats.split(","):
+            path = os.path.join(tmp, f"grades_{rows}.{ext}")
+            make_file(path, rows, args.subjects)
+            mb = os.path.getsize(path) / 2 ** 20
+            for label, fn in (("whole", lambda: whole(path)), ("chunked", lambda: chunked(path, args.chunk))):
+                n, dt, peak = measure(fn)
+                assert n == rows, (label, n)
+                print(f"  {os.path.basename(path):<18} {mb:>6.1f}MB {label:<8} {dt:>7.2f}s {peak:>8.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# benchmarks/bench_warning_scan.py
+# Quét cảnh báo toàn bộ với số process khác nhau trên dữ liệu tổng hợp.
+#   python -m benchmarks.bench_warning_scan --students 50000 --workers 1,2,4
+from __future__ import annotations
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from flask import Flask
+from sqlalchemy import create_engine
+
+from backend.models import db, WarningCase
+from backend.migrations import upgrade
+from backend.models import WarningRule
+from backend.warning_scan import scan_all_warnings, _compiled, _hits, _hits_sharded
+from benchmarks.bench_indexes import build_dataset
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--students", type=int, default=50_000)
+    ap.add_argument("--subjects", type=int, default=20)
+    ap.add_argument("--workers", default="1,2,4")
+    args = ap.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_scan_"), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    t0 = time.perf_counter()
+    build_dataset(engine, args.students, args.subjects)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        conn.exec_driver_sql(
+            "INSERT INTO WarningRule (Code, Name, Threshold, Active) VALUES "
+            "('AVG_BELOW', 'TB', 6.0, 1), ('FAIL_COUNT', 'Nợ môn', 3, 1), ('DEBT_OVER', 'Nợ TC', 8, 1)")
+    upgrade(engine)
+    engine.dispose()
+    print(f"dataset: {args.students} SV x {args.subjects} HP -> {path} ({time.perf_counter() - t0:.1f}s)")
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    db.init_app(app)
+    with app.app_context():
+        rules = WarningRule.query.filter_by(Active=True).all()
+        print(f"{'workers':<8} {'evaluate':>9} {'full scan':>10}")
+        for n in [int(x) for x in args.workers.split(",")]:
+            # Xoá case để mỗi lượt phải mở lại toàn bộ
+            db.session.query(WarningCase).delete()
+            db.session.commit()
+            t0 = time.perf_counter()
+            if n > 1:
+                _hits_sharded(path, rules, n)
+            else:
+                _hits(_compiled(rules))
+            t_eval = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            res = scan_all_warnings(workers=n)
+            print(f"{n:<8} {t_eval:>8.2f}s {time.perf_counter() - t0:>9.2f}s  created={res.get('created')} shards={res.get('shards', 1)}")
+
+
+if __name__ == "__main__":
+    main()
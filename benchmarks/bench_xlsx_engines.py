@@ -0,0 +1,91 @@
+# benchmarks/bench_xlsx_engines.py
+# Thời gian đọc bảng điểm/danh sách XLSX theo engine: pd.read_excel (openpyxl, như trước) so với
+# upload_reader qua openpyxl read_only và calamine (nếu đã cài python-calamine).
+# Mặc định sinh mẫu giống biểu mẫu phòng đào tạo (dòng tiêu đề trường/bảng điểm phía trên);
+# --file để chạy trên tệp thật.
+#   python -m benchmarks.bench_xlsx_engines --students 5000 --subjects 40
+#   python -m benchmarks.bench_xlsx_engines --file bangdiem_k65.xlsx --file danhsach_lop.xlsx
+from __future__ import annotations
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd
+from openpyxl import Workbook
+
+from backend.services.upload_reader import CalamineWorkbook, iter_frames
+from backend.utils_import import detect_header_row
+
+
+def grade_template(path: str, students: int, subjects: int):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Bang diem")
+    ws.append(["TRƯỜNG ĐẠI HỌC"]); ws.append(["BẢNG ĐIỂM TỔNG HỢP"]); ws.append([])
+    ws.append(["STT", "Mã sinh viên", "Họ và tên", "Ngày sinh", "Tên lớp"]
+              + [f"Học phần {j}" for j in range(subjects)] + ["TBC HT10", "Số HP nợ", "Số tín chỉ nợ"])
+    for i in range(students):
+        scores = [round((i * 7 + j * 3) % 100 / 10, 1) if (i + j) % 9 else None for j in range(subjects)]
+        ws.append([i + 1, f"SV{i:06d}", f"Sinh viên {i}", f"{1 + i % 28:02d}/{1 + i % 12:02d}/2004", "L00001"]
+                  + scores + [6.5, i % 3, (i % 3) * 3])
+    wb.save(path)
+
+
+def roster_template(path: str, students: int):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Danh sach")
+    ws.append(["Mã sinh viên", "Họ và tên", "Ngày sinh", "Nơi sinh"])
+    for i in range(students):
+        ws.append([f"SV{i:06d}", f"Sinh viên {i}", f"{1 + i % 28:02d}/{1 + i % 12:02d}/2004", "Hà Nội"])
+    wb.save(path)
+
+
+def timed(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        n = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, n
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--file", action="append", default=[])
+    ap.add_argument("--students", type=int, default=5000)
+    ap.add_argument("--subjects", type=int, default=40)
+    ap.add_argument("--repeat", type=int, default=1)
+    args = ap.parse_args()
+
+    files = args.file
+    if not files:
+        tmp = tempfile.mkdtemp(prefix="bench_xlsx_")
+        files = [os.path.join(tmp, "bangdiem.xlsx"), os.path.join(tmp, "danhsach.xlsx")]
+        grade_template(files[0], args.students, args.subjects)
+        roster_template(files[1], args.students)
+
+    readers = [("pd.read_excel openpyxl", lambda p: len(pd.read_excel(p, dtype=str, header=None)))]
+    if CalamineWorkbook is not None:
+        readers.append(("pd.read_excel calamine", lambda p: len(pd.read_excel(p, dtype=str, header=None, engine="calamine"))))
+    for engine in ("openpyxl", "calamine"):
+        if engine == "calamine" and CalamineWorkbook is None:
+            print("python-calamine chưa cài: bỏ qua engine calamine")
+            continue
+        readers.append((f"upload_reader {engine}", lambda p, e=engine: sum(
+            len(df) for df in iter_frames(p, p, dtype=str, header=detect_header_row, engine=e))))
+
+    for path in files:
+        print(f"{os.path.basename(path)} ({os.path.getsize(path) / 2 ** 20:.1f}MB)")
+        base = None
+        for label, fn in readers:
+            dt, n = timed(lambda: fn(path), args.repeat)
+            base = base or dt
+            print(f"  {label:<26} {dt:>8.2f}s  x{base / dt:>5.1f}  ({n} rows)")
+
+
+if __name__ == "__main__":
+    main()
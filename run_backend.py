@@ -8,11 +8,11 @@ if getattr(sys, "frozen", False):
 sys.path.insert(0, str(BASE))
 
 from backend.app import create_app
-from backend.models import db
+from backend.migrations import init_db
 
 app = create_app()
 with app.app_context():
-    db.create_all()
+    init_db()
 
 if __name__ == "__main__":
-    app.run(host="127.0.0.1", port=5000, debug=False, use_reloader=False, threaded=False)
+    app.run(host="127.0.0.1", port=5000, debug=False, use_reloader=False, threaded=True)
@@ -1,8 +1,12 @@
 # student/api/client.py
 from __future__ import annotations
 import  os
-import json, requests, traceback
+import copy, json, requests, traceback
 class APIClient:
+    # (base_url, token) -> (ETag, dữ liệu) của lần tải /api/student/data gần nhất;
+    # dùng chung giữa các instance vì một số view tạo APIClient mới mỗi lần
+    _student_cache = {}
+
     def __init__(self, base_url=None, token_getter=None):
         self.base_url = base_url or os.environ.get("API_BASE_URL","http://127.0.0.1:5000")
         self._token_getter = token_getter
@@ -19,9 +23,22 @@ class APIClient:
 
     def fetch_student_data(self, token):
         url = f"{self.base_url}/api/student/data"
+        key = (self.base_url, token)
+        cached = APIClient._student_cache.get(key)
+        headers = {"Authorization": f"Bearer {token}"}
+        if cached:
+            headers["If-None-Match"] = cached[0]
         try:
-            r = requests.get(url, headers={"Authorization": f"Bearer {token}"}, timeout=15)
-            if r.ok: return True, r.json()
+            r = requests.get(url, headers=headers, timeout=15)
+            if r.status_code == 304 and cached:
+                return True, copy.deepcopy(cached[1])
+            if r.ok:
+                data = r.json()
+                etag = r.headers.get("ETag")
+                if etag:
+                    # Lưu bản sao: view sửa dữ liệu trả về không được làm hỏng bản trong cache
+                    APIClient._student_cache = {key: (etag, copy.deepcopy(data))}
+                return True, data
             try: return False, r.json().get("message")
             except Exception: return False, r.text
         except Exception as e:
@@ -0,0 +1,92 @@
+# tests/conftest.py
+# Fixture dùng chung: app trên DB SQLite tạm (đã chạy migration) với danh mục tối thiểu K1/N1/L1.
+from __future__ import annotations
+import csv
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.app import create_app
+from backend.migrations import init_db
+from backend.models import db, Khoa, NganhHoc, LopHoc, VaiTro
+
+
+def make_app(tmp_path, **config):
+    # DB trống, chưa migrate
+    return create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}", "AUDIT_ASYNC": False,
+                       "JWT_SECRET_KEY": "test-jwt-secret-key-with-32-bytes!", "IMPORT_PARSE_WORKERS": 1,
+                       "PASSWORD_HASH_WORKERS": 1, "PASSWORD_BULK_PBKDF2_ROUNDS": 1000, **config})
+
+
+@pytest.fixture(autouse=True)
+def _gemini_key(monkeypatch):
+    # create_app dựng client chatbot ngay khi khởi tạo
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+
+
+def seeded_app(tmp_path, **config):
+    # make_app + migration + danh mục tối thiểu
+    app = make_app(tmp_path, **config)
+    with app.app_context():
+        init_db()
+        db.session.add_all([
+            Khoa(MaKhoa="K1", TenKhoa="Công nghệ thông tin"),
+            NganhHoc(MaNganh="N1", TenNganh="Kỹ thuật phần mềm", MaKhoa="K1"),
+            LopHoc(MaLop="L1", TenLop="Lớp 1", MaNganh="N1"),
+            VaiTro(MaVaiTro=1, TenVaiTro="Admin"),
+            VaiTro(MaVaiTro=2, TenVaiTro="SinhVien"),
+        ])
+        db.session.commit()
+    return app
+
+
+@pytest.fixture()
+def app(tmp_path):
+    _clear_caches()
+    yield seeded_app(tmp_path)
+    _clear_caches()
+
+
+def _clear_caches():
+    # Cache mức module (config, analytics, payload SV) không được mang dữ liệu sang DB của test khác
+    from backend.services import student_service
+    from backend.services.analytics_service import invalidate_analytics_cache
+    from backend.services.config_service import invalidate_config_cache
+    student_service._PAYLOADS.clear()
+    invalidate_analytics_cache()
+    invalidate_config_cache()
+
+
+@pytest.fixture()
+def admin_headers(app):
+    from flask_jwt_extended import create_access_token
+    with app.app_context():
+        token = create_access_token(identity="1", additional_claims={"username": "admin", "role": "Admin"})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def add_courses(*courses):
+    # courses: (MaHP, TenHP, SoTinChi); gọi trong app context
+    from backend.models import HocPhan
+    from backend.services.data_version import bump_global
+    db.session.add_all([HocPhan(MaHP=ma, TenHP=ten, SoTinChi=tc) for ma, ten, tc in courses])
+    bump_global()
+    db.session.commit()
+
+
+def grades_csv(header, rows) -> bytes:
+    # csv.writer: ô có dấu phẩy ("7,25") được đặt trong ngoặc kép
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows([header, *rows])
+    return buf.getvalue().encode("utf-8")
+
+
+def post_import(app, headers, kind: str, data: bytes, filename: str = "data.csv", **args):
+    # -> (status, json) của /api/admin/import/<kind>
+    resp = app.test_client().post(f"/api/admin/import/{kind}", query_string=args, headers=headers,
+                                  data={"file": (io.BytesIO(data), filename)}, content_type="multipart/form-data")
+    return resp.status_code, resp.get_json()
@@ -0,0 +1,69 @@
+# tests/test_analytics_cache.py
+# Cache số liệu dashboard theo phiên bản "analytics": thao tác ghi bump phiên bản, lần đọc sau tính lại.
+from __future__ import annotations
+import time
+
+from sqlalchemy import event
+
+from conftest import grades_csv, post_import
+from backend.models import db, HocPhan
+from backend.services import analytics_service
+
+
+def _kpis(app, headers, counter=None):
+    with app.app_context():
+        engine = db.engine
+    n = {"q": 0}
+
+    def _on_execute(*args):
+        n["q"] += 1
+
+    event.listen(engine, "before_cursor_execute", _on_execute)
+    try:
+        resp = app.test_client().get("/api/analytics/kpi", headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", _on_execute)
+    assert resp.status_code == 200, resp.get_json()
+    if counter is not None:
+        counter.append(n["q"])
+    return resp.get_json()["kpis"]
+
+
+def test_writes_invalidate_cached_sections(app, admin_headers):
+    client = app.test_client()
+    assert _kpis(app, admin_headers)["total_courses"] == 0
+
+    resp = client.post("/api/admin/courses", json={"MaHP": "HP1", "TenHP": "Lập trình C", "SoTinChi": 3},
+                       headers=admin_headers)
+    assert resp.status_code == 200
+    assert _kpis(app, admin_headers)["total_courses"] == 1
+
+    # Nhập điểm tạo SV mới (?lop) và điểm
+    data = grades_csv(["Mã sinh viên", "Họ và tên", "Lập trình C"], [["SV1", "Nguyễn Văn An", 8]])
+    code, body = post_import(app, admin_headers, "grades", data, preview="0", hocky="HK1", lop="L1")
+    assert code == 200, body
+    got = _kpis(app, admin_headers)
+    assert (got["total_students"], got["pass_rate"]) == (1, 100.0)
+
+    assert client.delete("/api/admin/students/SV1", headers=admin_headers).status_code == 200
+    assert _kpis(app, admin_headers)["total_students"] == 0
+
+
+def test_cache_hit_skips_section_queries(app, admin_headers):
+    counts = []
+    _kpis(app, admin_headers, counts)
+    _kpis(app, admin_headers, counts)
+    # Lần sau chỉ còn đọc phiên bản
+    assert counts[1] < counts[0] and counts[1] <= 2
+
+
+def test_unbumped_write_waits_for_ttl(app, admin_headers, monkeypatch):
+    assert _kpis(app, admin_headers)["total_courses"] == 0
+    with app.app_context():
+        db.session.add(HocPhan(MaHP="HP1", TenHP="Lập trình C", SoTinChi=3))
+        db.session.commit()
+    assert _kpis(app, admin_headers)["total_courses"] == 0
+    # Sau ANALYTICS_CACHE_TTL (mặc định 300 giây) phần đã hết hạn được tính lại
+    now = time.monotonic()
+    monkeypatch.setattr(analytics_service.time, "monotonic", lambda: now + 301)
+    assert _kpis(app, admin_headers)["total_courses"] == 1
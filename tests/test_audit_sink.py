@@ -0,0 +1,99 @@
+# tests/test_audit_sink.py
+# Audit log ghi nền theo lô: request chỉ xếp hàng, luồng nền ghi executemany, flush ghi nốt hàng đợi.
+from __future__ import annotations
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from conftest import make_app
+from backend.migrations import init_db
+from backend.models import db, ImportLog
+from backend.services import audit_sink
+
+
+@pytest.fixture()
+def sink(app, monkeypatch):
+    # Ghi lại kích thước từng lô; lô đầu chờ gate để các bản ghi sau dồn lại trong hàng đợi
+    audit_sink.flush()
+    app.config.update(AUDIT_ASYNC=True, AUDIT_BATCH_SIZE=3, AUDIT_FLUSH_INTERVAL=0.05)
+    batches, gate = [], threading.Event()
+    real = audit_sink._write
+
+    def _write(app_, rows):
+        gate.wait(5)
+        batches.append(len(rows))
+        real(app_, rows)
+
+    monkeypatch.setattr(audit_sink, "_write", _write)
+    yield batches, gate
+    gate.set()
+    audit_sink.flush()
+
+
+def _record(n, endpoint="POST /test"):
+    for i in range(n):
+        audit_sink.record(When=datetime.utcnow(), Actor="admin", Endpoint=endpoint, Summary=str(i))
+
+
+def _endpoints(app):
+    with app.app_context():
+        return [r.Endpoint for r in db.session.query(ImportLog).order_by(ImportLog.RunId)]
+
+
+def test_records_written_in_batches_after_flush(app, sink):
+    batches, gate = sink
+    with app.app_context():
+        _record(7)
+        # Chưa ghi gì trong request
+        assert db.session.query(ImportLog).count() == 0
+    gate.set()
+    audit_sink.flush()
+    assert _endpoints(app) == ["POST /test"] * 7
+    assert sum(batches) == 7 and max(batches) <= 3 and len(batches) < 7
+
+
+def test_sync_when_async_disabled(app, sink):
+    batches, gate = sink
+    gate.set()
+    app.config["AUDIT_ASYNC"] = False
+    with app.app_context():
+        _record(2)
+    assert _endpoints(app) == ["POST /test"] * 2
+    assert batches == [1, 1]
+
+
+def test_full_queue_falls_back_to_sync_write(app, sink):
+    batches, gate = sink
+    app.config["AUDIT_QUEUE_SIZE"] = 1
+    done = threading.Event()
+    with app.app_context():
+        # Lô đầu giữ luồng nền ở gate, một bản ghi nằm trong hàng đợi; bản ghi sau ghi đồng bộ (cũng qua gate)
+        _record(1)
+        while not audit_sink._STATE["queue"].empty():
+            time.sleep(0.01)
+        time.sleep(0.1)
+        _record(1)
+        t = threading.Thread(target=lambda: (app.app_context().push(), _record(1, "POST /sync"), done.set()))
+        t.start()
+        assert not done.wait(0.3)
+        gate.set()
+        t.join(5)
+    audit_sink.flush()
+    assert sorted(_endpoints(app)) == ["POST /sync", "POST /test", "POST /test"]
+
+
+def test_rows_grouped_per_app(app, tmp_path):
+    other_dir = tmp_path / "other"
+    other_dir.mkdir()
+    other = make_app(other_dir)
+    with other.app_context():
+        init_db()
+    row = {"When": datetime.utcnow(), "Endpoint": "POST /x"}
+    audit_sink._write_grouped([(app, row), (other, {**row, "Endpoint": "POST /y"}), (app, row)])
+    assert _endpoints(app) == ["POST /x", "POST /x"]
+    assert _endpoints(other) == ["POST /y"]
+    # Lỗi ghi được log, không ném ra
+    audit_sink._write_grouped([(app, {"When": datetime.utcnow()})])
+    assert len(_endpoints(app)) == 2
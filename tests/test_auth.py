@@ -0,0 +1,46 @@
+# tests/test_auth.py
+# Cost bcrypt theo vai trò (khóa theo TenVaiTro, không phân biệt dấu/hoa thường), băm lại khi đăng nhập.
+from __future__ import annotations
+
+import pytest
+
+from backend.models import db, NguoiDung, VaiTro
+from backend.services.auth_service import bcrypt_rounds
+
+
+@pytest.mark.parametrize("role, rounds", [
+    ("Sinh viên", 5), ("SinhVien", 5), ("sinh vien", 5), ("Admin", 6), ("ADMIN", 6),
+    ("Cán bộ đào tạo", 7), ("Can bo dao tao", 7), ("Giảng viên", 4), (None, 4),
+])
+def test_rounds_by_role_name(app, role, rounds):
+    app.config.update(PASSWORD_BCRYPT_ROUNDS=4,
+                      PASSWORD_BCRYPT_ROUNDS_BY_ROLE={"Admin": 6, "Sinh viên": 5, "Cán bộ đào tạo": 7})
+    with app.app_context():
+        assert bcrypt_rounds(role) == rounds
+
+
+def _stored(app, username):
+    with app.app_context():
+        return db.session.query(NguoiDung.MatKhauMaHoa).filter_by(TenDangNhap=username).scalar()
+
+
+def test_login_rehashes_with_role_cost(app):
+    app.config.update(PASSWORD_BCRYPT_ROUNDS=4, PASSWORD_BCRYPT_ROUNDS_BY_ROLE={"Admin": 6, "Sinh viên": 5})
+    with app.app_context():
+        db.session.add(VaiTro(MaVaiTro=3, TenVaiTro="Giảng viên"))
+        # Role 2 do import tạo tên "SinhVien"; mật khẩu lưu thô như dữ liệu cũ
+        db.session.add_all([NguoiDung(TenDangNhap=name, MatKhauMaHoa="pw", Email=f"{name}@vui.edu.vn", MaVaiTro=rid)
+                            for name, rid in (("admin", 1), ("sv1", 2), ("gv1", 3))])
+        db.session.commit()
+    client = app.test_client()
+    for name, prefix in (("admin", "$2b$06$"), ("sv1", "$2b$05$"), ("gv1", "$2b$04$")):
+        assert client.post("/login", json={"username": name, "password": "pw"}).status_code == 200
+        assert _stored(app, name).startswith(prefix)
+
+    # Đổi cost -> lần đăng nhập sau băm lại; sai mật khẩu thì không
+    app.config["PASSWORD_BCRYPT_ROUNDS_BY_ROLE"] = {"SinhVien": 7}
+    before = _stored(app, "sv1")
+    assert client.post("/login", json={"username": "sv1", "password": "sai"}).status_code == 400
+    assert _stored(app, "sv1") == before
+    assert client.post("/login", json={"username": "sv1", "password": "pw"}).status_code == 200
+    assert _stored(app, "sv1").startswith("$2b$07$")
@@ -0,0 +1,84 @@
+# tests/test_export.py
+# Xuất CSV/XLSX dạng stream: nội dung đúng như truy vấn, gửi theo từng lô.
+from __future__ import annotations
+import csv
+import io
+
+import pytest
+from openpyxl import load_workbook
+
+from conftest import add_courses, grades_csv, post_import
+from backend.models import db, LopHoc
+from backend.services import export_service
+from backend.services.export_service import GRADEBOOK_HEADER, STUDENT_HEADER, iter_csv
+
+HEADER = ["Mã sinh viên", "Họ và tên", "Lập trình C", "Cơ sở dữ liệu"]
+
+
+@pytest.fixture()
+def gradebook(app, admin_headers):
+    with app.app_context():
+        add_courses(("HP1", "Lập trình C", 3), ("HP2", "Cơ sở dữ liệu", 4))
+        db.session.add(LopHoc(MaLop="L2", TenLop="Lớp 2", MaNganh="N1"))
+        db.session.commit()
+    for lop, rows in (("L1", [["SV2", "Trần Thị Bình", 6, 5], ["SV1", "Nguyễn Văn An", 8, 7]]),
+                      ("L2", [["SV3", "Lê Văn Cường", "3,5", ""]])):
+        code, body = post_import(app, admin_headers, "grades", grades_csv(HEADER, rows),
+                                 preview="0", hocky="HK1", lop=lop)
+        assert code == 200, body
+
+
+def _get(app, headers, url, **args):
+    resp = app.test_client().get(url, headers=headers, query_string=args)
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    assert resp.is_streamed
+    return resp
+
+
+def _cell(v):
+    # Ô số đọc lại từ xlsx có thể là int (8 thay vì 8.0)
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return "" if v is None else v
+
+
+def test_iter_csv_yields_batches(monkeypatch):
+    monkeypatch.setattr(export_service, "_BATCH", 2)
+    rows = [(i, f"SV{i}", None) for i in range(5)]
+    chunks = list(iter_csv(["a", "b", "c"], rows))
+    assert len(chunks) == 3
+    assert list(csv.reader(io.StringIO("".join(chunks)))) == [["a", "b", "c"]] + [[str(i), f"SV{i}", ""] for i in range(5)]
+
+
+def test_gradebook_csv_filtered_and_ordered(app, admin_headers, gradebook):
+    resp = _get(app, admin_headers, "/api/admin/export/grades.csv", MaLop="L1")
+    assert resp.headers["Content-Disposition"] == "attachment; filename=grades.csv"
+    rows = list(csv.reader(io.StringIO(resp.get_data(as_text=True))))
+    assert rows[0] == GRADEBOOK_HEADER
+    assert [(r[0], r[4], r[7], r[9]) for r in rows[1:]] == [
+        ("SV1", "HP1", "8.0", "B+"), ("SV1", "HP2", "7.0", "B"), ("SV2", "HP1", "6.0", "C"), ("SV2", "HP2", "5.0", "D+")]
+
+    rows = list(csv.reader(io.StringIO(_get(app, admin_headers, "/api/admin/export/grades.csv").get_data(as_text=True))))
+    assert len(rows) == 6 and rows[-1][:5] == ["SV3", "Lê Văn Cường", "L2", "HK1", "HP1"]
+
+
+def test_gradebook_xlsx_matches_csv(app, admin_headers, gradebook):
+    resp = _get(app, admin_headers, "/api/admin/export/grades.xlsx")
+    ws = load_workbook(io.BytesIO(resp.get_data()), read_only=True)["KetQuaHocTap"]
+    got = [[_cell(v) for v in r] for r in ws.iter_rows(values_only=True)]
+    want = list(csv.reader(io.StringIO(_get(app, admin_headers, "/api/admin/export/grades.csv").get_data(as_text=True))))
+    assert got == [[_cell(v) for v in r] for r in want]
+
+
+def test_gradebook_unknown_format(app, admin_headers):
+    resp = app.test_client().get("/api/admin/export/grades.pdf", headers=admin_headers)
+    assert resp.status_code == 400
+
+
+def test_students_csv(app, admin_headers, gradebook):
+    rows = list(csv.reader(io.StringIO(_get(app, admin_headers, "/api/admin/export/students.csv").get_data(as_text=True))))
+    assert rows[0] == STUDENT_HEADER
+    assert sorted(rows[1:]) == [["SV1", "Nguyễn Văn An", "Lớp 1", "Kỹ thuật phần mềm"],
+                                ["SV2", "Trần Thị Bình", "Lớp 1", "Kỹ thuật phần mềm"],
+                                ["SV3", "Lê Văn Cường", "Lớp 2", "Kỹ thuật phần mềm"]]
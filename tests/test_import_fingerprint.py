@@ -0,0 +1,63 @@
+# tests/test_import_fingerprint.py
+# Gửi lại đúng tệp điểm đã nhập: bỏ qua cả tệp khi dữ liệu điểm chưa đổi; preview thì luôn xử lý.
+from __future__ import annotations
+
+import pytest
+
+from conftest import add_courses, grades_csv, post_import
+from backend.models import db, KetQuaHocTap
+from backend.services.data_version import bump_analytics, bump_students
+
+HEADER = ["Mã sinh viên", "Họ và tên", "Lập trình C"]
+FILE = grades_csv(HEADER, [["SV1", "Nguyễn Văn An", 7.5], ["SV2", "Trần Thị Bình", 3.0]])
+ARGS = {"preview": "0", "allow_update": "1", "hocky": "HK1", "lop": "L1"}
+
+
+@pytest.fixture()
+def imported(app, admin_headers):
+    with app.app_context():
+        add_courses(("HP1", "Lập trình C", 3))
+    code, body = post_import(app, admin_headers, "grades", FILE, **ARGS)
+    assert code == 200 and body["summary"]["created"] == 2, body
+
+
+@pytest.mark.usefixtures("imported")
+def test_same_file_is_skipped(app, admin_headers):
+    code, body = post_import(app, admin_headers, "grades", FILE, **ARGS)
+    assert code == 200
+    assert "same_as_import" in body["summary"]
+    assert body["summary"]["total_rows"] == 0
+
+
+@pytest.mark.usefixtures("imported")
+def test_preview_of_imported_file_is_not_skipped(app, admin_headers):
+    code, body = post_import(app, admin_headers, "grades", FILE, **{**ARGS, "preview": "1"})
+    assert code == 200
+    assert "same_as_import" not in body["summary"]
+    # tệp được đọc lại; dòng nào trùng dấu vết lần trước được báo unchanged_rows
+    assert body["summary"]["total_rows"] == 2
+    assert body["summary"]["unchanged_rows"] == 2
+
+
+@pytest.mark.usefixtures("imported")
+def test_unrelated_analytics_writes_keep_the_skip(app, admin_headers):
+    # quét cảnh báo / lưu cấu hình chỉ đổi ANALYTICS
+    with app.app_context():
+        bump_analytics()
+        db.session.commit()
+    _, body = post_import(app, admin_headers, "grades", FILE, **ARGS)
+    assert "same_as_import" in body["summary"]
+
+
+@pytest.mark.usefixtures("imported")
+def test_grade_change_since_last_run_reimports(app, admin_headers):
+    with app.app_context():
+        row = db.session.query(KetQuaHocTap).filter_by(MaSV="SV1").one()
+        row.DiemHe10 = 9.0
+        bump_students(["SV1"])
+        db.session.commit()
+    _, body = post_import(app, admin_headers, "grades", FILE, **ARGS)
+    assert "same_as_import" not in body["summary"]
+    assert body["summary"]["updated"] == 1
+    with app.app_context():
+        assert db.session.query(KetQuaHocTap.DiemHe10).filter_by(MaSV="SV1").scalar() == 7.5
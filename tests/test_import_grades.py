@@ -0,0 +1,131 @@
+# tests/test_import_grades.py
+# Nhập bảng điểm: upsert theo khóa (MaSV, MaHP, HocKy), số đếm không phụ thuộc cách chia lô.
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import add_courses, grades_csv, post_import
+from backend.models import db, KetQuaHocTap, NguoiDung, SinhVien
+from backend.utils_import import grade_points, parse_scores
+
+HEADER = ["Mã sinh viên", "Họ và tên", "Lập trình C", "Cơ sở dữ liệu"]
+
+
+@pytest.fixture()
+def courses(app):
+    with app.app_context():
+        add_courses(("HP1", "Lập trình C", 3), ("HP2", "Cơ sở dữ liệu", 4))
+
+
+def _import(app, headers, rows, header=HEADER, **args):
+    args = {"preview": "0", "hocky": "HK1", "lop": "L1", **args}
+    code, body = post_import(app, headers, "grades", grades_csv(header, rows), **args)
+    assert code == 200, body
+    return body["summary"]
+
+
+def _grades(app):
+    with app.app_context():
+        return {(r.MaSV, r.MaHP): r.DiemHe10 for r in db.session.query(KetQuaHocTap)}
+
+
+def test_upsert_counts_created_updated_unchanged(app, admin_headers, courses):
+    rows = [["SV1", "Nguyễn Văn An", 8, 7], ["SV2", "Trần Thị Bình", 6, 5]]
+    s = _import(app, admin_headers, rows)
+    assert (s["created"], s["updated"], s["unchanged"]) == (4, 0, 0)
+
+    rows[0][2] = 9
+    s = _import(app, admin_headers, rows, allow_update="1", force="1")
+    assert (s["created"], s["updated"], s["unchanged"], s["skipped"]) == (0, 1, 3, 0)
+    assert _grades(app)[("SV1", "HP1")] == 9.0
+
+
+def test_allow_update_off_keeps_stored_grades(app, admin_headers, courses):
+    _import(app, admin_headers, [["SV1", "Nguyễn Văn An", 8, 7]])
+    s = _import(app, admin_headers, [["SV1", "Nguyễn Văn An", 4, 3]], allow_update="0", force="1")
+    assert (s["created"], s["updated"], s["skipped"]) == (0, 0, 2)
+    assert _grades(app) == {("SV1", "HP1"): 8.0, ("SV1", "HP2"): 7.0}
+
+
+@pytest.mark.parametrize("allow_update, kept, counts", [("1", 6.0, (1, 1, 0)), ("0", 8.0, (1, 0, 1))])
+def test_duplicate_key_in_file_merged_in_row_order(app, admin_headers, courses, allow_update, kept, counts):
+    header = ["Mã sinh viên", "Họ và tên", "Lập trình C"]
+    s = _import(app, admin_headers, [["SV1", "Nguyễn Văn An", 8], ["SV1", "Nguyễn Văn An", 6]],
+                header=header, allow_update=allow_update)
+    assert (s["created"], s["updated"], s["skipped"]) == counts
+    assert _grades(app) == {("SV1", "HP1"): kept}
+
+
+@pytest.mark.parametrize("preview", ["1", "0"])
+def test_unknown_students_created_per_chunk(app, admin_headers, courses, preview):
+    # 2 dòng mỗi lô: SV1 lặp lại ở lô thứ ba sau khi đã được tạo ở lô đầu
+    app.config["IMPORT_CHUNK_ROWS"] = 2
+    rows = [[f"SV{i}", f"Sinh viên {i}", 5 + i % 4, 6] for i in range(1, 6)] + [["SV1", "Sinh viên 1", 9, 6]]
+    s = _import(app, admin_headers, rows, allow_update="1", preview=preview)
+    assert (s["total_rows"], s["created"], s["updated"], s["skipped"]) == (6, 10, 1, 0)
+    assert s["provisioning"]["accounts_created"] == 5
+
+    with app.app_context():
+        n_sv = db.session.query(SinhVien).count()
+        users = {u.TenDangNhap: u.MaVaiTro for u in db.session.query(NguoiDung)}
+    if preview == "1":
+        assert n_sv == 0 and users == {} and _grades(app) == {}
+        return
+    assert n_sv == 5
+    assert users == {f"SV{i}": 2 for i in range(1, 6)}
+    assert _grades(app)[("SV1", "HP1")] == 9.0
+
+    # Tài khoản mới đăng nhập được bằng mật khẩu ban đầu = MaSV
+    resp = app.test_client().post("/login", json={"username": "SV3", "password": "SV3"})
+    assert resp.status_code == 200, resp.get_json()
+    assert resp.get_json()["user"]["role"] == "SinhVien"
+
+
+# Chuẩn hoá điểm theo cột (user-003)
+
+@pytest.mark.parametrize("he10, chu, he4", [
+    (3.99, "F", 0.0), (4.0, "D", 1.0), (5.49, "D+", 1.5), (7.0, "B", 3.0), (8.49, "B+", 3.5), (8.5, "A", 4.0),
+])
+def test_grade_points_bounds(he10, chu, he4):
+    letters, points = grade_points(np.array([he10]))
+    assert (letters[0], points[0]) == (chu, he4)
+
+
+def test_parse_scores_comma_rounding_and_range():
+    v, ok = parse_scores(pd.Series(["7,255", " 8 ", "abc", "11", None, "9.5đ"]))
+    assert ok.tolist() == [True, True, False, False, False, True]
+    assert v[0] == 7.26 and v[1] == 8.0 and v[5] == 9.5
+
+
+def test_cells_normalized_and_invalid_cells_warned(app, admin_headers, courses):
+    s = _import(app, admin_headers, [["SV1", "Nguyễn Văn An", "7,25", "8.5"], ["SV2", "Trần Thị Bình", "abc", "11"]])
+    assert s["created"] == 2
+    with app.app_context():
+        got = {r.MaHP: (r.DiemHe10, r.DiemHe4, r.DiemChu) for r in db.session.query(KetQuaHocTap)}
+    assert got == {"HP1": (7.25, 3.0, "B"), "HP2": (8.5, 4.0, "A")}
+    assert any("Dòng 3: Điểm không hợp lệ 'abc'" in w for w in s["warnings"])
+    assert any("Dòng 3: Điểm không hợp lệ '11'" in w for w in s["warnings"])
+
+
+def test_tbc_mismatch_warned(app, admin_headers, courses):
+    # TBC tính lại theo tín chỉ: (8*3 + 7*4) / 7 = 7.43
+    header = HEADER + ["TBC HT10"]
+    s = _import(app, admin_headers, [["SV1", "Nguyễn Văn An", 8, 7, "7.43"], ["SV2", "Trần Thị Bình", 8, 7, "8"]],
+                header=header)
+    lech = [w for w in s["warnings"] if "(lệch)" in w]
+    assert lech == ["MaSV SV2: TBC_HT10 file = 8.0, tính lại = 7.43 (lệch)"]
+
+
+@pytest.mark.parametrize("chunk", [2, 1000])
+def test_preview_counts_carry_across_chunks(app, admin_headers, courses, chunk):
+    # Preview không ghi DB: khóa lặp lại ở lô sau phải so với giá trị lô trước như khi cả tệp là một lô
+    header = ["Mã sinh viên", "Họ và tên", "Lập trình C"]
+    _import(app, admin_headers, [["SV1", "Nguyễn Văn An", 8]], header=header)
+    app.config["IMPORT_CHUNK_ROWS"] = chunk
+    rows = [["SV1", "Nguyễn Văn An", 8], ["SV2", "Trần Thị Bình", 5], ["SV3", "Lê Văn Cường", 6],
+            ["SV1", "Nguyễn Văn An", 9], ["SV2", "Trần Thị Bình", 5]]
+    s = _import(app, admin_headers, rows, header=header, preview="1", allow_update="1", force="1")
+    assert (s["total_rows"], s["created"], s["updated"], s["unchanged"]) == (5, 2, 1, 2)
+    assert _grades(app) == {("SV1", "HP1"): 8.0}
@@ -0,0 +1,92 @@
+# tests/test_import_roster.py
+# Nhập danh sách lớp: nạp SV đã có bằng IN theo lô, ghi bằng Core; số đếm không phụ thuộc cách chia lô.
+from __future__ import annotations
+import io
+from datetime import date, datetime
+
+import pytest
+from openpyxl import Workbook
+
+from conftest import grades_csv, post_import
+from backend.models import db, LopHoc, SinhVien
+
+HEADER = ["Mã sinh viên", "Họ và tên", "Ngày sinh", "Nơi sinh"]
+
+
+def _import(app, headers, rows, header=HEADER, lop="L1", **args):
+    code, body = post_import(app, headers, "class-roster", grades_csv(header, rows),
+                             **{"preview": "0", "lop": lop, **args})
+    assert code == 200, body
+    return body["summary"]
+
+
+def _students(app):
+    with app.app_context():
+        return {s.MaSV: (s.HoTen, s.NgaySinh, s.NoiSinh, s.MaLop) for s in db.session.query(SinhVien)}
+
+
+def test_create_then_update(app, admin_headers):
+    with app.app_context():
+        db.session.add(LopHoc(MaLop="L2", TenLop="Lớp 2", MaNganh="N1"))
+        db.session.commit()
+    rows = [["SV1", "Nguyễn Văn An", "05/09/2004", "Hà Nội"], ["SV2", "Trần Thị Bình", "01-12-2004", "Huế"]]
+    s = _import(app, admin_headers, rows)
+    assert (s["total_rows"], s["created"], s["updated"], s["skipped"]) == (2, 2, 0, 0)
+    assert _students(app)["SV1"] == ("Nguyễn Văn An", date(2004, 9, 5), "Hà Nội", "L1")
+
+    # allow_update=0: SV đã có giữ nguyên
+    rows[0][3] = "Hải Phòng"
+    s = _import(app, admin_headers, rows, lop="L2")
+    assert (s["created"], s["updated"], s["skipped"]) == (0, 0, 2)
+    assert _students(app)["SV1"][2:] == ("Hà Nội", "L1")
+
+    s = _import(app, admin_headers, rows, lop="L2", allow_update="1")
+    assert (s["created"], s["updated"], s["skipped"]) == (0, 2, 0)
+    assert _students(app) == {"SV1": ("Nguyễn Văn An", date(2004, 9, 5), "Hải Phòng", "L2"),
+                              "SV2": ("Trần Thị Bình", date(2004, 12, 1), "Huế", "L2")}
+
+
+def test_excel_dates(app, admin_headers):
+    # Ô ngày dạng datetime và số serial của Excel (38235 = 05/09/2004)
+    wb = Workbook()
+    ws = wb.active
+    ws.append(HEADER)
+    ws.append(["SV1", "Nguyễn Văn An", datetime(2004, 9, 5), "Hà Nội"])
+    ws.append(["SV2", "Trần Thị Bình", 38235, "Huế"])
+    ws.append(["SV3", "Lê Văn Cường", "01/12/2004", "Huế"])
+    buf = io.BytesIO()
+    wb.save(buf)
+    code, body = post_import(app, admin_headers, "class-roster", buf.getvalue(), filename="lop.xlsx",
+                             preview="0", lop="L1")
+    assert code == 200, body
+    got = {m: v[1] for m, v in _students(app).items()}
+    assert got == {"SV1": date(2004, 9, 5), "SV2": date(2004, 9, 5), "SV3": date(2004, 12, 1)}
+
+
+def test_header_repeats_and_incomplete_rows(app, admin_headers):
+    rows = [["SV1", "Nguyễn Văn An", "", ""], HEADER, ["SV2", "", "", ""], ["", "", "", ""], ["SV3", "Lê Văn Cường", "", ""]]
+    s = _import(app, admin_headers, rows)
+    assert (s["total_rows"], s["created"], s["skipped"]) == (3, 2, 2)
+    assert s["warnings"] == ["Dòng 3: bỏ qua vì trùng tiêu đề cột", "Dòng 4: Thiếu Mã SV hoặc Họ tên"]
+    assert set(_students(app)) == {"SV1", "SV3"}
+
+
+@pytest.mark.parametrize("preview", ["1", "0"])
+def test_repeated_student_across_chunks(app, admin_headers, preview):
+    # 2 dòng mỗi lô: SV1 lặp lại ở lô thứ hai với tên mới
+    app.config["IMPORT_CHUNK_ROWS"] = 2
+    rows = [["SV1", "Nguyễn Văn An", "", ""], ["SV2", "Trần Thị Bình", "", ""],
+            ["SV1", "Nguyễn Văn Ân", "", ""], ["SV3", "Lê Văn Cường", "", ""]]
+    s = _import(app, admin_headers, rows, allow_update="1", preview=preview)
+    assert (s["total_rows"], s["created"], s["updated"], s["skipped"]) == (4, 3, 1, 0)
+    assert s["provisioning"]["accounts_created"] == 3
+    if preview == "0":
+        assert _students(app)["SV1"][0] == "Nguyễn Văn Ân"
+
+
+def test_missing_columns_and_unknown_class(app, admin_headers):
+    code, body = post_import(app, admin_headers, "class-roster", grades_csv(HEADER[:2], [["SV1", "An"]]),
+                             preview="0", lop="L1")
+    assert code == 400 and body["warnings"] == ["Thiếu cột: Ngày sinh, Nơi sinh"]
+    code, body = post_import(app, admin_headers, "class-roster", grades_csv(HEADER, []), preview="0", lop="X9")
+    assert code == 400
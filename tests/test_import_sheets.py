@@ -0,0 +1,73 @@
+# tests/test_import_sheets.py
+# Workbook nhiều sheet: đọc + chuẩn hoá song song, ghi DB theo thứ tự sheet -> kết quả như đọc tuần tự.
+from __future__ import annotations
+import io
+
+import pytest
+from openpyxl import Workbook
+
+from conftest import _clear_caches, add_courses, post_import, seeded_app
+from backend.models import db, KetQuaHocTap
+
+HEADER = ["Mã sinh viên", "Họ và tên", "Lập trình C", "Cơ sở dữ liệu"]
+SHEETS = {
+    "L1": [HEADER, ["SV1", "Nguyễn Văn An", 8, 7], ["SV2", "Trần Thị Bình", "abc", 5], ["SV4", "Phạm Văn Dũng", 6, 6]],
+    "Ghi chú": [["Nội dung"], ["Không phải bảng điểm"]],
+    # SV1 lặp lại ở sheet sau: giá trị của sheet sau được ghi
+    "L2": [["BẢNG ĐIỂM LỚP L2"], HEADER, ["SV3", "Lê Văn Cường", 9, 9], ["SV1", "Nguyễn Văn An", 6, 7]],
+}
+
+
+def _workbook() -> bytes:
+    wb = Workbook()
+    wb.remove(wb.active)
+    for name, rows in SHEETS.items():
+        ws = wb.create_sheet(name)
+        for r in rows:
+            ws.append(r)
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _run(app, headers, workers, data, **args):
+    app.config.update(IMPORT_PARSE_WORKERS=workers, IMPORT_CHUNK_ROWS=2)
+    code, body = post_import(app, headers, "grades", data, filename="diem.xlsx",
+                             hocky="HK1", lop="L1", allow_update="1", **args)
+    assert code == 200, body
+    s = body["summary"]
+    s.pop("provisioning")
+    with app.app_context():
+        grades = {(r.MaSV, r.MaHP): r.DiemHe10 for r in db.session.query(KetQuaHocTap)}
+    return s, grades
+
+
+@pytest.fixture()
+def courses(app):
+    with app.app_context():
+        add_courses(("HP1", "Lập trình C", 3), ("HP2", "Cơ sở dữ liệu", 4))
+
+
+@pytest.mark.parametrize("preview", ["1", "0"])
+def test_parallel_parse_matches_sequential(app, admin_headers, courses, tmp_path, preview):
+    # Cùng một bytes cho hai lần nhập: workbook ghi thời điểm tạo nên file_hash đổi nếu dựng lại
+    data = _workbook()
+    seq, seq_grades = _run(app, admin_headers, 1, data, preview=preview)
+
+    # Cùng tệp trên DB thứ hai, đọc bằng 2 process
+    (tmp_path / "par").mkdir()
+    _clear_caches()
+    other = seeded_app(tmp_path / "par")
+    with other.app_context():
+        add_courses(("HP1", "Lập trình C", 3), ("HP2", "Cơ sở dữ liệu", 4))
+    par, par_grades = _run(other, admin_headers, 2, data, preview=preview)
+
+    assert par == seq
+    assert par_grades == seq_grades
+    assert [st["sheet"] for st in seq["sheets"]] == ["L1", "Ghi chú", "L2"]
+    assert ([(st["total_rows"], st["created"], st["updated"], st["unchanged"]) for st in seq["sheets"]]
+            == [(3, 5, 0, 0), (0, 0, 0, 0), (2, 2, 1, 1)])
+    assert "[Ghi chú] Không có cột Mã sinh viên → bỏ qua sheet" in seq["warnings"]
+    assert "[L1] Dòng 3: Điểm không hợp lệ 'abc' ở môn 'Lập trình C'" in seq["warnings"]
+    if preview == "0":
+        assert seq_grades[("SV1", "HP1")] == 6.0 and len(seq_grades) == 7
@@ -0,0 +1,69 @@
+# tests/test_jobs.py
+# Job nền: quyền kiểm tra lúc gửi, job chạy với danh tính người gửi kể cả khi token đã hết hạn.
+from __future__ import annotations
+import os
+import threading
+import time
+from datetime import timedelta
+
+from flask_jwt_extended import create_access_token
+
+from conftest import add_courses, grades_csv, post_import
+from backend.models import db, ImportLog, Job
+from backend.services import jobs
+
+
+def _wait(app, job_id, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with app.app_context():
+            job = jobs.get_job(job_id)
+        if job["Status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} chưa xong")
+
+
+def test_async_import_runs_after_token_expiry(app):
+    with app.app_context():
+        add_courses(("HP1", "Lập trình C", 3))
+        token = create_access_token(identity="1", additional_claims={"role": "Admin"},
+                                    expires_delta=timedelta(seconds=1))
+        # Chiếm luồng job duy nhất để job nhập điểm phải chờ quá hạn token
+        gate = threading.Event()
+        blocker = jobs.submit("block", lambda: gate.wait(10) and {})
+    data = grades_csv(["Mã sinh viên", "Họ và tên", "Lập trình C"], [["SV1", "Nguyễn Văn An", 8]])
+    code, body = post_import(app, {"Authorization": f"Bearer {token}"}, "grades", data,
+                             preview="0", hocky="HK1", lop="L1", **{"async": "1"})
+    assert code == 202, body
+    time.sleep(2.2)
+    gate.set()
+    _wait(app, blocker)
+    job = _wait(app, body["job_id"])
+    assert job["Status"] == "done", job
+    assert job["CreatedBy"] == "1"
+    assert job["Result"]["body"]["summary"]["created"] == 1
+    with app.app_context():
+        assert db.session.query(ImportLog.Actor).filter_by(Endpoint="/api/admin/import/grades").scalar() == "1"
+
+
+def test_async_scan_requires_admin_at_submit(app):
+    with app.app_context():
+        token = create_access_token(identity="2", additional_claims={"role": "SinhVien"})
+    resp = app.test_client().post("/api/admin/warning/scan?async=1", headers={"Authorization": f"Bearer {token}"})
+    assert resp.status_code == 403
+    with app.app_context():
+        assert db.session.query(Job).count() == 0
+
+
+def test_job_of_another_live_process_is_not_marked_interrupted(app):
+    host = jobs._WORKER.rpartition(":")[0]
+    with app.app_context():
+        # process cha (pytest runner) còn sống; job "của" process này mà không chạy ở đây -> đã gián đoạn
+        db.session.add(Job(Id="x" * 32, Kind="warning_scan", Status="running", Worker=f"{host}:{os.getppid()}"))
+        db.session.add(Job(Id="y" * 32, Kind="warning_scan", Status="running", Worker=jobs._WORKER))
+        db.session.commit()
+        other = jobs.get_job("x" * 32)
+        mine = jobs.get_job("y" * 32)
+    assert other["Status"] == "running"
+    assert mine["Status"] == "failed"
@@ -0,0 +1,35 @@
+# tests/test_migrations.py
+# Migration chạy trên app.db cũ: không được xoá mất dữ liệu khi dựng unique index.
+from __future__ import annotations
+
+from conftest import make_app
+from backend.migrations import upgrade, schema_version, _M001_BACKUP
+from backend.models import db
+
+
+def test_m001_moves_duplicate_grades_to_backup_table(tmp_path):
+    app = make_app(tmp_path)
+    with app.app_context():
+        # Lược đồ "cũ": chưa có unique index, còn bản ghi trùng khóa (MaSV, MaHP, HocKy)
+        db.create_all()
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('DROP INDEX "ux_KetQuaHocTap_MaSV_MaHP_HocKy"')
+            conn.exec_driver_sql(
+                "INSERT INTO KetQuaHocTap (MaKQ, HocKy, DiemHe10, DiemHe4, DiemChu, LaDiemCuoiCung, TinhDiemTichLuy, "
+                "MaSV, MaHP) VALUES (1, 'HK1', 3.0, 0.0, 'F', 1, 1, 'SV1', 'HP1'), "
+                "(2, 'HK1', 6.0, 2.0, 'C', 1, 1, 'SV1', 'HP1'), (3, 'HK1', 8.0, 3.5, 'B+', 1, 1, 'SV1', 'HP2')")
+
+        assert upgrade(db.engine) == schema_version(db.engine) >= 1
+        with db.engine.connect() as conn:
+            kept = conn.exec_driver_sql("SELECT MaKQ FROM KetQuaHocTap ORDER BY MaKQ").scalars().all()
+            moved = conn.exec_driver_sql(f'SELECT MaKQ, DiemHe10 FROM "{_M001_BACKUP}"').all()
+            indexes = {r[1] for r in conn.exec_driver_sql('PRAGMA index_list("KetQuaHocTap")')}
+    assert kept == [2, 3]
+    assert moved == [(1, 3.0)]
+    assert "ux_KetQuaHocTap_MaSV_MaHP_HocKy" in indexes
+
+
+def test_m001_without_duplicates_creates_no_backup_table(app):
+    with app.app_context():
+        tables = {r[0] for r in db.session.execute(db.text("SELECT name FROM sqlite_master WHERE type = 'table'"))}
+    assert _M001_BACKUP not in tables
@@ -0,0 +1,68 @@
+# tests/test_provisioning.py
+# Tài khoản SV tạo hàng loạt: băm pbkdf2 song song theo đúng thứ tự, một executemany, băm lại khi đăng nhập.
+from __future__ import annotations
+
+from passlib.hash import pbkdf2_sha256
+
+from conftest import grades_csv, post_import
+from backend.models import db, NguoiDung
+from backend.services.auth_service import hash_provisioned_many
+
+ROSTER = ["Mã sinh viên", "Họ và tên", "Ngày sinh", "Nơi sinh"]
+
+
+def _roster(n, start=1):
+    return [[f"SV{i:03d}", f"Sinh viên {i}", "01/02/2004", "Hà Nội"] for i in range(start, start + n)]
+
+
+def test_parallel_hashes_keep_order(app):
+    passwords = [f"SV{i:03d}" for i in range(100)]
+    with app.app_context():
+        hashes, workers = hash_provisioned_many(passwords, workers=2)
+    assert workers == 2
+    assert all(pbkdf2_sha256.verify(p, h) for p, h in zip(passwords, hashes))
+    assert len(set(hashes)) == len(hashes)
+    assert pbkdf2_sha256.from_string(hashes[0]).rounds == 1000
+
+
+def test_small_batches_hash_in_process(app):
+    with app.app_context():
+        hashes, workers = hash_provisioned_many(["a", "b"], workers=4)
+    assert workers == 1 and [pbkdf2_sha256.verify(p, h) for p, h in zip("ab", hashes)] == [True, True]
+
+
+def test_roster_provisions_accounts_in_parallel(app, admin_headers):
+    app.config["PASSWORD_HASH_WORKERS"] = 2
+    data = grades_csv(ROSTER, _roster(70))
+    code, body = post_import(app, admin_headers, "class-roster", data, preview="1", lop="L1")
+    assert code == 200, body
+    assert body["summary"]["provisioning"]["accounts_created"] == 70
+    with app.app_context():
+        assert db.session.query(NguoiDung).count() == 0
+
+    code, body = post_import(app, admin_headers, "class-roster", data, preview="0", lop="L1")
+    assert code == 200, body
+    prov = body["summary"]["provisioning"]
+    assert (prov["accounts_created"], prov["hash_workers"]) == (70, 2)
+    with app.app_context():
+        users = {u.TenDangNhap: u for u in db.session.query(NguoiDung)}
+        assert len(users) == 70
+        u = users["SV042"]
+        assert (u.Email, u.MaVaiTro) == ("sv042@vui.edu.vn", 2)
+        assert pbkdf2_sha256.verify("SV042", u.MatKhauMaHoa)
+
+    # Nhập lại: không tạo thêm tài khoản
+    code, body = post_import(app, admin_headers, "class-roster", grades_csv(ROSTER, _roster(72)), preview="0", lop="L1")
+    assert code == 200, body
+    assert body["summary"]["provisioning"]["accounts_created"] == 2
+
+
+def test_first_login_rehashes_to_bcrypt(app, admin_headers):
+    app.config["PASSWORD_BCRYPT_ROUNDS"] = 4
+    code, body = post_import(app, admin_headers, "class-roster", grades_csv(ROSTER, _roster(1)), preview="0", lop="L1")
+    assert code == 200, body
+    resp = app.test_client().post("/login", json={"username": "SV001", "password": "SV001"})
+    assert resp.status_code == 200, resp.get_json()
+    with app.app_context():
+        stored = db.session.query(NguoiDung.MatKhauMaHoa).filter_by(TenDangNhap="SV001").scalar()
+    assert stored.startswith("$2b$04$")
@@ -0,0 +1,27 @@
+# tests/test_routes.py
+# admin_crud đăng ký trước create_app: URL trùng trong app.py không bao giờ được gọi -> không được có bản sao.
+from __future__ import annotations
+from collections import defaultdict
+
+import pytest
+
+
+@pytest.mark.parametrize("rule, method", [
+    ("/api/admin/dashboard-analytics", "GET"),
+    ("/api/admin/configs", "GET"),
+    ("/api/admin/configs", "PUT"),
+    ("/api/admin/warning/scan", "POST"),
+])
+def test_admin_routes_have_a_single_handler(app, rule, method):
+    handlers = defaultdict(list)
+    for r in app.url_map.iter_rules():
+        for m in r.methods:
+            handlers[(r.rule, m)].append(r.endpoint)
+    assert len(handlers[(rule, method)]) == 1
+    assert handlers[(rule, method)][0].startswith("admin_crud.")
+
+
+def test_configs_put_rejects_unknown_retake_policy(app, admin_headers):
+    resp = app.test_client().put("/api/admin/configs", headers=admin_headers,
+                                 json={"values": {"RETAKE_POLICY_DEFAULT": "newest"}})
+    assert resp.status_code == 400
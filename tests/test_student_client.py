@@ -0,0 +1,60 @@
+# tests/test_student_client.py
+# APIClient.fetch_student_data: gửi If-None-Match, 304 trả lại bản đã cache; caller sửa dữ liệu không ảnh hưởng cache.
+from __future__ import annotations
+
+import pytest
+
+from student.api import client as client_mod
+from student.api.client import APIClient
+
+
+class _Resp:
+    def __init__(self, status, body=None, etag=None):
+        self.status_code, self._body = status, body
+        self.headers = {"ETag": etag} if etag else {}
+        self.ok = status < 400
+        self.text = ""
+
+    def json(self):
+        return self._body
+
+
+@pytest.fixture()
+def server(monkeypatch):
+    # Trả 304 khi If-None-Match khớp ETag hiện tại
+    state = {"etag": '"v1"', "body": {"SinhVien": {"MaSV": "SV1"}, "KetQuaHocTap": [{"MaHP": "HP1", "DiemHe10": 8.0}]},
+             "sent": []}
+
+    def _get(url, headers=None, timeout=None):
+        state["sent"].append(headers.get("If-None-Match"))
+        if headers.get("If-None-Match") == state["etag"]:
+            return _Resp(304)
+        return _Resp(200, state["body"], state["etag"])
+
+    monkeypatch.setattr(client_mod.requests, "get", _get)
+    monkeypatch.setattr(APIClient, "_student_cache", {})
+    return state
+
+
+def test_not_modified_returns_cached_copy(server):
+    api = APIClient("http://test")
+    ok, data = api.fetch_student_data("tok")
+    assert ok
+    # View sửa dữ liệu nhận được (kể cả lần đầu, ngay từ 200)
+    data["KetQuaHocTap"][0]["DiemHe10"] = 0.0
+    data["SinhVien"]["MaSV"] = "X"
+
+    ok, again = APIClient("http://test").fetch_student_data("tok")
+    assert ok and server["sent"] == [None, '"v1"']
+    assert again == {"SinhVien": {"MaSV": "SV1"}, "KetQuaHocTap": [{"MaHP": "HP1", "DiemHe10": 8.0}]}
+    again["KetQuaHocTap"].clear()
+    assert APIClient("http://test").fetch_student_data("tok")[1]["KetQuaHocTap"]
+
+
+def test_new_version_replaces_cache(server):
+    api = APIClient("http://test")
+    api.fetch_student_data("tok")
+    server["etag"], server["body"] = '"v2"', {"SinhVien": {"MaSV": "SV1"}, "KetQuaHocTap": []}
+    ok, data = api.fetch_student_data("tok")
+    assert ok and data["KetQuaHocTap"] == []
+    assert APIClient._student_cache == {("http://test", "tok"): ('"v2"', data)}
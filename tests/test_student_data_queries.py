@@ -0,0 +1,87 @@
+# tests/test_student_data_queries.py
+# /api/student/data dựng payload bằng số truy vấn cố định: không tăng theo số điểm hay số dòng CTĐT.
+#   python -m pytest -q tests/test_student_data_queries.py
+from __future__ import annotations
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.app import create_app
+from backend.migrations import init_db
+from backend.models import (
+    db, Khoa, NganhHoc, LopHoc, VaiTro, NguoiDung, SinhVien, HocPhan, ChuongTrinhDaoTao, KetQuaHocTap,
+)
+from backend.services import student_service
+from backend.services.data_version import bump_global, bump_students
+
+
+@pytest.fixture()
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}", "AUDIT_ASYNC": False,
+                      "JWT_SECRET_KEY": "test-jwt-secret-key-with-32-bytes!"})
+    with app.app_context():
+        init_db()
+        db.session.add_all([
+            Khoa(MaKhoa="K1", TenKhoa="Công nghệ thông tin"),
+            NganhHoc(MaNganh="N1", TenNganh="Kỹ thuật phần mềm", MaKhoa="K1"),
+            LopHoc(MaLop="L1", TenLop="Lớp 1", MaNganh="N1"),
+            VaiTro(MaVaiTro=1, TenVaiTro="Sinh viên"),
+            NguoiDung(MaNguoiDung=1, TenDangNhap="SV001", MatKhauMaHoa="x", Email="sv001@vui.edu.vn", MaVaiTro=1),
+            SinhVien(MaSV="SV001", HoTen="Nguyễn Văn A", MaLop="L1", MaNguoiDung=1),
+        ])
+        db.session.commit()
+    yield app
+    student_service._PAYLOADS.clear()
+
+
+def _grow(n_courses: int):
+    # Thêm học phần đến đủ n_courses, mỗi học phần một dòng CTĐT và một điểm
+    have = db.session.query(HocPhan).count()
+    for i in range(have, n_courses):
+        mahp = f"HP{i:04d}"
+        db.session.add(HocPhan(MaHP=mahp, TenHP=f"Học phần {i}", SoTinChi=3))
+        db.session.add(ChuongTrinhDaoTao(MaNganh="N1", MaHP=mahp, HocKy=i % 8 + 1))
+        db.session.add(KetQuaHocTap(MaSV="SV001", MaHP=mahp, HocKy=f"HK{i % 8 + 1}", DiemHe10=7.0,
+                                    DiemHe4=3.0, DiemChu="B"))
+    bump_global()
+    bump_students(["SV001"])
+    db.session.commit()
+
+
+def _count_queries(app, client, headers):
+    n = {"q": 0}
+
+    def _on_execute(*args):
+        n["q"] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", _on_execute)
+    try:
+        resp = client.get("/api/student/data", headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", _on_execute)
+    assert resp.status_code == 200
+    return n["q"], resp.get_json()
+
+
+def test_student_data_query_count_is_constant(app):
+    from flask_jwt_extended import create_access_token
+    with app.app_context():
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+    client = app.test_client()
+
+    counts = []
+    for n_courses in (1, 10, 200):
+        with app.app_context():
+            _grow(n_courses)
+        q, body = _count_queries(app, client, headers)
+        assert len(body["KetQuaHocTap"]) == n_courses
+        assert len(body["ChuongTrinhDaoTao"]) == n_courses
+        counts.append(q)
+    assert len(set(counts)) == 1, counts
@@ -0,0 +1,37 @@
+# tests/test_student_search.py
+# Tìm SV ở /api/admin/students?q=: tên không dấu qua FTS5, mã SV khớp cả chuỗi con.
+from __future__ import annotations
+
+import pytest
+
+from backend.models import db, NguoiDung, SinhVien
+
+
+@pytest.fixture()
+def students(app):
+    with app.app_context():
+        for i, (masv, ten) in enumerate([("SV1", "Nguyễn Văn An"), ("SV10", "Trần Thị Bình"),
+                                          ("K65SV2", "Đặng Minh Đức")], start=10):
+            db.session.add(NguoiDung(MaNguoiDung=i, TenDangNhap=masv, MatKhauMaHoa="x",
+                                    Email=f"{masv}@vui.edu.vn", MaVaiTro=2))
+            db.session.add(SinhVien(MaSV=masv, HoTen=ten, MaLop="L1", MaNguoiDung=i))
+        db.session.commit()
+
+
+def _search(app, headers, q):
+    resp = app.test_client().get("/api/admin/students", query_string={"q": q}, headers=headers)
+    assert resp.status_code == 200
+    return sorted(it["MaSV"] for it in resp.get_json()["items"])
+
+
+@pytest.mark.usefixtures("students")
+@pytest.mark.parametrize("q, expected", [
+    ("V1", ["SV1", "SV10"]),       # chuỗi con giữa mã SV
+    ("65sv", ["K65SV2"]),
+    ("nguyen an", ["SV1"]),        # không dấu, tiền tố từng từ
+    ("dang duc", ["K65SV2"]),      # đ -> d
+    ("binh", ["SV10"]),
+    ("khong co", []),
+])
+def test_search_matches_name_tokens_and_masv_substrings(app, admin_headers, q, expected):
+    assert _search(app, admin_headers, q) == expected
@@ -0,0 +1,69 @@
+# tests/test_subject_alias.py
+# Khớp cột điểm -> học phần: alias nhập tay, mã/tên chính xác, alias đã học, rồi fuzzy qua chỉ mục trigram.
+from __future__ import annotations
+
+from conftest import add_courses, grades_csv, post_import
+from backend.importer import _Course, _norm_subject_name, _resolve_subject_columns
+from backend.models import db, KetQuaHocTap, SubjectAlias
+from backend.services.course_matcher import CourseIndex
+
+C = _Course("HP1", "Lập trình C", 3, True)
+OOP = _Course("HP2", "Lập trình hướng đối tượng", 4, True)
+BY_MA = {"HP1": C, "HP2": OOP}
+BY_TEN = {_norm_subject_name(h.TenHP): h for h in BY_MA.values()}
+
+
+def _resolve(cols, aliases=None):
+    resolved, hints = _resolve_subject_columns(cols, BY_MA, BY_TEN, aliases or {})
+    return {col: (h.MaHP if h else None, source) for col, (h, _, source) in resolved.items()}, hints
+
+
+def test_exact_code_and_name():
+    got, hints = _resolve(["hp2", "Lập trình C", "LT C"])
+    assert got == {"hp2": ("HP2", "exact"), "Lập trình C": ("HP1", "exact"), "LT C": ("HP1", "exact")}
+    assert hints == []
+
+
+def test_fuzzy_match_emits_hint():
+    got, hints = _resolve(["Lập trình hướng đối tượg", "Triết học Mác"])
+    assert got == {"Lập trình hướng đối tượg": ("HP2", "fuzzy"), "Triết học Mác": (None, None)}
+    assert hints == ["[gợi ý] Cột 'Lập trình hướng đối tượg' khớp gần với học phần 'Lập trình hướng đối tượng' (fuzzy)"]
+
+
+def test_alias_order():
+    # Alias nhập tay thắng cả tên chính xác; alias đã học chỉ dùng khi không khớp chính xác
+    aliases = {"laptrinhc": ("HP2", "manual"), "trietmac": ("HP1", "fuzzy"), "oop": ("HP2", "fuzzy")}
+    got, hints = _resolve(["Lập trình C", "Triết Mác", "OOP"], aliases)
+    assert got == {"Lập trình C": ("HP2", "alias"), "Triết Mác": ("HP1", "alias"), "OOP": ("HP2", "alias")}
+    assert hints == []
+
+
+def test_course_index_threshold():
+    index = CourseIndex([("laptrinhhuongđoituong", "HP2"), ("cosodulieu", "HP3")])
+    assert index.lookup("laptrinhhuongđoituog") == "HP2"
+    assert index.lookup("cosodulieu") == "HP3"
+    assert index.lookup("triethocmac") is None
+
+
+def test_fuzzy_remembered_and_manual_alias_kept(app, admin_headers):
+    with app.app_context():
+        add_courses(("HP1", "Lập trình C", 3), ("HP2", "Lập trình hướng đối tượng", 4))
+    client = app.test_client()
+    resp = client.put("/api/admin/subject-aliases", json={"Header": "Tin học ĐC", "MaHP": "HP1"}, headers=admin_headers)
+    assert resp.status_code == 200, resp.get_json()
+
+    data = grades_csv(["Mã sinh viên", "Họ và tên", "Lập trình hướng đối tượg", "Tin học ĐC"],
+                      [["SV1", "Nguyễn Văn An", 8, 7]])
+    code, body = post_import(app, admin_headers, "grades", data, preview="0", hocky="HK1", lop="L1")
+    assert code == 200, body
+    assert any(w.startswith("[gợi ý]") for w in body["warnings"])
+    with app.app_context():
+        aliases = {a.RawKey: (a.MaHP, a.Source) for a in db.session.query(SubjectAlias)}
+        grades = {r.MaHP: r.DiemHe10 for r in db.session.query(KetQuaHocTap)}
+    assert aliases == {"laptrinhhuongđoituog": ("HP2", "fuzzy"), "tinhocđc": ("HP1", "manual")}
+    assert grades == {"HP2": 8.0, "HP1": 7.0}
+
+    # Lần sau cột đó khớp qua alias đã học, không còn gợi ý fuzzy
+    code, body = post_import(app, admin_headers, "grades", data, preview="1", hocky="HK1", lop="L1")
+    assert code == 200, body
+    assert not any(w.startswith("[gợi ý]") for w in body["warnings"])
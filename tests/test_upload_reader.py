@@ -0,0 +1,145 @@
+# tests/test_upload_reader.py
+# Đọc tệp tải lên từng lô: chỉ số dòng giữ theo cả tệp (và dòng tiêu đề) nên "Dòng i+2" đúng dòng trên sheet.
+from __future__ import annotations
+import io
+import os
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+from werkzeug.datastructures import FileStorage
+
+from conftest import add_courses, grades_csv, post_import
+from backend.services import upload_reader
+from backend.services.upload_reader import iter_frames, iter_upload
+from backend.utils_import import detect_header_row
+
+TITLE = [["TRƯỜNG ĐẠI HỌC VUI"], ["BẢNG ĐIỂM LỚP L1"]]
+HEADER = ["Mã sinh viên", "Họ và tên", "Lập trình C"]
+ROWS = [[f"SV{i}", f"Sinh viên {i}", 5 + i % 5] for i in range(1, 6)]
+
+
+def _xlsx(rows) -> bytes:
+    wb = Workbook()
+    ws = wb.active
+    for r in rows:
+        ws.append(r)
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _write(tmp_path, name, data: bytes) -> str:
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize("name, engine", [("a.csv", None), ("a.xlsx", "openpyxl"), ("a.xlsx", "calamine"),
+                                          # .xls không có calamine: đọc cả sheet một lần (pandas tự nhận định dạng)
+                                          ("a.xls", "openpyxl")])
+@pytest.mark.parametrize("title", [False, True])
+def test_chunks_keep_sheet_row_numbers(tmp_path, name, engine, title):
+    rows = (TITLE if title else []) + [HEADER] + ROWS
+    data = grades_csv(rows[0], rows[1:]) if name.endswith(".csv") else _xlsx(rows)
+    path = _write(tmp_path, name, data)
+    frames = list(iter_frames(path, name, size=2, engine=engine, dtype=str, header=detect_header_row))
+
+    if name.endswith(".xls"):
+        assert len(frames) == 1
+    else:
+        assert [len(df) for df in frames] == [2, 2, 1]
+    df = pd.concat(frames)
+    assert list(df.columns) == HEADER
+    assert df["Mã sinh viên"].tolist() == [r[0] for r in ROWS]
+    # Dòng trên sheet (đếm từ 1) = chỉ số + 2
+    first = len(rows) - len(ROWS) + 1
+    assert [i + 2 for i in df.index] == list(range(first, first + len(ROWS)))
+
+
+def test_iter_upload_removes_spool(tmp_path, monkeypatch):
+    made = []
+    real = upload_reader.spool
+    monkeypatch.setattr(upload_reader, "spool", lambda *a, **kw: made.append(real(*a, **kw)) or made[-1])
+    storage = FileStorage(io.BytesIO(grades_csv(HEADER, ROWS)), filename="a.csv")
+    frames = iter_upload(storage, size=2)
+    next(frames)
+    assert os.path.exists(made[0])
+    frames.close()
+    assert not os.path.exists(made[0])
+
+
+def test_read_error_is_value_error(tmp_path):
+    path = _write(tmp_path, "a.xlsx", b"not a workbook")
+    with pytest.raises(ValueError, match="Lỗi đọc file"):
+        next(iter_frames(path, "a.xlsx", engine="openpyxl"))
+
+
+def test_grade_warnings_point_at_sheet_rows(app, admin_headers):
+    # Bảng điểm có 2 dòng tiêu đề trường/lớp, đọc 2 dòng mỗi lô: dòng 7 trên sheet là SV4
+    with app.app_context():
+        add_courses(("HP1", "Lập trình C", 3))
+    app.config["IMPORT_CHUNK_ROWS"] = 2
+    rows = TITLE + [HEADER] + ROWS
+    rows[6] = ["SV4", "Sinh viên 4", "abc"]
+    code, body = post_import(app, admin_headers, "grades", _xlsx(rows), filename="l1.xlsx",
+                             preview="1", hocky="HK1", lop="L1")
+    assert code == 200, body
+    assert [w for w in body["warnings"] if "Dòng" in w] == ["Dòng 7: Điểm không hợp lệ 'abc' ở môn 'Lập trình C'"]
+
+
+# Dò dòng tiêu đề và engine đọc XLSX (user-023)
+
+@pytest.mark.parametrize("rows, want", [
+    ([["Mã SV", "Họ tên"], ["SV1", "An"]], 0),
+    ([["BẢNG ĐIỂM"], [], ["STT", "MSSV", "Họ tên"], ["1", "SV1", "An"]], 2),
+    # Không có tên cột quen thuộc: dòng nhiều ô nhất (dòng đầu nếu hoà)
+    ([["Tiêu đề", None], ["a", "b", "c"], ["1", "2", "3"]], 1),
+    ([[None, " "], ["x", float("nan")]], 1),
+])
+def test_detect_header_row(rows, want):
+    assert detect_header_row(rows) == want
+
+
+def test_xlsx_engine_choice(app, monkeypatch):
+    auto = "calamine" if upload_reader.CalamineWorkbook is not None else "openpyxl"
+    assert upload_reader.xlsx_engine("openpyxl") == "openpyxl"
+    assert upload_reader.xlsx_engine("CALAMINE") == auto
+    assert upload_reader.xlsx_engine("khác") == auto
+    with app.app_context():
+        app.config["IMPORT_XLSX_ENGINE"] = "openpyxl"
+        assert upload_reader.xlsx_engine() == "openpyxl"
+    # Chưa cài python-calamine -> openpyxl
+    monkeypatch.setattr(upload_reader, "CalamineWorkbook", None)
+    assert upload_reader.xlsx_engine("calamine") == upload_reader.xlsx_engine() == "openpyxl"
+
+
+_NO_CALAMINE = pytest.mark.skipif(upload_reader.CalamineWorkbook is None, reason="chưa cài python-calamine")
+
+
+@_NO_CALAMINE
+def test_engines_read_the_same_frames(tmp_path):
+    from datetime import datetime
+    rows = TITLE + [["Mã sinh viên", "Điểm", "Điểm", None, "Ngày"],
+                    ["SV1", 8, 7.25, None, datetime(2024, 6, 1)],
+                    ["SV2", None, "", "x", datetime(2024, 6, 2, 8, 30)]]
+    path = _write(tmp_path, "a.xlsx", _xlsx(rows))
+    got = {engine: pd.concat(iter_frames(path, "a.xlsx", engine=engine, size=1, header=detect_header_row))
+           for engine in ("openpyxl", "calamine")}
+    pd.testing.assert_frame_equal(got["openpyxl"], got["calamine"])
+    assert list(got["openpyxl"].columns) == ["Mã sinh viên", "Điểm", "Điểm.1", "Unnamed: 3", "Ngày"]
+    assert got["openpyxl"].iloc[0].tolist()[:3] == ["SV1", 8, 7.25]
+
+
+@_NO_CALAMINE
+def test_sheet_names_skip_hidden(tmp_path):
+    wb = Workbook()
+    wb.active.title = "L1"
+    wb.create_sheet("An").sheet_state = "hidden"
+    wb.create_sheet("L2")
+    buf = io.BytesIO()
+    wb.save(buf)
+    path = _write(tmp_path, "a.xlsx", buf.getvalue())
+    for engine in ("openpyxl", "calamine"):
+        assert upload_reader.sheet_names(path, "a.xlsx", engine) == ["L1", "L2"]
+    assert upload_reader.sheet_names(path, "a.csv") == [None]
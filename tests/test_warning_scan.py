@@ -0,0 +1,206 @@
+# tests/test_warning_scan.py
+# Quét cảnh báo trên StudentAggregate so với quét cũ (duyệt mọi dòng điểm, trượt = DiemHe10 < 4 hoặc F).
+from __future__ import annotations
+
+import pytest
+
+from conftest import add_courses, grades_csv, post_import
+from backend.models import (
+    db, LopHoc, NguoiDung, SinhVien, HocPhan, KetQuaHocTap, WarningRule, WarningCase, WarningScanDirty,
+)
+from backend.services.aggregate_service import apply_retake_policy, refresh_student_aggregates
+from backend.warning_scan import compile_rule, mark_students_dirty, scan_all_warnings, sync_cases
+
+RULES = {"GPA_BELOW": 2.0, "AVG_BELOW": 5.0, "FAIL_COUNT": 1, "DEBT_OVER": 3}
+
+# (MaSV, MaHP, HocKy, DiemHe10, DiemHe4, DiemChu)
+NO_RETAKE = [
+    ("SV1", "HP1", "HK1", 8.0, 3.5, "B+"), ("SV1", "HP2", "HK1", 7.0, 3.0, "B"),
+    ("SV2", "HP1", "HK1", 2.0, 0.0, "F"), ("SV2", "HP2", "HK1", 5.0, 1.5, "D+"),
+    ("SV3", "HP1", "HK1", 3.5, 0.0, "F"), ("SV3", "HP2", "HK1", 3.0, 0.0, "F"),
+]
+# SV1 trượt HP1 ở HK1 rồi thi lại đạt ở HK2
+RETAKE = NO_RETAKE[2:] + [
+    ("SV1", "HP1", "HK1", 3.0, 0.0, "F"), ("SV1", "HP1", "HK2", 8.0, 3.5, "B+"),
+    ("SV1", "HP2", "HK1", 7.0, 3.0, "B"),
+]
+
+
+def _seed(app, grades):
+    with app.app_context():
+        add_courses(("HP1", "Lập trình C", 3), ("HP2", "Cấu trúc dữ liệu", 4))
+        for i, masv in enumerate(sorted({g[0] for g in grades}), start=10):
+            db.session.add(NguoiDung(MaNguoiDung=i, TenDangNhap=masv, MatKhauMaHoa="x",
+                                     Email=f"{masv}@vui.edu.vn", MaVaiTro=2))
+            db.session.add(SinhVien(MaSV=masv, HoTen=masv, MaLop="L1", MaNguoiDung=i))
+        for masv, mahp, hk, d10, d4, chu in grades:
+            db.session.add(KetQuaHocTap(MaSV=masv, MaHP=mahp, HocKy=hk, DiemHe10=d10, DiemHe4=d4, DiemChu=chu))
+        for code, th in RULES.items():
+            db.session.add(WarningRule(Code=code, Name=code, Threshold=th, Active=True))
+        db.session.flush()
+        apply_retake_policy(None, "keep-latest")
+        refresh_student_aggregates(None)
+        db.session.commit()
+
+
+def _old_scan_hits():
+    # Cách quét trước bảng tổng hợp (warning_scan.py bản đầu): mọi lần thi, không xét LaDiemCuoiCung
+    stats = {}
+    rows = (db.session.query(KetQuaHocTap.MaSV, KetQuaHocTap.DiemHe10, KetQuaHocTap.DiemHe4,
+                             KetQuaHocTap.DiemChu, HocPhan.SoTinChi)
+            .join(HocPhan, HocPhan.MaHP == KetQuaHocTap.MaHP).all())
+    for masv, d10, d4, chu, stc in rows:
+        s = stats.setdefault(masv, {"p4": 0.0, "p10": 0.0, "tc": 0, "fails": 0, "fails_credit": 0})
+        s["tc"] += stc; s["p10"] += (d10 or 0) * stc; s["p4"] += (d4 or 0) * stc
+        if (d10 or 0) < 4.0 or chu == "F":
+            s["fails"] += 1; s["fails_credit"] += stc
+    value = {
+        "GPA_BELOW": lambda s: (s["p4"] / s["tc"]) if s["tc"] else 0.0,
+        "AVG_BELOW": lambda s: (s["p10"] / s["tc"]) if s["tc"] else 0.0,
+        "FAIL_COUNT": lambda s: s["fails"],
+        "DEBT_OVER": lambda s: s["fails_credit"],
+    }
+    hits = set()
+    for code, th in RULES.items():
+        for masv, s in stats.items():
+            v = value[code](s)
+            if (v < th) if code in ("GPA_BELOW", "AVG_BELOW") else (v >= th):
+                hits.add((code, masv))
+    return hits
+
+
+def _open_hits():
+    return {(code, masv) for code, masv in db.session.query(WarningRule.Code, WarningCase.MaSV)
+            .join(WarningRule, WarningRule.Id == WarningCase.RuleId).filter(WarningCase.Status == "open")}
+
+
+def _scan_hits(**kw):
+    scan_all_warnings(**kw)
+    return _open_hits()
+
+
+def test_scan_matches_old_scan_without_retakes(app):
+    _seed(app, NO_RETAKE)
+    with app.app_context():
+        old = _old_scan_hits()
+        assert _scan_hits() == old
+        assert ("FAIL_COUNT", "SV2") in old and ("GPA_BELOW", "SV3") in old
+
+
+def test_passed_retake_no_longer_counts_as_failure(app):
+    _seed(app, RETAKE)
+    with app.app_context():
+        old, new = _old_scan_hits(), _scan_hits()
+    # Khác biệt duy nhất: lần trượt HP1 của SV1 đã thi lại đạt
+    assert old - new == {("FAIL_COUNT", "SV1"), ("DEBT_OVER", "SV1")}
+    assert new - old == set()
+
+
+# Quét incremental theo tập SV bị đánh dấu (user-005)
+
+def test_incremental_scan_only_rescans_dirty_students(app):
+    _seed(app, NO_RETAKE)
+    with app.app_context():
+        before = _scan_hits()
+        # SV2 và SV3 cùng đạt hết, nhưng chỉ SV2 được đánh dấu
+        for masv in ("SV2", "SV3"):
+            db.session.query(KetQuaHocTap).filter_by(MaSV=masv).update(
+                {"DiemHe10": 9.0, "DiemHe4": 4.0, "DiemChu": "A"})
+        refresh_student_aggregates(["SV2", "SV3"])
+        mark_students_dirty(["SV2"])
+        db.session.commit()
+
+        res = scan_all_warnings(incremental=True)
+        hits = _open_hits()
+        assert db.session.query(WarningScanDirty).count() == 0
+        full = _scan_hits()
+    assert (res["mode"], res["students"], res["created"]) == ("incremental", 1, 0)
+    assert res["removed"] == len({h for h in before if h[1] == "SV2"}) > 0
+    assert hits == {h for h in before if h[1] != "SV2"}
+    assert full == {h for h in before if h[1] == "SV1"}
+
+
+def test_incremental_scan_after_grade_import(app, admin_headers):
+    _seed(app, NO_RETAKE)
+    with app.app_context():
+        _scan_hits()
+    data = grades_csv(["Mã sinh viên", "Họ và tên", "Lập trình C", "Cấu trúc dữ liệu"], [["SV3", "SV3", 9, 8]])
+    code, body = post_import(app, admin_headers, "grades", data, preview="0", hocky="HK1", allow_update="1")
+    assert code == 200, body
+    with app.app_context():
+        assert [m for (m,) in db.session.query(WarningScanDirty.MaSV)] == ["SV3"]
+        res = scan_all_warnings(incremental=True)
+        hits = _open_hits()
+        assert _scan_hits() == hits
+    assert res["students"] == 1
+    assert not any(masv == "SV3" for _, masv in hits)
+
+
+def test_retake_policy_change_rescans_everyone(app, admin_headers):
+    # SV1 thi lại HP1 ở HK2 và trượt: keep-latest -> trượt, best -> giữ 8.0 của HK1
+    _seed(app, NO_RETAKE + [("SV1", "HP1", "HK2", 3.0, 0.0, "F")])
+    with app.app_context():
+        assert ("FAIL_COUNT", "SV1") in _scan_hits()
+    resp = app.test_client().put("/api/admin/configs", json={"values": {"RETAKE_POLICY_DEFAULT": "best"}},
+                                 headers=admin_headers)
+    assert resp.status_code == 200, resp.get_json()
+    with app.app_context():
+        res = scan_all_warnings(incremental=True)
+        hits = _open_hits()
+        assert _scan_hits() == hits
+    assert res["students"] == 3
+    assert ("FAIL_COUNT", "SV1") not in hits
+
+
+def test_sync_cases_scoped_to_students(app):
+    _seed(app, NO_RETAKE)
+    with app.app_context():
+        rid = db.session.query(WarningRule.Id).filter_by(Code="FAIL_COUNT").scalar()
+        assert sync_cases({(rid, "SV2"): 1, (rid, "SV3"): 2}, [rid]) == (2, 0, 0)
+        # Ngoài masvs không bị gỡ; trong masvs: sửa giá trị, gỡ case không còn vi phạm
+        assert sync_cases({(rid, "SV2"): 3}, [rid], ["SV2"]) == (0, 1, 0)
+        assert sync_cases({}, [rid], ["SV3"]) == (0, 0, 1)
+        assert sync_cases({(rid, "SV1"): 1, (rid, "SV2"): 9}, [rid], insert_only=True) == (1, 0, 0)
+        got = {(c.MaSV, c.Value) for c in db.session.query(WarningCase)}
+    assert got == {("SV1", 1), ("SV2", 3)}
+
+
+# Rule biên dịch sang SQL (user-007)
+
+def test_compile_rule(app):
+    _seed(app, NO_RETAKE)
+    with app.app_context():
+        assert compile_rule(WarningRule(Id=99, Code="UNKNOWN", Threshold=1)) is None
+        assert compile_rule(WarningRule(Id=99, Code="GPA_BELOW", Threshold=None)) is None
+        fails = db.session.execute(compile_rule(WarningRule(Id=7, Code=" fail_count ", Threshold=2))).all()
+        avg = db.session.execute(compile_rule(WarningRule(Id=8, Code="AVG_BELOW", Threshold=5))).all()
+    assert fails == [(7, "SV3", 2)]
+    # Giá trị làm tròn 2 chữ số: (2*3 + 5*4) / 7, (3.5*3 + 3*4) / 7
+    assert sorted(avg) == [(8, "SV2", 3.71), (8, "SV3", 3.21)]
+
+
+# Quét chia theo lớp ở nhiều process (user-009)
+
+def test_sharded_scan_matches_single_process(app):
+    _seed(app, NO_RETAKE)
+    with app.app_context():
+        db.session.add(LopHoc(MaLop="L2", TenLop="Lớp 2", MaNganh="N1"))
+        for i, lop in enumerate(["L2", "L2", None, "L1"], start=4):
+            masv = f"SV{i}"
+            db.session.add(NguoiDung(MaNguoiDung=50 + i, TenDangNhap=masv, MatKhauMaHoa="x",
+                                     Email=f"{masv}@vui.edu.vn", MaVaiTro=2))
+            db.session.add(SinhVien(MaSV=masv, HoTen=masv, MaLop=lop, MaNguoiDung=50 + i))
+            db.session.add(KetQuaHocTap(MaSV=masv, MaHP="HP1", HocKy="HK1", DiemHe10=2.0 + i % 3,
+                                        DiemHe4=0.0, DiemChu="F"))
+        db.session.flush()
+        refresh_student_aggregates(None)
+        db.session.commit()
+
+        res = scan_all_warnings(workers=2)
+        sharded = _open_hits()
+        again = scan_all_warnings(workers=1)
+        single = _open_hits()
+    assert res["shards"] > 1
+    assert (again["created"], again["updated"], again["removed"]) == (0, 0, 0)
+    assert sharded == single
+    assert {masv for _, masv in single} >= {"SV4", "SV5", "SV6", "SV7"}